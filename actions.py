@@ -0,0 +1,92 @@
+from database import DB_PATH, SERVICE_STATUSES, get_db, insert_registration, set_qr_code, fetch_vehicle, \
+    fetch_services, fetch_qr_code, resolve_scanned, set_service_status
+from registration import SERVICE_PRICES, validate_registration, price_services, qr_payload, encode_token
+
+# What the GUIs do, as plain functions with no GUI, camera or QR rendering
+# imports, so cron jobs, the CLI and the service can reuse them. QR code
+# rendering (qrcode, NumPy) is imported only when a registration needs it.
+# Invalid input raises ValueError with the message the form would show.
+
+
+# Register a vehicle with the named services and store its QR code.
+# Returns (user_id, qr_data, png).
+def register_vehicle(record, service_names, compact=False, db_path=DB_PATH):
+    from qr_cache import cached_qr_png
+
+    unknown = [name for name in service_names if name not in SERVICE_PRICES]
+    if unknown:
+        raise ValueError(f"Unknown service(s): {', '.join(unknown)}")
+    record = dict(record)
+    selected_services, selected_jobs, total_price = price_services(service_names)
+    record["total_price"] = total_price
+    error = validate_registration(record)
+    if error:
+        raise ValueError(error)
+
+    # One service_jobs row per selected service
+    if compact:
+        # Compact QR: encode only the checksummed registration id, which
+        # needs the row inserted first. The code is rendered between two
+        # short transactions, as service.py does, so other stations' writes
+        # don't wait on the render.
+        with get_db(db_path).transaction() as conn:
+            user_id = insert_registration(conn, record, selected_jobs, None)
+        qr_data = encode_token(user_id)
+        png = cached_qr_png(qr_data)
+        with get_db(db_path).transaction() as conn:
+            set_qr_code(conn, user_id, png)
+    else:
+        # Combine all the data to store in the QR code, then generate it
+        qr_data = qr_payload(record, selected_services, total_price)
+        png = cached_qr_png(qr_data)
+        with get_db(db_path).transaction() as conn:
+            user_id = insert_registration(conn, record, selected_jobs, png)
+    return user_id, qr_data, png
+
+
+# QR code of `payload` as PNG bytes, or SVG text with fmt="svg"
+def render_qr(payload, fmt="png"):
+    if fmt == "svg":
+        from qr_render import render_svg
+        return render_svg(payload)
+    from qr_cache import cached_qr_png
+    return cached_qr_png(payload)
+
+
+# Stored QR PNG of the latest registration of a vehicle, or None
+def stored_qr(vehicle_number, db_path=DB_PATH):
+    conn = get_db(db_path).connection()
+    vehicle = fetch_vehicle(conn, vehicle_number)
+    return fetch_qr_code(conn, vehicle[0]) if vehicle else None
+
+
+# Vehicle number for scanned QR data (JSON record or compact token), or None
+def resolve_qr(qr_data, db_path=DB_PATH):
+    return resolve_scanned(get_db(db_path).connection(), qr_data)
+
+
+# (vehicle row, [(service, status), ...], archive); the row is None for an
+# unknown vehicle. Vehicles moved out by archive.py come from their latest
+# archive, named in `archive` (None for live ones); those are read-only.
+def lookup_vehicle(vehicle_number, db_path=DB_PATH):
+    conn = get_db(db_path).connection()
+    vehicle = fetch_vehicle(conn, vehicle_number)
+    if vehicle:
+        return vehicle, fetch_services(conn, vehicle[0]), None
+    from archive import lookup_archived
+    archived = lookup_archived(get_db(db_path), vehicle_number)
+    if not archived:
+        return None, [], None
+    archive, vehicle, services = archived[-1]
+    return vehicle, services, archive
+
+
+# Set one service's status on the latest registration of a vehicle
+def update_status(vehicle_number, service, status, db_path=DB_PATH):
+    if status not in SERVICE_STATUSES:
+        raise ValueError(f"Status must be one of {', '.join(SERVICE_STATUSES)}")
+    with get_db(db_path).transaction() as conn:
+        updated = set_service_status(conn, vehicle_number, service, status)
+    if not updated:
+        raise ValueError(f"No {service} job found for vehicle {vehicle_number}")
+    return updated
@@ -0,0 +1,286 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+from database import DB_PATH, get_db, create_table, fetch_vehicle, fetch_services
+from registration import normalize_vehicle_number
+
+# Hot/cold archival: vehicles whose jobs are all Completed and haven't
+# changed for --older-than-days move, with their service jobs, QR PNG and
+# status history, into one archive file per month of their last change
+# (archive/vehicle_registration-2026-03.db next to the database). The live
+# database keeps a pointer per archived registration (archived_registrations),
+# so compact QR codes still resolve and lookups fall back to the archive,
+# attached only for that read.
+#
+#   python archive.py run [--db FILE] [--older-than-days 180] [--batch-size 200] [--dry-run] [--vacuum]
+#   python archive.py lookup VEHICLE [--db FILE]
+#
+# Each batch is two short transactions: copy into the archive, then, after
+# re-checking that the vehicle is still eligible and its rows made it into
+# the archive, delete from the live file. Copies are idempotent, so an
+# interrupted run is simply run again. Between batches the write lock is
+# released for BATCH_PAUSE so stations' writes aren't held up. Vehicles with
+# no status dates (jobs from before status history was kept) are only
+# archived with --include-undated, into an "undated" archive.
+#
+# Archived jobs drop out of job_summary, which covers the live database;
+# daily_summary (revenue per day) is kept from bookings and is unaffected.
+
+OLDER_THAN_DAYS = 180
+BATCH_SIZE = 200
+BATCH_PAUSE = 0.05
+UNDATED = "undated"
+LATENCY_SAMPLES = 500
+
+# Tables copied for each archived vehicle, and which rows of them belong to
+# the batch in temp.archive_batch
+ARCHIVED_ROWS = {
+    "users": "id IN (SELECT id FROM temp.archive_batch)",
+    "service_jobs": "user_id IN (SELECT id FROM temp.archive_batch)",
+    "qr_images": "hash IN (SELECT qr_hash FROM main.users WHERE id IN (SELECT id FROM temp.archive_batch))",
+    "status_events": "job_id IN (SELECT id FROM main.service_jobs WHERE user_id IN (SELECT id FROM temp.archive_batch))",
+}
+ARCHIVE_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS {alias}.idx_users_id ON users(id)",
+    "CREATE INDEX IF NOT EXISTS {alias}.idx_users_vehicle_key ON users(vehicle_key)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS {alias}.idx_service_jobs_id ON service_jobs(id)",
+    "CREATE INDEX IF NOT EXISTS {alias}.idx_service_jobs_user_id ON service_jobs(user_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS {alias}.idx_qr_images_hash ON qr_images(hash)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS {alias}.idx_status_events_id ON status_events(id)",
+    "CREATE INDEX IF NOT EXISTS {alias}.idx_status_events_job ON status_events(job_id)",
+]
+
+# Still eligible: every job Completed, and none changed since the cutoff
+STILL_ELIGIBLE = '''NOT EXISTS (SELECT 1 FROM main.service_jobs WHERE user_id = temp.archive_batch.id
+                                AND (status <> 'Completed' OR status_since >= ?))'''
+
+
+def archive_dir_for(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "archive")
+
+
+def archive_name(db_path, month):
+    return f"{os.path.splitext(os.path.basename(db_path))[0]}-{month}.db"
+
+
+def columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+# Archive tables mirror the live ones; columns added to the live schema
+# since the archive was created are added to it too
+def ensure_archive_schema(conn, alias):
+    for table in ARCHIVED_ROWS:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {alias}.{table} AS SELECT * FROM main.{table} WHERE 0")
+        archived = set(columns(conn, alias, table))
+        for column, column_type in conn.execute(f"SELECT name, type FROM pragma_table_info('{table}', 'main')"):
+            if column not in archived:
+                conn.execute(f"ALTER TABLE {alias}.{table} ADD COLUMN {column} {column_type}")
+    for index in ARCHIVE_INDEXES:
+        conn.execute(index.format(alias=alias))
+
+
+# {month: [user_id, ...]} of vehicles eligible for archiving
+def find_candidates(conn, cutoff, include_undated=False):
+    candidates = {}
+    for user_id, last_change in conn.execute(
+            '''SELECT user_id, MAX(status_since) FROM service_jobs GROUP BY user_id
+               HAVING SUM(status <> 'Completed') = 0 AND COALESCE(MAX(status_since) < ?, ?)''',
+            (cutoff, 1 if include_undated else 0)):
+        month = time.strftime("%Y-%m", time.localtime(last_change)) if last_change is not None else UNDATED
+        candidates.setdefault(month, []).append(user_id)
+    return candidates
+
+
+def fill_batch(conn, user_ids, cutoff):
+    conn.execute("DELETE FROM temp.archive_batch")
+    conn.executemany("INSERT INTO temp.archive_batch (id) VALUES (?)", [(user_id,) for user_id in user_ids])
+    conn.execute(f"DELETE FROM temp.archive_batch WHERE NOT {STILL_ELIGIBLE}", (cutoff,))
+
+
+# Move one batch of vehicles into the attached archive; returns how many moved
+def archive_batch(db, user_ids, cutoff, archive):
+    with db.transaction() as conn:
+        fill_batch(conn, user_ids, cutoff)
+        for table, rows in ARCHIVED_ROWS.items():
+            names = ", ".join(columns(conn, "main", table))
+            conn.execute(f"INSERT OR REPLACE INTO archive.{table} ({names}) SELECT {names} FROM main.{table} "
+                         f"WHERE {rows}")
+
+    with db.transaction() as conn:
+        # Only what is still eligible and safely in the archive is deleted
+        fill_batch(conn, user_ids, cutoff)
+        conn.execute("DELETE FROM temp.archive_batch WHERE id NOT IN (SELECT id FROM archive.users)")
+        moved = conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+        conn.execute('''INSERT OR REPLACE INTO main.archived_registrations
+                        (user_id, vehicle_key, vehicle_number, archive, archived_at)
+                        SELECT id, vehicle_key, vehicle_number, ?, ? FROM main.users
+                        WHERE id IN (SELECT id FROM temp.archive_batch)''', (archive, time.time()))
+        hashes = conn.execute('''SELECT DISTINCT qr_hash FROM main.users
+                                 WHERE id IN (SELECT id FROM temp.archive_batch) AND qr_hash IS NOT NULL''').fetchall()
+        conn.execute(f"DELETE FROM main.status_events WHERE {ARCHIVED_ROWS['status_events']}")
+        # service_jobs rows go with their vehicle (ON DELETE CASCADE)
+        conn.execute(f"DELETE FROM main.users WHERE {ARCHIVED_ROWS['users']}")
+        conn.executemany('''DELETE FROM main.qr_images WHERE hash = ?
+                            AND NOT EXISTS (SELECT 1 FROM main.users WHERE qr_hash = ?)''',
+                         [(qr_hash, qr_hash) for (qr_hash,) in hashes])
+    return moved
+
+
+def archive_completed(db, older_than_days=OLDER_THAN_DAYS, batch_size=BATCH_SIZE, archive_dir=None,
+                      include_undated=False, pause=BATCH_PAUSE, out=sys.stdout):
+    archive_dir = archive_dir or archive_dir_for(db.path)
+    cutoff = time.time() - older_than_days * 86400
+    conn = db.connection()
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+    moved = {}
+    for month, user_ids in sorted(find_candidates(conn, cutoff, include_undated).items()):
+        os.makedirs(archive_dir, exist_ok=True)
+        archive = archive_name(db.path, month)
+        # ATTACH can't run inside a transaction, so once per archive file
+        conn.execute("ATTACH DATABASE ? AS archive", (os.path.join(archive_dir, archive),))
+        try:
+            ensure_archive_schema(conn, "archive")
+            for start in range(0, len(user_ids), batch_size):
+                moved[month] = moved.get(month, 0) + archive_batch(db, user_ids[start:start + batch_size], cutoff,
+                                                                   archive)
+                time.sleep(pause)
+        finally:
+            conn.execute("DETACH DATABASE archive")
+        print(f"{archive}: {moved.get(month, 0)} vehicle(s) archived", file=out)
+    return moved
+
+
+# (conn, user_id, archive) for each archived registration of a vehicle,
+# oldest first, with its archive file attached as archive_read meanwhile
+def attached_archives(db, vehicle_number, archive_dir=None):
+    archive_dir = archive_dir or archive_dir_for(db.path)
+    conn = db.connection()
+    for user_id, archive in conn.execute(
+            "SELECT user_id, archive FROM archived_registrations WHERE vehicle_key = ? ORDER BY user_id",
+            (normalize_vehicle_number(vehicle_number),)).fetchall():
+        path = os.path.join(archive_dir, archive)
+        if not os.path.exists(path):
+            continue
+        conn.execute("ATTACH DATABASE ? AS archive_read", (path,))
+        try:
+            yield conn, user_id, archive
+        finally:
+            conn.execute("DETACH DATABASE archive_read")
+
+
+# Archived registrations of a vehicle, read from their archive files:
+# [(archive, vehicle row, [(service, status), ...]), ...], oldest first.
+# The vehicle row is (id, first_name, last_name, vehicle_type, vehicle_brand)
+# like fetch_vehicle's.
+def lookup_archived(db, vehicle_number, archive_dir=None):
+    results = []
+    for conn, user_id, archive in attached_archives(db, vehicle_number, archive_dir):
+        vehicle = conn.execute('''SELECT id, first_name, last_name, vehicle_type, vehicle_brand
+                                  FROM archive_read.users WHERE id = ?''', (user_id,)).fetchone()
+        services = conn.execute("SELECT service, status FROM archive_read.service_jobs WHERE user_id = ? "
+                                "ORDER BY id", (user_id,)).fetchall()
+        if vehicle:
+            results.append((archive, vehicle, services))
+    return results
+
+
+# Status history of a vehicle's archived registrations, oldest first, in
+# fetch_status_history's shape
+def archived_status_history(db, vehicle_number, archive_dir=None):
+    events = []
+    for conn, user_id, archive in attached_archives(db, vehicle_number, archive_dir):
+        events.extend(conn.execute('''SELECT service, old_status, new_status, station, at, seconds
+                                     FROM archive_read.status_events
+                                     WHERE job_id IN (SELECT id FROM archive_read.service_jobs WHERE user_id = ?)
+                                     ORDER BY id''', (user_id,)).fetchall())
+    return events
+
+
+def live_size(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return (pages - free) * page_size, pages * page_size
+
+
+# p50/p95 of the tracker's lookup (vehicle + services) over random live vehicles
+def lookup_latency(conn, samples=LATENCY_SAMPLES, seed_value=1):
+    max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0]
+    rng = random.Random(seed_value)
+    latencies = []
+    for _ in range(samples if max_id else 0):
+        row = conn.execute("SELECT vehicle_number FROM users WHERE id >= ? LIMIT 1",
+                           (rng.randrange(1, max_id + 1),)).fetchone()
+        if row is None:
+            continue
+        start = time.perf_counter()
+        vehicle = fetch_vehicle(conn, row[0])
+        fetch_services(conn, vehicle[0])
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    if not latencies:
+        return 0.0, 0.0
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def describe(conn):
+    used, file_size = live_size(conn)
+    vehicles = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    p50, p95 = lookup_latency(conn)
+    return (f"{vehicles} vehicles, {used / 1e6:.1f} MB used of a {file_size / 1e6:.1f} MB file, "
+            f"lookup p50 {p50 * 1e6:.0f} us, p95 {p95 * 1e6:.0f} us")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old completed vehicles into monthly archive files")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--archive-dir", help="default: archive/ next to the database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="archive vehicles whose jobs are all completed")
+    run.add_argument("--older-than-days", type=float, default=OLDER_THAN_DAYS)
+    run.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    run.add_argument("--include-undated", action="store_true",
+                     help="also archive vehicles with no status dates (from before status history was kept)")
+    run.add_argument("--dry-run", action="store_true", help="only count what would be archived")
+    run.add_argument("--vacuum", action="store_true",
+                     help="shrink the file afterwards (holds the write lock while it runs)")
+    lookup = commands.add_parser("lookup", help="show a vehicle's archived registrations")
+    lookup.add_argument("vehicle")
+    args = parser.parse_args(argv)
+
+    create_table(args.db)
+    db = get_db(args.db)
+    conn = db.connection()
+    if args.command == "lookup":
+        archived = lookup_archived(db, args.vehicle, args.archive_dir)
+        for archive, (user_id, first_name, last_name, vehicle_type, vehicle_brand), services in archived:
+            print(f"#{user_id} {first_name} {last_name}, {vehicle_type} {vehicle_brand} ({archive})")
+            for service, status in services:
+                print(f"  {service}: {status}")
+        if not archived:
+            print("No archived registrations for this vehicle.")
+            return 1
+        return 0
+
+    if args.dry_run:
+        cutoff = time.time() - args.older_than_days * 86400
+        for month, user_ids in sorted(find_candidates(conn, cutoff, args.include_undated).items()):
+            print(f"{archive_name(args.db, month)}: {len(user_ids)} vehicle(s) to archive")
+        return 0
+
+    print("before:", describe(conn))
+    started = time.perf_counter()
+    moved = archive_completed(db, args.older_than_days, args.batch_size, args.archive_dir, args.include_undated)
+    print(f"archived {sum(moved.values())} vehicle(s) in {time.perf_counter() - started:.1f}s")
+    if args.vacuum:
+        conn.execute("VACUUM")
+    print("after: ", describe(conn))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from bench_lookup import seed, percentile
+from database import SERVICE_STATUSES, fetch_board, fetch_board_changes
+from registration import SERVICES
+
+# Refresh cost of the shop-floor board per tick.
+#
+#   python bench_board.py [--vehicles 100000] [--active 250] [--ticks 300] [--writes-per-tick 5]
+#
+# Seeds --vehicles registrations of which --active are still in the
+# workshop. Every tick another connection commits status changes, as the
+# stations would (some finish a vehicle, some reopen one), and the board
+# polls for what changed. The incremental poll is compared with re-reading
+# the whole board, and the board it builds up is checked against a full
+# read every tick. With a display, the Tk board (pooled rows, changed labels
+# only) is refreshed from the same polls and its refresh time reported too.
+
+
+def percentiles(values):
+    values = sorted(values)
+    return (f"{percentile(values, 0.5) * 1000:>8.2f} {percentile(values, 0.95) * 1000:>8.2f} "
+            f"{(values[-1] if values else 0.0) * 1000:>8.2f}")
+
+
+def open_tk_board(db):
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except (ImportError, RuntimeError) as e:
+        print(f"no display ({e}): Tk refresh not measured")
+        return None, None
+    except Exception as e:
+        print(f"no display ({e}): Tk refresh not measured")
+        return None, None
+    from shop_board import ShopBoard
+    root.withdraw()
+    run_now = lambda func, *args: func(*args)
+    board = ShopBoard(root, lambda since: fetch_board_changes(db.connection(), since), run_now, run_now,
+                      lambda vehicle_number: None)
+    return root, board
+
+
+def run(vehicles, active, ticks, writes_per_tick, seed_value=1):
+    rng = random.Random(seed_value)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "board.db")
+        db = seed(path, vehicles)
+        station = sqlite3.connect(path, isolation_level=None)
+        station.execute("UPDATE service_jobs SET status = 'Completed' WHERE user_id > ?", (active,))
+        conn = db.connection()
+        service_names = [name for name, price in SERVICES[:2]]
+
+        seq, board = fetch_board_changes(conn)
+        root, tk_board = open_tk_board(db)
+        poll_times, full_times, refresh_times = [], [], []
+        changed = mismatches = 0
+        for tick in range(ticks):
+            station.execute("BEGIN")
+            for _ in range(writes_per_tick):
+                # Mostly vehicles on the board, now and then one coming back
+                user_id = rng.randrange(1, active * 2) if rng.random() < 0.9 else rng.randrange(1, vehicles + 1)
+                station.execute("UPDATE service_jobs SET status = ? WHERE user_id = ? AND service = ?",
+                                (rng.choice(SERVICE_STATUSES), user_id, rng.choice(service_names)))
+            station.execute("COMMIT")
+
+            start = time.perf_counter()
+            seq, changes = fetch_board_changes(conn, seq)
+            poll_times.append(time.perf_counter() - start)
+            changed += len(changes)
+            for key, vehicle in changes.items():
+                if vehicle is None:
+                    board.pop(key, None)
+                else:
+                    board[key] = vehicle
+
+            start = time.perf_counter()
+            full = fetch_board(conn)
+            full_times.append(time.perf_counter() - start)
+            mismatches += full != board
+
+            if tk_board:
+                start = time.perf_counter()
+                tk_board.poll(tk_board.seq)
+                root.update_idletasks()
+                refresh_times.append(time.perf_counter() - start)
+
+        print(f"{vehicles} vehicles, about {len(board)} in the workshop, {ticks} ticks of {writes_per_tick} "
+              f"status changes, {changed / ticks:.1f} vehicles changed per tick")
+        print(f"{'per tick':<22} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        print(f"{'incremental poll':<22} {percentiles(poll_times)}")
+        print(f"{'full board read':<22} {percentiles(full_times)}")
+        if tk_board:
+            print(f"{'Tk poll + refresh':<22} {percentiles(refresh_times)}")
+            print(f"{len(tk_board.rows)} rows shown, {len(tk_board.spare_rows)} pooled for reuse")
+            root.destroy()
+        print(f"incremental board differed from a full read on {mismatches} tick(s)")
+        station.close()
+        db.close_all()
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shop-floor board refresh benchmark")
+    parser.add_argument("--vehicles", type=int, default=100000)
+    parser.add_argument("--active", type=int, default=250, help="vehicles in the workshop")
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--writes-per-tick", type=int, default=5, help="status changes committed between polls")
+    args = parser.parse_args()
+    raise SystemExit(run(args.vehicles, args.active, args.ticks, args.writes_per_tick))
@@ -0,0 +1,106 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from database import get_db, create_table, insert_registrations, resolve_scanned, fetch_vehicle, fetch_services, \
+    SERVICE_STATUSES
+from lookup_cache import VehicleCache
+from registration import SERVICES
+
+# Scan-to-display latency of the tracker's lookup with and without the
+# VehicleCache.
+#
+#   python bench_lookup.py [--vehicles 100000] [--scans 20000] [--active 50] [--write-every 20]
+#
+# Scans mostly hit a small set of vehicles currently in the bays, like a shop
+# floor does. Every --write-every scans another connection commits a status
+# change, as another station would; each cached read is checked against the
+# database so a stale status fails the run.
+
+
+def seed(path, vehicles):
+    create_table(path)
+    db = get_db(path)
+    batch = []
+    for i in range(vehicles):
+        record = {
+            "first_name": f"First{i}", "last_name": f"Last{i}", "mobile_no": f"98{i:08d}",
+            "address": "", "pincode": "411001", "vehicle_type": "Car", "vehicle_brand": "Bench",
+            "vehicle_number": f"MH12BN{i:06d}", "total_price": 400,
+        }
+        batch.append((record, SERVICES[:2], None))
+        if len(batch) == 5000:
+            with db.transaction() as conn:
+                insert_registrations(conn, batch)
+            batch = []
+    if batch:
+        with db.transaction() as conn:
+            insert_registrations(conn, batch)
+    return db
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))] if sorted_values else 0.0
+
+
+def run_scans(db, path, scans, vehicles, active, write_every, cache, seed_value=1):
+    rng = random.Random(seed_value)
+    bay_vehicles = [f"MH12BN{rng.randrange(vehicles):06d}" for _ in range(active)]
+    other_station = sqlite3.connect(path, isolation_level=None)
+    conn = db.connection()
+    latencies = []
+    stale = 0
+
+    for scan in range(scans):
+        if write_every and scan % write_every == 0:
+            target = rng.choice(bay_vehicles)
+            other_station.execute('''UPDATE service_jobs SET status = ?
+                                     WHERE user_id = (SELECT id FROM users WHERE vehicle_key = ?)''',
+                                  (rng.choice(SERVICE_STATUSES), target))
+
+        qr_data = '{"Vehicle Number": "%s"}' % rng.choice(bay_vehicles)
+        start = time.perf_counter()
+        vehicle_number = resolve_scanned(conn, qr_data)
+        if cache:
+            result, services = cache.get(vehicle_number)
+        else:
+            result = fetch_vehicle(conn, vehicle_number)
+            services = fetch_services(conn, result[0])
+        latencies.append(time.perf_counter() - start)
+
+        if cache and services != fetch_services(conn, result[0]):
+            stale += 1
+
+    other_station.close()
+    latencies.sort()
+    return latencies, stale
+
+
+def run(vehicles, scans, active, write_every):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = seed(path, vehicles)
+
+        print(f"{vehicles} vehicles, {scans} scans over {active} vehicles in the bays, "
+              f"a write from another station every {write_every} scans")
+        print(f"{'':<14} {'p50 us':>8} {'p95 us':>8} {'p99 us':>8} {'stale reads':>12}")
+        for label, cache in (("no cache", None), ("VehicleCache", VehicleCache(db))):
+            latencies, stale = run_scans(db, path, scans, vehicles, active, write_every, cache)
+            print(f"{label:<14} {percentile(latencies, 0.5) * 1e6:>8.1f} {percentile(latencies, 0.95) * 1e6:>8.1f} "
+                  f"{percentile(latencies, 0.99) * 1e6:>8.1f} {stale if cache else '-':>12}")
+            if cache:
+                print(cache.report())
+        db.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vehicle lookup cache benchmark")
+    parser.add_argument("--vehicles", type=int, default=100000)
+    parser.add_argument("--scans", type=int, default=20000)
+    parser.add_argument("--active", type=int, default=50, help="vehicles currently being scanned")
+    parser.add_argument("--write-every", type=int, default=20, help="scans between writes from another station")
+    args = parser.parse_args()
+    run(args.vehicles, args.scans, args.active, args.write_every)
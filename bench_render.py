@@ -0,0 +1,64 @@
+import argparse
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from registration import QR_BOX_SIZE
+from qr_render import build_qr, rasterize, encode_png
+
+# PIL versus NumPy QR rendering across QR versions.
+#
+#   python bench_render.py [--versions 1 5 10 20 40] [--repeats 20]
+#
+# For each version both engines render the same QRCode to PNG; the script
+# checks the decoded pixels are identical and reports ms per code and PNG size.
+
+
+def pil_png(qr, box_size):
+    qr.box_size = box_size
+    img = qr.make_image(fill='black', back_color='white')
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def numpy_png(qr, box_size):
+    return encode_png(rasterize(qr, box_size))
+
+
+def pixels(png):
+    return np.array(Image.open(BytesIO(png)).convert("L"))
+
+
+def time_engine(engine, qr, box_size, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        png = engine(qr, box_size)
+        best = min(best, time.perf_counter() - start)
+    return best, png
+
+
+def run(versions, repeats, box_size=QR_BOX_SIZE):
+    print(f"{'version':>7} {'pixels':>9} {'PIL ms':>8} {'NumPy ms':>9} {'speed-up':>9} {'PIL KB':>7} {'NumPy KB':>9} {'identical':>9}")
+    for version in versions:
+        # A fixed version pads the payload out to the full symbol size
+        qr = build_qr("BENCH", version=version)
+
+        pil_seconds, pil = time_engine(pil_png, qr, box_size, repeats)
+        numpy_seconds, fast = time_engine(numpy_png, qr, box_size, repeats)
+        identical = np.array_equal(pixels(pil), pixels(fast))
+        side = pixels(fast).shape[0]
+        print(f"{version:>7} {f'{side}x{side}':>9} {pil_seconds * 1000:>8.2f} {numpy_seconds * 1000:>9.2f} "
+              f"{pil_seconds / numpy_seconds:>8.1f}x {len(pil) / 1024:>7.1f} {len(fast) / 1024:>9.1f} {str(identical):>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="QR rendering benchmark")
+    parser.add_argument("--versions", type=int, nargs="+", default=[1, 5, 10, 20, 40])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--box-size", type=int, default=QR_BOX_SIZE)
+    args = parser.parse_args()
+    run(args.versions, args.repeats, args.box_size)
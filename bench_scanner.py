@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from database import get_db, create_table, insert_registration, fetch_vehicle, fetch_services, resolve_scanned
+from registration import SERVICES, price_services, qr_payload, qr_png, encode_token
+from decoders import make_decoder
+from scanner import ImageDirectorySource, VideoFileSource, decode_frame
+
+# Offline scanner benchmark, no webcam needed.
+#
+#   python bench_scanner.py generate corpus/ [--count 50] [--compact]
+#   python bench_scanner.py run corpus/ [--decode-width 0 640 320] [--json report.json] [--min-success 0.9]
+#   python bench_scanner.py run corpus/ --video recording.mp4
+#   python bench_scanner.py run corpus/ --decoder pyzbar opencv opencv-aruco pyzbar,opencv
+#
+# `generate` registers synthetic vehicles in corpus/corpus.db and renders
+# their QR codes with generate_qr_code, then writes distorted copies (blur,
+# rotation, scale, noise) into one directory per distortion. `run` replays
+# every directory (or a recorded video) through the tracker's decode and
+# database lookup path and reports decode success rate, per-frame latency
+# percentiles and frames/s for each decode configuration (decoder engine or
+# cascade x decode width).
+
+FRAME_SIZE = (640, 480)
+
+DISTORTIONS = {
+    "clean": {},
+    "blur": {"blur": 5},
+    "rotate": {"rotate": 20},
+    "small": {"scale": 0.4},
+    "noise": {"noise": 25},
+    "combined": {"blur": 3, "rotate": 10, "scale": 0.6, "noise": 15},
+}
+
+
+# Place a QR image on a camera-sized canvas and degrade it
+def distort(qr_image, rng, blur=0, rotate=0, scale=1.0, noise=0):
+    width, height = FRAME_SIZE
+    side = int(min(qr_image.shape[0] * scale, height * 0.9))
+    qr_image = cv2.resize(qr_image, (side, side), interpolation=cv2.INTER_AREA)
+
+    frame = np.full((height, width), 255, dtype=np.uint8)
+    top, left = (height - side) // 2, (width - side) // 2
+    frame[top:top + side, left:left + side] = qr_image
+
+    if rotate:
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rotate, 1.0)
+        frame = cv2.warpAffine(frame, matrix, (width, height), borderValue=255)
+    if blur:
+        frame = cv2.GaussianBlur(frame, (blur | 1, blur | 1), 0)
+    if noise:
+        frame = np.clip(frame + rng.normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def generate(corpus_dir, count=50, compact=False, seed=0):
+    os.makedirs(corpus_dir, exist_ok=True)
+    db_path = os.path.join(corpus_dir, "corpus.db")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    create_table(db_path)
+    db = get_db(db_path)
+    rng = np.random.default_rng(seed)
+
+    expected = {}
+    for i in range(count):
+        record = {
+            "first_name": f"First{i}",
+            "last_name": f"Last{i}",
+            "mobile_no": f"98{i:08d}",
+            "address": f"{i} Bench Road",
+            "pincode": "411001",
+            "vehicle_type": "Car",
+            "vehicle_brand": "Bench",
+            "vehicle_number": f"MH12BN{i:04d}",
+        }
+        service_names = [service for service, price in SERVICES[:1 + i % len(SERVICES)]]
+        selected_services, selected_jobs, total_price = price_services(service_names)
+        record["total_price"] = total_price
+
+        with db.transaction() as conn:
+            user_id = insert_registration(conn, record, selected_jobs, None)
+        payload = encode_token(user_id) if compact else qr_payload(record, selected_services, total_price)
+        qr_image = cv2.imdecode(np.frombuffer(qr_png(payload), np.uint8), cv2.IMREAD_GRAYSCALE)
+
+        filename = f"{i:05d}.png"
+        expected[filename] = payload
+        for name, params in DISTORTIONS.items():
+            os.makedirs(os.path.join(corpus_dir, name), exist_ok=True)
+            cv2.imwrite(os.path.join(corpus_dir, name, filename), distort(qr_image, rng, **params))
+
+    with open(os.path.join(corpus_dir, "manifest.json"), "w") as f:
+        json.dump({"distortions": DISTORTIONS, "expected": expected}, f, indent=2)
+    db.close_all()
+    print(f"Wrote {count} codes x {len(DISTORTIONS)} distortions to {corpus_dir}")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# Decode + lookup every frame of `source`, the way the tracker handles a scan
+def replay(source, conn, decode_width, expected=None, decoder=None):
+    latencies = []
+    successes = 0
+    if not source.open():
+        raise SystemExit("Could not open frame source.")
+    try:
+        while True:
+            ok, frame = source.read()
+            if not ok:
+                break
+            start = time.perf_counter()
+            found = False
+            for qr_data in decode_frame(frame, None, decode_width, decoder):
+                vehicle_number = resolve_scanned(conn, qr_data)
+                vehicle = fetch_vehicle(conn, vehicle_number) if vehicle_number else None
+                if vehicle:
+                    fetch_services(conn, vehicle[0])
+                    if expected is None or expected.get(getattr(source, "current", None)) == qr_data:
+                        found = True
+            latencies.append(time.perf_counter() - start)
+            successes += found
+    finally:
+        source.release()
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "frames": len(latencies),
+        "success_rate": successes / len(latencies) if latencies else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "fps": len(latencies) / total if total else 0.0,
+    }
+
+
+def run(corpus_dir, decode_widths, video=None, json_path=None, min_success=None, decoders=None):
+    db = get_db(os.path.join(corpus_dir, "corpus.db"))
+    conn = db.connection()
+
+    sources = []
+    if video:
+        sources.append((os.path.basename(video), lambda: VideoFileSource(video), None))
+    else:
+        with open(os.path.join(corpus_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+        for name in manifest["distortions"]:
+            path = os.path.join(corpus_dir, name)
+            sources.append((name, lambda path=path: ImageDirectorySource(path), manifest["expected"]))
+
+    results = []
+    print(f"{'corpus':<12} {'decoder':<20} {'width':>6} {'frames':>7} {'success':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'fps':>8}")
+    for name, make_source, expected in sources:
+        for decoder_spec in decoders or [None]:
+            decoder = make_decoder(decoder_spec)
+            for decode_width in decode_widths:
+                result = replay(make_source(), conn, decode_width or None, expected, decoder)
+                result.update(corpus=name, decoder=decoder.name, decode_width=decode_width or None)
+                results.append(result)
+                print(f"{name:<12} {decoder.name:<20} {decode_width or 'full':>6} {result['frames']:>7} "
+                      f"{result['success_rate']:>8.1%} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+                      f"{result['p99_ms']:>8.2f} {result['fps']:>8.1f}")
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    db.close_all()
+
+    if min_success is not None and any(result["success_rate"] < min_success for result in results):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline QR scanner benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="build a synthetic corpus")
+    generate_parser.add_argument("corpus")
+    generate_parser.add_argument("--count", type=int, default=50, help="codes to generate (default: %(default)s)")
+    generate_parser.add_argument("--compact", action="store_true", help="encode compact registration tokens")
+    generate_parser.add_argument("--seed", type=int, default=0)
+
+    run_parser = commands.add_parser("run", help="replay a corpus or video through the decode path")
+    run_parser.add_argument("corpus", help="corpus directory (its corpus.db is used for lookups)")
+    run_parser.add_argument("--video", help="replay a recorded video instead of the image corpus")
+    run_parser.add_argument("--decode-width", type=int, nargs="+", default=[0, 640, 320],
+                            help="decode widths to compare, 0 = full resolution (default: %(default)s)")
+    run_parser.add_argument("--decoder", nargs="+",
+                            help="decoder engines or cascades to compare, e.g. opencv pyzbar,opencv (default: pyzbar,opencv)")
+    run_parser.add_argument("--json", help="write results as JSON")
+    run_parser.add_argument("--min-success", type=float, help="exit 1 if any configuration decodes less")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        generate(args.corpus, args.count, args.compact, args.seed)
+    else:
+        sys.exit(run(args.corpus, args.decode_width, args.video, args.json, args.min_success, args.decoder))
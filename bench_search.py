@@ -0,0 +1,133 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from database import get_db, create_table, insert_registrations, search_vehicles
+from registration import SERVICES
+
+# Latency of the tracker's manual search (FTS5 prefix queries) at scale.
+#
+#   python bench_search.py [--vehicles 1000000] [--queries 300] [--db search.db] [--max-p99-ms 5]
+#
+# Seeds registrations with realistic names, mobile numbers and plates in the
+# ways people type them ("MH 12 AB 1234", "mh12ab1234", "MH-12-AB-1234"),
+# then runs what staff type into the search box: short and longer name
+# prefixes, full names, mobile prefixes, the last digits or the start of a
+# plate, and searches that match nothing. --db keeps the seeded file so later
+# runs skip seeding. With --max-p99-ms the run fails if any query kind is slower.
+
+FIRST_NAMES = ["Aarav", "Aditi", "Akash", "Amit", "Ananya", "Anil", "Anjali", "Arjun", "Deepak", "Divya", "Gaurav",
+               "Isha", "Kavita", "Kiran", "Krishna", "Manoj", "Meera", "Neha", "Nikhil", "Pooja", "Prakash", "Priya",
+               "Rahul", "Rajesh", "Ravi", "Rohit", "Sachin", "Sanjay", "Shreya", "Sneha", "Sunil", "Suresh",
+               "Swati", "Tanvi", "Varun", "Vikram", "Vivek", "Yash"]
+LAST_NAMES = ["Agarwal", "Bhat", "Chavan", "Deshmukh", "Desai", "Gupta", "Iyer", "Jadhav", "Joshi", "Kulkarni",
+              "Kumar", "Mehta", "Menon", "Nair", "Naik", "Patel", "Patil", "Pawar", "Rao", "Reddy", "Shah",
+              "Sharma", "Shinde", "Singh", "Verma", "Yadav"]
+STATES = ["MH", "KA", "GJ", "DL", "TN", "UP", "RJ", "MP"]
+LETTERS = "ABCDEFGHJKLMNPRSTUVWXYZ"
+BATCH_SIZE = 5000
+
+
+def random_plate(rng):
+    parts = [rng.choice(STATES), f"{rng.randrange(1, 50):02d}", rng.choice(LETTERS) + rng.choice(LETTERS),
+             f"{rng.randrange(10000):04d}"]
+    separator = rng.choice([" ", "", "-"])
+    plate = separator.join(parts)
+    return plate.lower() if rng.random() < 0.2 else plate
+
+
+def seed(db, vehicles, rng):
+    conn = db.connection()
+    existing = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    started = time.perf_counter()
+    batch = []
+    for i in range(existing, vehicles):
+        record = {
+            "first_name": rng.choice(FIRST_NAMES), "last_name": rng.choice(LAST_NAMES),
+            "mobile_no": f"{rng.choice('6789')}{rng.randrange(10 ** 9):09d}", "address": "", "pincode": "411001",
+            "vehicle_type": "Car", "vehicle_brand": "Bench", "vehicle_number": random_plate(rng), "total_price": 100,
+        }
+        batch.append((record, SERVICES[:1], None))
+        if len(batch) == BATCH_SIZE:
+            with db.transaction() as conn:
+                insert_registrations(conn, batch)
+            batch = []
+    if batch:
+        with db.transaction() as conn:
+            insert_registrations(conn, batch)
+    count = db.connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    if count > existing:
+        print(f"seeded {count - existing} registrations in {time.perf_counter() - started:.1f}s "
+              f"(plates repeated by chance were upserted)")
+    return count
+
+
+# One search string per query kind, drawn from rows that exist
+def query_kinds(conn, rng, queries):
+    max_id = conn.execute("SELECT MAX(id) FROM users").fetchone()[0]
+    samples = []
+    while len(samples) < queries:
+        row = conn.execute("SELECT first_name, last_name, mobile_no, vehicle_key FROM users WHERE id >= ? LIMIT 1",
+                           (rng.randrange(1, max_id + 1),)).fetchone()
+        if row:
+            samples.append(row)
+    return {
+        "name, 2 chars": [first[:2] for first, last, mobile, key in samples],
+        "name, 4 chars": [last[:4] for first, last, mobile, key in samples],
+        "full name": [f"{first} {last}" for first, last, mobile, key in samples],
+        "mobile, 5 digits": [mobile[:5] for first, last, mobile, key in samples],
+        "plate, last 4": [key[-4:] for first, last, mobile, key in samples],
+        "plate, first 6": [f"{key[:2]} {key[2:4]} {key[4:6]}" for first, last, mobile, key in samples],
+        "no match": ["".join(rng.choice("qxz") for _ in range(4)) for _ in samples],
+    }
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))] if sorted_values else 0.0
+
+
+def run(path, vehicles, queries, max_p99_ms, seed_value=1):
+    rng = random.Random(seed_value)
+    create_table(path)
+    db = get_db(path)
+    count = seed(db, vehicles, rng)
+    conn = db.connection()
+    kinds = query_kinds(conn, rng, queries)
+
+    print(f"{count} registrations, {queries} searches per kind")
+    print(f"{'query':<18} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'rows':>6}")
+    slowest = 0.0
+    for kind, texts in kinds.items():
+        latencies = []
+        rows = 0
+        for text in texts:
+            start = time.perf_counter()
+            rows += len(search_vehicles(conn, text))
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        slowest = max(slowest, percentile(latencies, 0.99))
+        print(f"{kind:<18} {percentile(latencies, 0.5) * 1000:>8.2f} {percentile(latencies, 0.95) * 1000:>8.2f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.2f} {latencies[-1] * 1000:>8.2f} {rows / len(texts):>6.1f}")
+    db.close_all()
+
+    if max_p99_ms is not None and slowest * 1000 > max_p99_ms:
+        print(f"FAIL: slowest p99 {slowest * 1000:.2f} ms is above {max_p99_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manual search latency benchmark")
+    parser.add_argument("--vehicles", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=300, help="searches per query kind")
+    parser.add_argument("--db", help="keep the seeded database here (default: a temporary file)")
+    parser.add_argument("--max-p99-ms", type=float, help="fail if any query kind's p99 is above this")
+    args = parser.parse_args()
+    if args.db:
+        sys.exit(run(args.db, args.vehicles, args.queries, args.max_p99_ms))
+    with tempfile.TemporaryDirectory() as tmp:
+        code = run(os.path.join(tmp, "search.db"), args.vehicles, args.queries, args.max_p99_ms)
+    sys.exit(code)
@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_lookup import seed, percentile
+from database import SERVICE_STATUSES
+from registration import SERVICES
+
+# Load test for service.py: many stations on keep-alive connections hitting
+# one service, with the mix of a busy day (mostly lookups, some status
+# updates, a few registrations).
+#
+#   python bench_service.py [--vehicles 20000] [--clients 32] [--requests 20000]
+#
+# The service runs in its own process on a seeded temporary database, so the
+# numbers include the real socket and JSON round trip.
+
+MIX = (("lookup", 0.7), ("status", 0.2), ("register", 0.1))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def request(reader, writer, method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    payload = await reader.readexactly(length)
+    return status, payload
+
+
+async def station(port, vehicles, requests, rng, latencies, failures, next_vehicle):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    names = [op for op, share in MIX]
+    shares = [share for op, share in MIX]
+    for _ in range(requests):
+        op = rng.choices(names, shares)[0]
+        vehicle_number = f"MH12BN{rng.randrange(vehicles):06d}"
+        if op == "lookup":
+            args = ("GET", f"/vehicles/{vehicle_number}")
+        elif op == "status":
+            args = ("PUT", f"/vehicles/{vehicle_number}/services/{SERVICES[rng.randrange(2)][0]}",
+                    {"status": rng.choice(SERVICE_STATUSES)})
+        else:
+            i = next(next_vehicle)
+            args = ("POST", "/registrations", {
+                "first_name": f"Load{i}", "last_name": "Test", "mobile_no": f"97{i:08d}", "address": "",
+                "pincode": "411001", "vehicle_type": "Car", "vehicle_brand": "Bench",
+                "vehicle_number": f"MH14LT{i:06d}", "services": [SERVICES[0][0]], "compact": i % 2 == 0})
+        start = time.perf_counter()
+        status, payload = await request(reader, writer, *args)
+        latencies[op].append(time.perf_counter() - start)
+        if status >= 400:
+            failures[op] += 1
+    writer.close()
+
+
+async def load(port, vehicles, clients, requests):
+    latencies = {op: [] for op, share in MIX}
+    failures = {op: 0 for op, share in MIX}
+    next_vehicle = iter(range(10 ** 6))
+    start = time.perf_counter()
+    await asyncio.gather(*(station(port, vehicles, requests // clients, random.Random(i), latencies, failures,
+                                   next_vehicle) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    metrics = json.loads((await request(reader, writer, "GET", "/metrics"))[1])
+    writer.close()
+    return latencies, failures, elapsed, metrics
+
+
+def run(vehicles, clients, requests):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, vehicles).close_all()
+        port = free_port()
+        server = subprocess.Popen([sys.executable, "service.py", "--db", path, "--port", str(port)],
+                                  stdout=subprocess.PIPE, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        try:
+            server.stdout.readline()
+            latencies, failures, elapsed, metrics = asyncio.run(load(port, vehicles, clients, requests))
+        finally:
+            server.terminate()
+            server.wait()
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{vehicles} vehicles, {clients} stations, {total} requests in {elapsed:.2f}s "
+          f"= {total / elapsed:.0f} req/s")
+    print(f"{'endpoint':<10} {'requests':>9} {'failed':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for op, values in latencies.items():
+        values.sort()
+        print(f"{op:<10} {len(values):>9} {failures[op]:>7} {percentile(values, 0.5) * 1000:>8.2f} "
+              f"{percentile(values, 0.99) * 1000:>8.2f}")
+    print(f"writes: {metrics['writes']} in {metrics['write_batches']} transactions, "
+          f"lookup cache hit ratio {metrics['cache_hit_ratio']:.0%}, {metrics['rejected_busy']} rejected as busy")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registration service load test")
+    parser.add_argument("--vehicles", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=32, help="concurrent stations")
+    parser.add_argument("--requests", type=int, default=20000, help="total requests across all stations")
+    args = parser.parse_args()
+    run(args.vehicles, args.clients, args.requests)
@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Cold-start benchmark: how long a fresh interpreter takes to get to work.
+#
+#   python bench_startup.py [--runs 10] [--json report.json]
+#
+# Seeds a throwaway database with one vehicle, then times each command below
+# in a new process, --runs times, and reports the median and best wall time
+# plus which heavy modules the command ended up importing. "eager" imports
+# everything the GUIs used to load at the top of the file, for comparison
+# with the headless entry points that import per subcommand.
+
+HEAVY_MODULES = ("tkinter", "PIL.ImageTk", "cv2", "numpy", "qrcode", "pyzbar", "scanner", "decoders")
+
+# Prints the heavy modules loaded by running `argv` as __main__
+PROBE = """
+import json, runpy, sys
+sys.argv = {argv!r}
+code = 0
+try:
+    runpy.run_path(sys.argv[0], run_name="__main__")
+except SystemExit as e:
+    code = e.code or 0
+sys.stdout.flush()
+sys.stderr.write("\\nLOADED " + json.dumps([m for m in {heavy!r} if m in sys.modules]) + "\\n")
+sys.exit(code)
+"""
+
+EAGER = ("import tkinter, qrcode, cv2, numpy; from PIL import Image, ImageTk; "
+         "import database, registration, scanner, decoders")
+
+
+def commands(db_path, out_dir):
+    cli = [sys.executable, "cli.py", "--db", db_path]
+    return {
+        "python -c pass": [sys.executable, "-c", "pass"],
+        "cli lookup": cli + ["lookup", "MH12AB0001"],
+        "cli set-status": cli + ["set-status", "MH12AB0001", "Washing", "In Process"],
+        "cli generate-qr": cli + ["generate-qr", "--data", "MH12AB0001", "--out", os.path.join(out_dir, "qr.png")],
+        "cli register": cli + ["register", "--first-name", "Bench", "--last-name", "Mark", "--mobile", "9876543210",
+                               "--type", "Car", "--brand", "Honda", "--number", "MH12AB0002", "--service", "Washing"],
+        "import form_with_db": [sys.executable, "-c", "import form_with_db"],
+        "import tracking_from_db": [sys.executable, "-c", "import tracking_from_db"],
+        "eager GUI imports": [sys.executable, "-c", EAGER],
+    }
+
+
+def loaded_modules(argv):
+    if argv[1] == "-c":
+        code = argv[2] + f"; import sys; print('LOADED', __import__('json').dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]), file=sys.stderr)"
+        probe = [sys.executable, "-c", code]
+    else:
+        probe = [sys.executable, "-c", PROBE.format(argv=argv[1:], heavy=HEAVY_MODULES)]
+    result = subprocess.run(probe, capture_output=True, text=True)
+    for line in result.stderr.splitlines():
+        if line.startswith("LOADED "):
+            return json.loads(line[len("LOADED "):])
+    return ["?"]
+
+
+def time_command(argv, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise SystemExit(f"{' '.join(argv)} failed:\n{result.stderr}")
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time cold starts of the CLI against the GUI imports")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+
+    from actions import register_vehicle
+    from database import create_table
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "startup.db")
+        create_table(db_path)
+        register_vehicle({"first_name": "Bench", "last_name": "Mark", "mobile_no": "9876543210", "address": "",
+                          "pincode": "", "vehicle_type": "Car", "vehicle_brand": "Honda",
+                          "vehicle_number": "MH12AB0001"}, ["Washing"], db_path=db_path)
+
+        results = {}
+        print(f"{'command':<24} {'median ms':>10} {'best ms':>8}  heavy modules loaded")
+        for name, argv in commands(db_path, tmp).items():
+            # "cli register" adds a registration per run; repeat visits of a plate are allowed
+            times = time_command(argv, args.runs)
+            loaded = loaded_modules(argv)
+            results[name] = {"median": statistics.median(times), "best": min(times), "loaded": loaded}
+            print(f"{name:<24} {statistics.median(times) * 1000:>10.1f} {min(times) * 1000:>8.1f}  "
+                  f"{', '.join(loaded) or '-'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": args.runs, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
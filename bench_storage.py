@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from database import get_db, migrate
+
+# Size / scan-speed comparison of inline QR blobs in users versus the
+# qr_images side table.
+#
+#   python bench_storage.py [--rows 100000] [--png-size 3000] [--json report.json]
+#
+# Builds a database in the original layout (PNG inline in users.qr_code),
+# measures it, migrates it to the current schema, VACUUMs and measures again.
+# PNG bytes are random, which is as incompressible as real QR PNGs.
+
+LEGACY_SCHEMA = '''CREATE TABLE users (
+                      id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      first_name TEXT,
+                      last_name TEXT,
+                      mobile_no TEXT,
+                      address TEXT,
+                      pincode TEXT,
+                      vehicle_type TEXT,
+                      vehicle_brand TEXT,
+                      vehicle_number TEXT,
+                      services TEXT,
+                      total_price REAL,
+                      qr_code BLOB
+                  )'''
+
+# A report-style query that has to visit every users row
+SCAN_QUERY = "SELECT vehicle_type, COUNT(*), SUM(total_price) FROM users GROUP BY vehicle_type"
+
+
+def build_legacy_db(path, rows, png_size, seed=0):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    batch = []
+    for i in range(rows):
+        batch.append((f"First{i}", f"Last{i}", f"98{i:08d}", f"{i} Bench Road", "411001",
+                      rng.choice(["Car", "Bike", "Truck"]), "Bench", f"MH12BN{i:06d}",
+                      "Washing (₹100), Oil Change (₹300)", 400, rng.randbytes(png_size)))
+        if len(batch) == 5000:
+            conn.executemany("INSERT INTO users (first_name, last_name, mobile_no, address, pincode, vehicle_type, "
+                             "vehicle_brand, vehicle_number, services, total_price, qr_code) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO users (first_name, last_name, mobile_no, address, pincode, vehicle_type, "
+                         "vehicle_brand, vehicle_number, services, total_price, qr_code) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.close()
+
+
+def measure(path, repeats=5):
+    conn = sqlite3.connect(path)
+    users_pages = conn.execute("SELECT COUNT(*) FROM dbstat WHERE name = 'users'").fetchone()[0] \
+        if has_dbstat(conn) else None
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        conn.execute(SCAN_QUERY).fetchall()
+        timings.append(time.perf_counter() - start)
+    conn.close()
+    return {
+        "file_mb": os.path.getsize(path) / 2 ** 20,
+        "users_pages": users_pages,
+        "scan_ms": min(timings) * 1000,
+    }
+
+
+def has_dbstat(conn):
+    try:
+        conn.execute("SELECT 1 FROM dbstat LIMIT 1")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def run(rows, png_size, json_path=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        build_legacy_db(path, rows, png_size)
+        before = measure(path)
+
+        db = get_db(path)
+        start = time.perf_counter()
+        migrate(db)
+        migrate_seconds = time.perf_counter() - start
+        db.connection().execute("VACUUM")
+        db.close_all()
+        after = measure(path)
+
+    print(f"{rows} registrations, {png_size}-byte QR PNGs (migration took {migrate_seconds:.1f}s)")
+    print(f"{'':<18} {'file MB':>9} {'users pages':>12} {'full scan ms':>13}")
+    for label, result in (("inline qr_code", before), ("qr_images table", after)):
+        pages = result["users_pages"] if result["users_pages"] is not None else "n/a"
+        print(f"{label:<18} {result['file_mb']:>9.1f} {pages:>12} {result['scan_ms']:>13.1f}")
+    print(f"full scan speed-up: {before['scan_ms'] / after['scan_ms']:.1f}x")
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({"rows": rows, "png_size": png_size, "migrate_seconds": migrate_seconds,
+                       "before": before, "after": after}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="QR blob storage benchmark")
+    parser.add_argument("--rows", type=int, default=100000, help="registrations (default: %(default)s)")
+    parser.add_argument("--png-size", type=int, default=3000, help="bytes per QR PNG (default: %(default)s)")
+    parser.add_argument("--json", help="write results as JSON")
+    args = parser.parse_args()
+    run(args.rows, args.png_size, args.json)
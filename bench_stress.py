@@ -0,0 +1,223 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from bench_lookup import seed, percentile
+from database import SERVICE_STATUSES, PRAGMAS, get_db, create_table, resolve_scanned, set_service_status, \
+    is_lock_error
+from registration import SERVICES, encode_token
+
+# Several registration desks and bay scanners, each its own process, on one
+# SQLite file, to reproduce the lock errors and latency spikes of a busy day.
+#
+#   python bench_stress.py [--desks 3] [--scanners 6] [--duration 20] [--vehicles 20000]
+#                          [--desk-rate 2] [--scan-rate 10] [--update-share 0.3] [--report stress.json]
+#
+# Desks run what form_with_db's submit does (actions.register_vehicle: price,
+# validate, render the QR code, insert), some of them for vehicles coming
+# back. Scanners run the tracker's path: resolve the scanned code, look the
+# vehicle up through a VehicleCache, and for --update-share of the scans
+# commit a status change like the StatusWriter does. Scans go mostly to
+# vehicles in the bays, so stations contend for the same rows.
+#
+# Arrivals are random (Poisson) at --desk-rate / --scan-rate per process
+# per second, or back to back with 0. Latency is measured from when an
+# operation was due, so a station that falls behind while waiting for the
+# write lock shows it instead of hiding it. Errors are counted, not retried;
+# "locked" errors are the ones that got past the busy timeout and the lock
+# retries in database.transaction().
+#
+# --report writes a JSON report (configuration, SQLite settings, per
+# operation throughput, p50/p95/p99/max and errors, lock waits) to compare
+# runs after schema or connection changes.
+
+BAY_VEHICLES = 200
+REVISIT_SHARE = 0.2
+COMPACT_SHARE = 0.5
+
+
+def desk_record(rng, number):
+    return {
+        "first_name": rng.choice(["Asha", "Ravi", "Neha", "Vikram", "Priya", "Sunil"]), "last_name": "Stress",
+        "mobile_no": f"9{rng.randrange(10 ** 9):09d}", "address": "Pune", "pincode": "411001",
+        "vehicle_type": rng.choice(["Car", "Bike"]), "vehicle_brand": "Bench", "vehicle_number": number,
+    }
+
+
+def error_kind(error):
+    if is_lock_error(error):
+        return "locked"
+    return type(error).__name__
+
+
+# Runs in its own process; puts {"ops": {op: [latency, ...]}, "errors": {...}, "db": stats}
+def station(role, index, path, config, start_at, results):
+    from actions import register_vehicle
+    from lookup_cache import VehicleCache
+    # QR rendering loads on a desk's first registration; load it before the start
+    import qr_cache
+
+    rng = random.Random(f"{role}{index}")
+    db = get_db(path)
+    db.busy_timeout_ms = config["busy_timeout_ms"]
+    cache = VehicleCache(db)
+    bay = [rng.randrange(config["vehicles"]) for _ in range(BAY_VEHICLES)]
+    service_names = [name for name, price in SERVICES]
+    rate = config["desk_rate"] if role == "desk" else config["scan_rate"]
+    latencies = {}
+    errors = {}
+    registered = 0
+
+    def timed_op(op, due, func, *args):
+        try:
+            func(*args)
+        except (sqlite3.Error, ValueError, OSError) as e:
+            errors.setdefault(op, {}).setdefault(error_kind(e), 0)
+            errors[op][error_kind(e)] += 1
+        latencies.setdefault(op, []).append(time.perf_counter() - due)
+
+    def scan(qr_data):
+        vehicle_number = resolve_scanned(db.connection(), qr_data)
+        result, services = cache.get(vehicle_number)
+        if result is None:
+            raise ValueError(f"unknown vehicle {vehicle_number}")
+
+    def update_status(vehicle_number, service, status):
+        with db.transaction() as conn:
+            set_service_status(conn, vehicle_number, service, status)
+
+    while time.time() < start_at:
+        time.sleep(0.001)
+    due = time.perf_counter()
+    stop = due + config["duration"]
+    while due < stop:
+        now = time.perf_counter()
+        if due > now:
+            time.sleep(due - now)
+        if role == "desk":
+            if rng.random() < REVISIT_SHARE:
+                number = f"MH12BN{rng.randrange(config['vehicles']):06d}"
+            else:
+                registered += 1
+                number = f"MH14D{index:02d}{registered:06d}"
+            timed_op("register", due, register_vehicle, desk_record(rng, number),
+                     rng.sample(service_names, rng.randrange(1, 4)), rng.random() < COMPACT_SHARE, path)
+        else:
+            vehicle = rng.choice(bay)
+            # Seeded vehicles have ids 1..vehicles in order
+            qr_data = encode_token(vehicle + 1) if rng.random() < COMPACT_SHARE else \
+                json.dumps({"Vehicle Number": f"MH12BN{vehicle:06d}"})
+            timed_op("scan", due, scan, qr_data)
+            if rng.random() < config["update_share"]:
+                timed_op("status", time.perf_counter(), update_status, f"MH12BN{vehicle:06d}",
+                         rng.choice(SERVICES[:2])[0], rng.choice(SERVICE_STATUSES))
+        due = due + rng.expovariate(rate) if rate else time.perf_counter()
+
+    results.put({"role": role, "ops": latencies, "errors": errors, "db": dict(db.stats)})
+    db.close_all()
+
+
+def summarize(config, outcomes, elapsed):
+    ops = {}
+    for outcome in outcomes:
+        for op, values in outcome["ops"].items():
+            ops.setdefault(op, []).extend(values)
+    report = {
+        "config": config,
+        "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                        "cpus": os.cpu_count(), "platform": platform.platform(), "pragmas": PRAGMAS},
+        "elapsed_seconds": round(elapsed, 3),
+        "operations": {},
+        "locks": {},
+    }
+    for op, values in sorted(ops.items()):
+        values.sort()
+        errors = {}
+        for outcome in outcomes:
+            for kind, count in outcome["errors"].get(op, {}).items():
+                errors[kind] = errors.get(kind, 0) + count
+        report["operations"][op] = {
+            "count": len(values), "per_second": round(len(values) / elapsed, 1),
+            "p50_ms": round(percentile(values, 0.5) * 1000, 2), "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2), "max_ms": round(values[-1] * 1000, 2),
+            "errors": errors, "error_rate": round(sum(errors.values()) / len(values), 4),
+        }
+    for key in ("transactions", "lock_waits", "lock_wait_seconds", "lock_retries"):
+        report["locks"][key] = round(sum(outcome["db"][key] for outcome in outcomes), 3)
+    return report
+
+
+def format_report(report):
+    config = report["config"]
+    lines = [f"{config['desks']} desks at {config['desk_rate'] or 'max'}/s, "
+             f"{config['scanners']} scanners at {config['scan_rate'] or 'max'}/s, "
+             f"{config['vehicles']} vehicles, {report['elapsed_seconds']:.1f}s",
+             f"{'operation':<10} {'count':>7} {'per s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+             f"{'max ms':>8} {'errors':>7}"]
+    for op, stats in report["operations"].items():
+        lines.append(f"{op:<10} {stats['count']:>7} {stats['per_second']:>8.1f} {stats['p50_ms']:>8.2f} "
+                     f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f} "
+                     f"{sum(stats['errors'].values()):>7}")
+        for kind, count in stats["errors"].items():
+            lines.append(f"  {kind}: {count}")
+    locks = report["locks"]
+    lines.append(f"{locks['transactions']:.0f} transactions, {locks['lock_waits']:.0f} waited for the write lock "
+                 f"({locks['lock_wait_seconds'] * 1000:.0f} ms in all), {locks['lock_retries']:.0f} lock retries")
+    return "\n".join(lines)
+
+
+def run(config, path):
+    if not os.path.exists(path):
+        seed(path, config["vehicles"]).close_all()
+    create_table(path)
+    results = multiprocessing.Queue()
+    start_at = time.time() + 1.0
+    processes = [multiprocessing.Process(target=station, args=(role, i, path, config, start_at, results))
+                 for role, count in (("desk", config["desks"]), ("scanner", config["scanners"]))
+                 for i in range(count)]
+    for process in processes:
+        process.start()
+    # Drain before joining: a child blocks on exit until its result is read
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return summarize(config, outcomes, config["duration"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-station SQLite stress test")
+    parser.add_argument("--desks", type=int, default=3, help="registration desk processes")
+    parser.add_argument("--scanners", type=int, default=6, help="bay scanner processes")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load")
+    parser.add_argument("--vehicles", type=int, default=20000, help="vehicles seeded before the run")
+    parser.add_argument("--desk-rate", type=float, default=2, help="registrations per desk per second (0: no pause)")
+    parser.add_argument("--scan-rate", type=float, default=10, help="scans per scanner per second (0: no pause)")
+    parser.add_argument("--update-share", type=float, default=0.3, help="share of scans followed by a status change")
+    parser.add_argument("--busy-timeout-ms", type=int, default=5000)
+    parser.add_argument("--db", help="run against this file, seeding it if missing (default: a temporary file)")
+    parser.add_argument("--report", help="write the JSON report here ('-' for stdout)")
+    args = parser.parse_args()
+    config = {key: getattr(args, key) for key in ("desks", "scanners", "duration", "vehicles", "desk_rate",
+                                                  "scan_rate", "update_share", "busy_timeout_ms")}
+
+    if args.db:
+        report = run(config, args.db)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            report = run(config, os.path.join(tmp, "stress.db"))
+    if args.report == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(report, f, indent=2)
+    failed = sum(sum(stats["errors"].values()) for stats in report["operations"].values())
+    sys.exit(1 if failed else 0)
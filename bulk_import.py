@@ -0,0 +1,210 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+from multiprocessing import Pool
+
+import metrics
+from database import DB_PATH, get_db, migrate, insert_registrations, parse_service_entry, set_qr_code
+from registration import SERVICE_PRICES, validate_registration, price_services, qr_payload, qr_png, encode_token
+
+# Bulk registration import from a CSV or JSONL export.
+#
+#   python bulk_import.py fleet.csv [--db vehicle_registration.db] [--batch-size 500] [--workers N]
+#
+# Rows are validated exactly like the registration form, QR PNGs are rendered
+# across a process pool and rows are written in batched transactions. At most
+# two batches are held in memory: one rendering while the previous one is
+# written. The number of source rows consumed is committed together with each
+# batch, so an interrupted import picks up where it stopped when re-run.
+
+FIELDS = ["first_name", "last_name", "mobile_no", "address", "pincode",
+          "vehicle_type", "vehicle_brand", "vehicle_number"]
+
+
+# "Mobile No." / "Vehicle Number" / "vehicle_number" -> "mobile_no" / "vehicle_number"
+def normalize_key(key):
+    return key.strip().lower().rstrip(".").replace(" ", "_")
+
+
+# Rows as dicts; a JSONL line that can't be a row is yielded as an error
+# message instead, so it is rejected like a row that fails validation
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.lower().endswith((".jsonl", ".ndjson", ".json")):
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield f"line {line_number}: not valid JSON ({e.msg})"
+                    continue
+                if not isinstance(row, dict):
+                    yield f"line {line_number}: expected a JSON object, got {type(row).__name__}"
+                    continue
+                yield row
+        else:
+            for row in csv.DictReader(f):
+                yield row
+
+
+# Services may be a JSON list or a ";"/","-separated string of names,
+# optionally written as "Washing (₹100)". ValueError for anything else.
+def parse_service_names(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        separator = ";" if ";" in value else ","
+        value = value.split(separator)
+    elif not isinstance(value, list):
+        raise ValueError("Services must be a list of service names")
+    names = []
+    for entry in value:
+        if not isinstance(entry, str):
+            raise ValueError("Service names must be text")
+        if entry.strip():
+            names.append(parse_service_entry(entry)[0])
+    return names
+
+
+# -> (record, jobs, qr_data), or an error message
+def prepare_row(row):
+    row = {normalize_key(key): value for key, value in row.items() if key}
+    # JSON bodies from service.py can carry any type; CSV cells are always text
+    for field in FIELDS:
+        if isinstance(row.get(field), (list, dict)):
+            return f"{field} must be text"
+    record = {field: str(row.get(field) or "").strip() for field in FIELDS}
+
+    try:
+        service_names = parse_service_names(row.get("services"))
+    except ValueError as e:
+        return str(e)
+    unknown = [name for name in service_names if name not in SERVICE_PRICES]
+    if unknown:
+        return f"Unknown service(s): {', '.join(unknown)}"
+
+    selected_services, selected_jobs, total_price = price_services(service_names)
+    record["total_price"] = total_price
+
+    error = validate_registration(record)
+    if error:
+        return error
+
+    return record, selected_jobs, qr_payload(record, selected_services, total_price)
+
+
+def write_batch(db, source, batch, pngs, rows_done):
+    registrations = [(record, jobs, png) for (record, jobs, qr_data), png in zip(batch, pngs)]
+    with db.transaction() as conn:
+        user_ids = insert_registrations(conn, registrations)
+        conn.execute('''INSERT INTO import_progress (source, rows_done) VALUES (?, ?)
+                        ON CONFLICT(source) DO UPDATE SET rows_done = excluded.rows_done''',
+                     (source, rows_done))
+    return user_ids
+
+
+# Compact QR codes encode the registration id, so they are rendered after the
+# rows exist. Rows left without a QR code by an interrupted compact import
+# are picked up again here on the next run.
+def write_compact_qr_codes(db, pool, user_ids, chunksize):
+    pngs = pool.map(qr_png, [encode_token(user_id) for user_id in user_ids], chunksize)
+    with db.transaction() as conn:
+        for user_id, png in zip(user_ids, pngs):
+            set_qr_code(conn, user_id, png)
+
+
+def backfill_compact_qr_codes(db, pool, batch_size, chunksize):
+    last_id = 0
+    while True:
+        user_ids = [row[0] for row in db.connection().execute(
+            "SELECT id FROM users WHERE qr_hash IS NULL AND id > ? ORDER BY id LIMIT ?", (last_id, batch_size))]
+        if not user_ids:
+            return
+        write_compact_qr_codes(db, pool, user_ids, chunksize)
+        last_id = user_ids[-1]
+
+
+def bulk_import(path, db_path=DB_PATH, batch_size=500, workers=None, resume=True, compact=False, out=sys.stderr):
+    db = get_db(db_path)
+    migrate(db)
+    source = os.path.abspath(path)
+
+    rows_done = 0
+    if resume:
+        row = db.connection().execute("SELECT rows_done FROM import_progress WHERE source = ?", (source,)).fetchone()
+        rows_done = row[0] if row else 0
+        if rows_done:
+            print(f"Resuming {path} after row {rows_done}", file=out)
+
+    rows = islice(read_rows(path), rows_done, None)
+    imported = rejected = 0
+    start = time.perf_counter()
+
+    with Pool(workers) as pool:
+        chunksize = max(1, batch_size // (4 * (workers or os.cpu_count() or 1)))
+        if compact:
+            backfill_compact_qr_codes(db, pool, batch_size, chunksize)
+
+        pending = None
+        while True:
+            raw_batch = list(islice(rows, batch_size))
+
+            batch = []
+            for offset, row in enumerate(raw_batch, start=rows_done + 1):
+                prepared = row if isinstance(row, str) else prepare_row(row)
+                if isinstance(prepared, str):
+                    rejected += 1
+                    print(f"Row {offset}: {prepared}", file=out)
+                else:
+                    batch.append(prepared)
+            rows_done += len(raw_batch)
+
+            if compact:
+                if not raw_batch:
+                    break
+                user_ids = write_batch(db, source, batch, [None] * len(batch), rows_done)
+                write_compact_qr_codes(db, pool, user_ids, chunksize)
+                imported += len(batch)
+                elapsed = time.perf_counter() - start
+                print(f"{imported} rows imported, {rejected} rejected, {imported / elapsed:.0f} rows/s", file=out)
+                continue
+
+            # Render this batch while the previous one is written
+            rendering = pool.map_async(qr_png, [qr_data for record, jobs, qr_data in batch], chunksize)
+            if pending:
+                write_batch(db, source, *pending)
+                imported += len(pending[1])
+                elapsed = time.perf_counter() - start
+                print(f"{imported} rows imported, {rejected} rejected, {imported / elapsed:.0f} rows/s", file=out)
+            if not raw_batch:
+                break
+            # Time spent waiting on the render processes rather than writing
+            with metrics.timer("qr_render_wait"):
+                pngs = rendering.get()
+            pending = (batch, pngs, rows_done)
+
+    elapsed = time.perf_counter() - start
+    rate = imported / elapsed if elapsed else 0.0
+    print(f"Done: {imported} rows imported, {rejected} rejected in {elapsed:.1f}s ({rate:.0f} rows/s)", file=out)
+    print(db.report(), file=out)
+    print(metrics.report(), file=out)
+    return imported, rejected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import vehicle registrations from CSV or JSONL")
+    parser.add_argument("source", help="CSV (with a header row) or JSONL file")
+    parser.add_argument("--db", default=DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows per transaction (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="QR rendering processes (default: CPU count)")
+    parser.add_argument("--restart", action="store_true", help="ignore the saved resume point")
+    parser.add_argument("--compact", action="store_true", help="encode compact registration-id QR codes")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure(args.metrics_prom, args.metrics_jsonl, args.profile)
+    bulk_import(args.source, args.db, args.batch_size, args.workers, resume=not args.restart, compact=args.compact)
@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import sys
+
+# Headless entry points for cron jobs, scripts and servers:
+#
+#   python cli.py register --first-name A --last-name B --mobile 9876543210 --type Car \
+#                          --brand Honda --number MH12AB1234 --service Washing [--compact] [--qr-out qr.png]
+#   python cli.py generate-qr (--data TEXT | --id N | --vehicle NUMBER) [--format png|svg] [--out FILE]
+#   python cli.py lookup (NUMBER | --qr DATA) [--json]
+#   python cli.py set-status NUMBER SERVICE STATUS
+#
+# Global options: --db FILE, or --server URL (QR_SERVICE_URL) to go through
+# service.py. Only argparse and the standard library load up front; each
+# subcommand imports what it needs, so nothing here pulls in Tk or OpenCV,
+# and QR rendering (qrcode, NumPy) loads only for commands that draw a code.
+
+
+class CommandError(Exception):
+    pass
+
+
+def open_database(args):
+    from database import DB_PATH, create_table
+
+    db_path = args.db or DB_PATH
+    create_table(db_path)
+    return db_path
+
+
+def server_client(args):
+    url = args.server or os.environ.get("QR_SERVICE_URL")
+    if not url:
+        return None
+    from service_client import ServiceClient
+    return ServiceClient(url)
+
+
+def write_output(data, path):
+    if path in (None, "-"):
+        if isinstance(data, bytes):
+            sys.stdout.buffer.write(data)
+        else:
+            sys.stdout.write(data)
+        return
+    with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+        f.write(data)
+
+
+def cmd_register(args):
+    record = {
+        "first_name": args.first_name, "last_name": args.last_name, "mobile_no": args.mobile,
+        "address": args.address, "pincode": args.pincode, "vehicle_type": args.type,
+        "vehicle_brand": args.brand, "vehicle_number": args.number,
+    }
+    client = server_client(args)
+    if client:
+        registered = client.register(record, args.service, args.compact)
+        user_id, qr_data = registered["id"], registered["qr_data"]
+        png = client.qr_png(user_id) if args.qr_out else None
+    else:
+        from actions import register_vehicle
+        user_id, qr_data, png = register_vehicle(record, args.service, args.compact, open_database(args))
+    if args.qr_out:
+        write_output(png, args.qr_out)
+    print(f"Registered {args.number} as #{user_id}, QR data: {qr_data}")
+
+
+def cmd_generate_qr(args):
+    if args.vehicle:
+        # Reprint the stored code
+        if args.format != "png":
+            raise CommandError("Stored QR codes are PNG; use --format png")
+        client = server_client(args)
+        if client:
+            vehicle, services, archive = client.lookup(args.vehicle)
+            png = client.qr_png(vehicle[0]) if vehicle else None
+        else:
+            from actions import stored_qr
+            png = stored_qr(args.vehicle, open_database(args))
+        if png is None:
+            raise CommandError(f"No QR code stored for vehicle {args.vehicle}")
+        write_output(png, args.out)
+        return
+
+    from actions import render_qr
+    if args.id is not None:
+        from registration import encode_token
+        payload = encode_token(args.id)
+    else:
+        payload = args.data
+    write_output(render_qr(payload, args.format), args.out)
+
+
+def cmd_lookup(args):
+    client = server_client(args)
+    if client:
+        vehicle_number = client.resolve(args.qr) if args.qr else args.vehicle
+        vehicle, services, archive = client.lookup(vehicle_number) if vehicle_number else (None, [], None)
+    else:
+        from actions import resolve_qr, lookup_vehicle
+        db_path = open_database(args)
+        vehicle_number = resolve_qr(args.qr, db_path) if args.qr else args.vehicle
+        vehicle, services, archive = lookup_vehicle(vehicle_number, db_path) if vehicle_number else (None, [], None)
+    if not vehicle:
+        raise CommandError("No data found for this vehicle.")
+
+    user_id, first_name, last_name, vehicle_type, vehicle_brand = vehicle
+    if args.json:
+        print(json.dumps({"id": user_id, "first_name": first_name, "last_name": last_name,
+                          "vehicle_type": vehicle_type, "vehicle_brand": vehicle_brand,
+                          "vehicle_number": vehicle_number, "archive": archive,
+                          "services": [{"service": service, "status": status} for service, status in services]}))
+        return
+    print(f"Name: {first_name} {last_name}")
+    print(f"Vehicle: {vehicle_type} {vehicle_brand} ({vehicle_number})")
+    if archive:
+        print(f"Archived ({archive}); statuses can't be changed")
+    for service, status in services:
+        print(f"  {service}: {status}")
+
+
+def cmd_set_status(args):
+    client = server_client(args)
+    if client:
+        if not client.set_status(args.vehicle, args.service, args.status):
+            raise CommandError(f"No {args.service} job found for vehicle {args.vehicle}")
+    else:
+        from actions import update_status
+        update_status(args.vehicle, args.service, args.status, open_database(args))
+    print(f"Updated {args.service} to {args.status} for vehicle {args.vehicle}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Vehicle registration and service tracking, without the GUI")
+    parser.add_argument("--db", help="database file (default: vehicle_registration.db)")
+    parser.add_argument("--server", help="use the registration service at this URL instead of a database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    register = commands.add_parser("register", help="register a vehicle and store its QR code")
+    register.add_argument("--first-name", required=True)
+    register.add_argument("--last-name", required=True)
+    register.add_argument("--mobile", required=True, help="10 digit mobile number")
+    register.add_argument("--address", default="")
+    register.add_argument("--pincode", default="")
+    register.add_argument("--type", required=True, help="vehicle type, e.g. Car")
+    register.add_argument("--brand", required=True)
+    register.add_argument("--number", required=True, help="vehicle number plate")
+    register.add_argument("--service", action="append", default=[], help="service name; repeat for several")
+    register.add_argument("--compact", action="store_true", help="encode only the registration id")
+    register.add_argument("--qr-out", help="also write the QR PNG here")
+    register.set_defaults(func=cmd_register)
+
+    generate = commands.add_parser("generate-qr", help="render a QR code, or reprint a stored one")
+    payload = generate.add_mutually_exclusive_group(required=True)
+    payload.add_argument("--data", help="encode this text")
+    payload.add_argument("--id", type=int, help="compact code for this registration id")
+    payload.add_argument("--vehicle", help="stored code of this vehicle's latest registration")
+    generate.add_argument("--format", choices=["png", "svg"], default="png")
+    generate.add_argument("--out", help="output file (default: stdout)")
+    generate.set_defaults(func=cmd_generate_qr)
+
+    lookup = commands.add_parser("lookup", help="show a vehicle and its service statuses")
+    target = lookup.add_mutually_exclusive_group(required=True)
+    target.add_argument("vehicle", nargs="?", help="vehicle number plate")
+    target.add_argument("--qr", help="scanned QR data (JSON record or compact token)")
+    lookup.add_argument("--json", action="store_true", help="print JSON")
+    lookup.set_defaults(func=cmd_lookup)
+
+    set_status = commands.add_parser("set-status", help="update one service's status")
+    set_status.add_argument("vehicle")
+    set_status.add_argument("service")
+    set_status.add_argument("status", help="Pending, In Process or Completed")
+    set_status.set_defaults(func=cmd_set_status)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.func(args)
+    except (CommandError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except Exception as e:
+        # sqlite3 / service errors, without importing those modules up front
+        if type(e).__module__ in ("sqlite3", "service_client", "http.client") or isinstance(e, OSError):
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        raise
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
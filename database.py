@@ -0,0 +1,885 @@
+import hashlib
+import json
+import os
+import re
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import timed, timer
+from registration import parse_scanned, normalize_vehicle_number
+
+DB_PATH = 'vehicle_registration.db'
+
+SERVICE_STATUSES = ["Pending", "In Process", "Completed"]
+
+# A vehicle with a job in one of these is still in the workshop
+OPEN_STATUSES = [status for status in SERVICE_STATUSES if status != "Completed"]
+
+# Vehicles read per query in an incremental board refresh
+BOARD_KEYS_CHUNK = 500
+
+# Recorded with every status change; set QR_STATION to name a desk or bay
+STATION = os.environ.get("QR_STATION") or socket.gethostname()
+
+# Day of bookings recorded before booking dates were kept
+UNKNOWN_DAY = "unknown"
+
+# Most rows a manual search returns
+SEARCH_LIMIT = 20
+
+# Start of a plate: state letters, then the district number
+PLATE_PREFIX_RE = re.compile(r"^[A-Za-z]{1,3}[0-9]")
+
+# Matches one "Washing (₹100)" entry of the comma-joined services string
+SERVICE_ENTRY_RE = re.compile(r'^\s*(.*?)\s*\(₹\s*([0-9.]+)\)\s*$')
+
+
+# Connection tuning shared by every station opening the database file
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -8000",
+    "PRAGMA mmap_size = 67108864",
+]
+
+# Retries after SQLite itself gave up waiting for the write lock
+LOCK_RETRIES = 5
+LOCK_RETRY_BACKOFF = 0.05
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+# Owns every connection to one database file: one connection per thread,
+# opened once and reused, in WAL mode with a busy timeout. sqlite3 keeps a
+# per-connection LRU of prepared statements keyed by SQL text, so reusing
+# the connection is what lets the constant queries in this module skip
+# re-preparation. Connections of threads that have exited are closed the
+# next time a thread opens one, so at most one per live thread stays open
+# (plus those of threads that died since the last open).
+class ConnectionManager:
+    def __init__(self, path=DB_PATH, busy_timeout_ms=BUSY_TIMEOUT_MS, cached_statements=STATEMENT_CACHE_SIZE):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # [(owning thread, connection), ...]
+        self._connections = []
+        self.stats = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            # connection() calls answered with the thread's open connection;
+            # helpers call it several times per operation, so this is not a
+            # count of operations
+            "connection_calls_reused": 0,
+            "transactions": 0,
+            "lock_waits": 0,
+            "lock_wait_seconds": 0.0,
+            "lock_retries": 0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000,
+                               isolation_level=None, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            dead = [conn for thread, conn in self._connections if not thread.is_alive()]
+            self._connections = [(thread, conn) for thread, conn in self._connections if thread.is_alive()]
+            self._connections.append((threading.current_thread(), conn))
+            self.stats["connections_opened"] += 1
+            self.stats["connections_closed"] += len(dead)
+        for old in dead:
+            old.close()
+        return conn
+
+    # The calling thread's connection (autocommit; use transaction() to write)
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        else:
+            self._count("connection_calls_reused")
+        return conn
+
+    # Write transaction taking the write lock up front (BEGIN IMMEDIATE), so
+    # contention shows up here, is timed, and is retried with backoff rather
+    # than surfacing as "database is locked" halfway through the writes.
+    @contextmanager
+    def transaction(self):
+        conn = self.connection()
+        for attempt in range(LOCK_RETRIES + 1):
+            start = time.perf_counter()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                break
+            except sqlite3.OperationalError as e:
+                if not is_lock_error(e) or attempt == LOCK_RETRIES:
+                    raise
+                self._count("lock_retries")
+                time.sleep(LOCK_RETRY_BACKOFF * (2 ** attempt))
+        waited = time.perf_counter() - start
+        if waited > 0.001:
+            self._count("lock_waits")
+            self._count("lock_wait_seconds", waited)
+        self._count("transactions")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            with timer("db_commit"):
+                conn.commit()
+
+    def close_all(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for thread, conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+            still_open = len(self._connections)
+        return (f"db {self.path}: {stats['connections_opened']} connections opened, "
+                f"{stats['connections_closed']} closed after their thread exited, {still_open} open, "
+                f"{stats['connection_calls_reused']} connection() calls reused one, "
+                f"{stats['transactions']} transactions, "
+                f"{stats['lock_waits']} lock waits ({stats['lock_wait_seconds'] * 1000:.1f} ms), "
+                f"{stats['lock_retries']} lock retries")
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+# Process-wide manager for a database file
+def get_db(path=DB_PATH):
+    with _managers_lock:
+        manager = _managers.get(path)
+        if manager is None:
+            manager = _managers[path] = ConnectionManager(path)
+        return manager
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+def _migration_1(conn):
+    cursor = conn.cursor()
+    cursor.execute('''CREATE TABLE IF NOT EXISTS users (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        first_name TEXT,
+                        last_name TEXT,
+                        mobile_no TEXT,
+                        address TEXT,
+                        pincode TEXT,
+                        vehicle_type TEXT,
+                        vehicle_brand TEXT,
+                        vehicle_number TEXT,
+                        services TEXT,
+                        total_price REAL,
+                        qr_code BLOB
+                    )''')
+    # One row per (registration, service) holding that service's status
+    cursor.execute('''CREATE TABLE IF NOT EXISTS service_jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                        service TEXT NOT NULL,
+                        price REAL,
+                        status TEXT NOT NULL DEFAULT 'Pending',
+                        UNIQUE (user_id, service)
+                    )''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_vehicle_number ON users(vehicle_number)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_service_jobs_status ON service_jobs(status)")
+
+    # Convert the services column of existing rows into service_jobs rows
+    cursor.execute("SELECT id, services FROM users")
+    for user_id, services_text in cursor.fetchall():
+        jobs = parse_services(services_text)
+        cursor.executemany('''INSERT OR IGNORE INTO service_jobs (user_id, service, price, status)
+                              VALUES (?, ?, ?, ?)''',
+                           [(user_id, service, price, status) for service, price, status in jobs])
+
+
+# Resume points for bulk_import.py, keyed by source file
+def _migration_2(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS import_progress (
+                        source TEXT PRIMARY KEY,
+                        rows_done INTEGER NOT NULL
+                    )''')
+
+
+# QR PNGs move out of users into a content-addressed side table, so the
+# users rows stay small and are only joined to a PNG for a reprint/preview.
+# The old qr_code column is left in place (NULL) for older app versions.
+def _migration_3(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS qr_images (
+                        hash BLOB PRIMARY KEY,
+                        png BLOB NOT NULL
+                    )''')
+    conn.execute("ALTER TABLE users ADD COLUMN qr_hash BLOB")
+
+    last_id = 0
+    while True:
+        rows = conn.execute('''SELECT id, qr_code FROM users
+                                WHERE qr_code IS NOT NULL AND id > ? ORDER BY id LIMIT 500''', (last_id,)).fetchall()
+        if not rows:
+            break
+        for user_id, qr_code_data in rows:
+            conn.execute("UPDATE users SET qr_hash = ?, qr_code = NULL WHERE id = ?",
+                         (store_qr_code(conn, qr_code_data), user_id))
+        last_id = rows[-1][0]
+
+
+# Change counter per vehicle, bumped by triggers on every write that affects
+# what a lookup returns. Readers caching lookups (lookup_cache.py) fetch the
+# rows with seq above the last one they saw to invalidate only those vehicles.
+def _migration_4(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS vehicle_changes (
+                        vehicle_number TEXT PRIMARY KEY,
+                        seq INTEGER NOT NULL
+                    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vehicle_changes_seq ON vehicle_changes(seq)")
+    _create_change_triggers(conn, "vehicle_number")
+
+
+CHANGE_TRIGGERS = ["users_insert_change", "users_update_change", "users_delete_change",
+                   "service_jobs_insert_change", "service_jobs_update_change", "service_jobs_delete_change"]
+
+
+# Triggers bumping vehicle_changes under the users column `key`
+def _create_change_triggers(conn, key):
+    bump = '''INSERT INTO vehicle_changes (vehicle_number, seq)
+               VALUES ({vehicle}, (SELECT COALESCE(MAX(seq), 0) + 1 FROM vehicle_changes))
+               ON CONFLICT(vehicle_number) DO UPDATE SET seq = excluded.seq'''
+    by_user = f"(SELECT {key} FROM users WHERE id = {{row}}.user_id)"
+    vehicles = [f"NEW.{key}", f"NEW.{key}", f"OLD.{key}",
+                by_user.format(row="NEW"), by_user.format(row="NEW"), by_user.format(row="OLD")]
+    events = ["AFTER INSERT ON users", "AFTER UPDATE ON users", "AFTER DELETE ON users",
+              "AFTER INSERT ON service_jobs", "AFTER UPDATE ON service_jobs", "AFTER DELETE ON service_jobs"]
+    for name, event, vehicle in zip(CHANGE_TRIGGERS, events, vehicles):
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} "
+                     f"WHEN {vehicle} IS NOT NULL BEGIN {bump.format(vehicle=vehicle)}; END")
+
+
+# One users row per vehicle, keyed by the normalized plate (see
+# registration.normalize_vehicle_number) under a UNIQUE index; a repeat visit
+# updates that row instead of adding another. Existing duplicates are merged
+# into the latest registration: services it lacks move over from the older
+# rows (the most recent status wins) and the older ids are kept in
+# merged_registrations so compact QR codes already printed still resolve.
+# vehicle_changes is keyed by the normalized plate from here on.
+def _migration_5(conn):
+    conn.create_function("normalize_vehicle_number", 1, normalize_vehicle_number, deterministic=True)
+    conn.execute("ALTER TABLE users ADD COLUMN vehicle_key TEXT")
+    conn.execute('''CREATE TABLE IF NOT EXISTS merged_registrations (
+                        old_id INTEGER PRIMARY KEY,
+                        user_id INTEGER NOT NULL
+                    )''')
+
+    # No change bumps per row while the table is rewritten
+    for name in CHANGE_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute("UPDATE users SET vehicle_key = normalize_vehicle_number(vehicle_number)")
+
+    conn.execute("CREATE TEMP TABLE merge_map (old_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL)")
+    conn.execute('''INSERT INTO merge_map (old_id, user_id)
+                    SELECT id, keep FROM (SELECT id, MAX(id) OVER (PARTITION BY vehicle_key) AS keep
+                                          FROM users WHERE vehicle_key IS NOT NULL)
+                    WHERE id <> keep''')
+    conn.execute("CREATE INDEX temp.idx_merge_map_user_id ON merge_map(user_id)")
+    # Of the older rows' jobs keep only services the surviving row lacks,
+    # one per service (the latest job), then move them over
+    conn.execute('''DELETE FROM service_jobs WHERE id IN (
+                        SELECT jobs.id FROM service_jobs AS jobs JOIN merge_map ON merge_map.old_id = jobs.user_id
+                        WHERE EXISTS (SELECT 1 FROM service_jobs AS kept
+                                      WHERE kept.user_id = merge_map.user_id AND kept.service = jobs.service)
+                           OR jobs.id < (SELECT MAX(other.id) FROM service_jobs AS other
+                                         JOIN merge_map AS other_map ON other_map.old_id = other.user_id
+                                         WHERE other_map.user_id = merge_map.user_id AND other.service = jobs.service))''')
+    conn.execute('''UPDATE service_jobs SET user_id = (SELECT user_id FROM merge_map WHERE old_id = service_jobs.user_id)
+                    WHERE user_id IN (SELECT old_id FROM merge_map)''')
+    conn.execute("INSERT OR REPLACE INTO merged_registrations (old_id, user_id) SELECT old_id, user_id FROM merge_map")
+    conn.execute("DELETE FROM users WHERE id IN (SELECT old_id FROM merge_map)")
+    conn.execute("DELETE FROM qr_images WHERE hash NOT IN (SELECT qr_hash FROM users WHERE qr_hash IS NOT NULL)")
+
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_vehicle_key ON users(vehicle_key)")
+    conn.execute("DROP INDEX IF EXISTS idx_users_vehicle_number")
+
+    # Re-key the change log, then bump every vehicle whose rows were merged so
+    # caches open across the migration drop them
+    conn.execute("DELETE FROM vehicle_changes WHERE normalize_vehicle_number(vehicle_number) IS NULL")
+    conn.execute('''UPDATE OR REPLACE vehicle_changes SET vehicle_number = normalize_vehicle_number(vehicle_number)
+                    WHERE vehicle_number <> normalize_vehicle_number(vehicle_number)''')
+    conn.execute('''INSERT INTO vehicle_changes (vehicle_number, seq)
+                    SELECT DISTINCT users.vehicle_key, (SELECT COALESCE(MAX(seq), 0) + 1 FROM vehicle_changes)
+                    FROM merge_map JOIN users ON users.id = merge_map.user_id WHERE true
+                    ON CONFLICT(vehicle_number) DO UPDATE SET seq = excluded.seq''')
+    conn.execute("DROP TABLE temp.merge_map")
+    _create_change_triggers(conn, "vehicle_key")
+
+
+# Full-text index over names, mobile number and plate for manual lookup when
+# a QR sticker won't scan. External content (the text stays in users only),
+# kept in step by triggers; updates that don't touch the indexed columns,
+# like a new QR code, leave it alone. The plate is indexed as entered
+# ("MH 12 AB 1234" -> mh, 12, ab, 1234) and normalized (mh12ab1234), so
+# both "1234" and "MH12A" find it. Prefix indexes for 2 to 6 characters let
+# type-ahead queries stream the newest matches instead of merging every
+# matching term first (a 4 character name prefix drops from 3 ms to 0.2 ms
+# at 1M rows), for about 55% more index space.
+def _migration_6(conn):
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS users_search USING fts5(
+                        first_name, last_name, mobile_no, vehicle_number, vehicle_key,
+                        content='users', content_rowid='id', prefix='2 3 4 5 6'
+                    )''')
+    columns = "first_name, last_name, mobile_no, vehicle_number, vehicle_key"
+    new_values = "NEW.first_name, NEW.last_name, NEW.mobile_no, NEW.vehicle_number, NEW.vehicle_key"
+    old_values = "OLD.first_name, OLD.last_name, OLD.mobile_no, OLD.vehicle_number, OLD.vehicle_key"
+    insert = f"INSERT INTO users_search (rowid, {columns}) VALUES (NEW.id, {new_values});"
+    delete = f"INSERT INTO users_search (users_search, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});"
+    changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in columns.split(", "))
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS users_search_insert AFTER INSERT ON users BEGIN {insert} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS users_search_delete AFTER DELETE ON users BEGIN {delete} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS users_search_update AFTER UPDATE ON users "
+                 f"WHEN {changed} BEGIN {delete} {insert} END")
+    conn.execute("INSERT INTO users_search (users_search) VALUES ('rebuild')")
+
+
+# Booking history and incrementally maintained summaries, so reports and the
+# jobs board read a few precomputed rows instead of scanning every job.
+#
+#   bookings       one row per service booked, kept when the job is later
+#                  booked again (service_jobs only holds the latest booking)
+#   daily_summary  per day: visits (vehicles booked in), jobs booked, revenue
+#   job_summary    per service x vehicle type x status: jobs and their price
+#
+# Triggers keep both summaries in step with every insert, status or price
+# change, re-typed vehicle and delete; rebuild_summaries recomputes them from
+# scratch. Jobs that predate this migration are recorded as bookings with an
+# unknown day.
+def _migration_7(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS bookings (
+                        id INTEGER PRIMARY KEY,
+                        user_id INTEGER NOT NULL,
+                        service TEXT NOT NULL,
+                        price REAL,
+                        booked_on TEXT
+                    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_user_day ON bookings(user_id, booked_on)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS daily_summary (
+                        day TEXT PRIMARY KEY,
+                        visits INTEGER NOT NULL,
+                        jobs INTEGER NOT NULL,
+                        revenue REAL NOT NULL
+                    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS job_summary (
+                        service TEXT NOT NULL,
+                        vehicle_type TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        jobs INTEGER NOT NULL,
+                        revenue REAL NOT NULL,
+                        PRIMARY KEY (service, vehicle_type, status)
+                    )''')
+    conn.execute("INSERT INTO bookings (user_id, service, price, booked_on) "
+                 "SELECT user_id, service, price, NULL FROM service_jobs ORDER BY id")
+    rebuild_summaries(conn)
+
+    conn.execute(f'''CREATE TRIGGER IF NOT EXISTS daily_summary_booking AFTER INSERT ON bookings BEGIN
+                        INSERT INTO daily_summary (day, visits, jobs, revenue)
+                        VALUES (COALESCE(NEW.booked_on, '{UNKNOWN_DAY}'),
+                                NOT EXISTS (SELECT 1 FROM bookings WHERE user_id = NEW.user_id
+                                            AND booked_on IS NEW.booked_on AND id < NEW.id),
+                                1, COALESCE(NEW.price, 0))
+                        ON CONFLICT(day) DO UPDATE SET visits = visits + excluded.visits, jobs = jobs + 1,
+                                                       revenue = revenue + excluded.revenue;
+                    END''')
+
+    add = '''INSERT INTO job_summary (service, vehicle_type, status, jobs, revenue)
+             {rows}
+             ON CONFLICT(service, vehicle_type, status) DO UPDATE SET
+               jobs = jobs + excluded.jobs, revenue = revenue + excluded.revenue;'''
+    def job(row, sign):
+        vehicle_type = f"COALESCE((SELECT vehicle_type FROM users WHERE id = {row}.user_id), '')"
+        return add.format(rows=f"VALUES ({row}.service, {vehicle_type}, {row}.status, {sign}1, "
+                               f"{sign}COALESCE({row}.price, 0))")
+    def vehicle_jobs(vehicle_type, sign):
+        return add.format(rows=f"SELECT service, COALESCE({vehicle_type}, ''), status, {sign}COUNT(*), "
+                               f"{sign}COALESCE(SUM(price), 0) FROM service_jobs WHERE user_id = OLD.id "
+                               f"GROUP BY service, status")
+    changed = " OR ".join(f"OLD.{column} IS NOT NEW.{column}" for column in ("user_id", "service", "status", "price"))
+    triggers = [
+        ("job_summary_insert", "AFTER INSERT ON service_jobs", job("NEW", "")),
+        ("job_summary_update", f"AFTER UPDATE ON service_jobs WHEN {changed}", job("OLD", "-") + job("NEW", "")),
+        # Jobs deleted with their vehicle are taken off by users_job_summary_delete
+        ("job_summary_delete", "AFTER DELETE ON service_jobs WHEN EXISTS (SELECT 1 FROM users WHERE id = OLD.user_id)",
+         job("OLD", "-")),
+        ("users_job_summary_type", "AFTER UPDATE OF vehicle_type ON users "
+                                   "WHEN OLD.vehicle_type IS NOT NEW.vehicle_type",
+         vehicle_jobs("OLD.vehicle_type", "-") + vehicle_jobs("NEW.vehicle_type", "")),
+        ("users_job_summary_delete", "BEFORE DELETE ON users", vehicle_jobs("OLD.vehicle_type", "-")),
+    ]
+    for name, event, body in triggers:
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END")
+
+
+# Status history. Every status change of a job (and its booking) is appended
+# to status_events by triggers, whatever wrote it, with the station and the
+# time spent in the previous status. service_jobs stays the current-state
+# snapshot, updated in the same transaction, so lookups never replay events;
+# status_since there is when the job entered its status. Turnaround queries
+# ("time in In Process per service") are one range over a covering index.
+# compact_status_events folds events past the retention period into
+# status_event_rollup (per day, service and transition) so the log stays
+# bounded. Jobs from before this migration have no history.
+def _migration_8(conn):
+    conn.execute("ALTER TABLE service_jobs ADD COLUMN station TEXT")
+    conn.execute("ALTER TABLE service_jobs ADD COLUMN status_since REAL")
+    conn.execute('''CREATE TABLE IF NOT EXISTS status_events (
+                        id INTEGER PRIMARY KEY,
+                        job_id INTEGER NOT NULL,
+                        user_id INTEGER NOT NULL,
+                        service TEXT NOT NULL,
+                        old_status TEXT,
+                        new_status TEXT NOT NULL,
+                        station TEXT,
+                        at REAL NOT NULL,
+                        seconds REAL
+                    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_status_events_turnaround "
+                 "ON status_events(old_status, at, service, seconds)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_status_events_job ON status_events(job_id)")
+    conn.execute('''CREATE TABLE IF NOT EXISTS status_event_rollup (
+                        day TEXT NOT NULL,
+                        service TEXT NOT NULL,
+                        old_status TEXT NOT NULL,
+                        new_status TEXT NOT NULL,
+                        events INTEGER NOT NULL,
+                        timed INTEGER NOT NULL,
+                        seconds_total REAL NOT NULL,
+                        seconds_max REAL NOT NULL,
+                        PRIMARY KEY (day, service, old_status, new_status)
+                    )''')
+
+    now = "(julianday('now') - 2440587.5) * 86400.0"
+    event = '''INSERT INTO status_events (job_id, user_id, service, old_status, new_status, station, at, seconds)
+               VALUES (NEW.id, NEW.user_id, NEW.service, {old_status}, NEW.status, NEW.station,
+                       COALESCE(NEW.status_since, {now}), {seconds});'''
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS status_events_insert AFTER INSERT ON service_jobs BEGIN "
+                 f"{event.format(old_status='NULL', now=now, seconds='NULL')} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS status_events_update AFTER UPDATE OF status ON service_jobs "
+                 f"WHEN OLD.status IS NOT NEW.status BEGIN "
+                 f"{event.format(old_status='OLD.status', now=now, seconds='NEW.status_since - OLD.status_since')} END")
+
+
+# Vehicles moved out to monthly archive files by archive.py leave a small
+# pointer behind, so printed compact QR codes still resolve and history
+# lookups know which archive to attach. qr_hash gets an index so a PNG can
+# be kept while a live row still uses it.
+def _migration_9(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS archived_registrations (
+                        user_id INTEGER PRIMARY KEY,
+                        vehicle_key TEXT,
+                        vehicle_number TEXT,
+                        archive TEXT NOT NULL,
+                        archived_at REAL NOT NULL
+                    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_archived_registrations_key ON archived_registrations(vehicle_key)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_qr_hash ON users(qr_hash)")
+
+
+MIGRATIONS = [
+    _migration_1,
+    _migration_2,
+    _migration_3,
+    _migration_4,
+    _migration_5,
+    _migration_6,
+    _migration_7,
+    _migration_8,
+    _migration_9,
+]
+
+
+def migrate(db):
+    version = db.connection().execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with db.transaction() as conn:
+            # Stations starting together all see the old version above; the
+            # one that got the write lock first has already applied this one
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= number:
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+    return len(MIGRATIONS)
+
+
+def create_table(path=DB_PATH):
+    migrate(get_db(path))
+
+
+# What each summary table holds, computed from scratch: (query, number of
+# key columns). Columns are in table order.
+SUMMARY_QUERIES = {
+    "daily_summary": (f'''SELECT COALESCE(booked_on, '{UNKNOWN_DAY}'), COUNT(DISTINCT user_id), COUNT(*),
+                                 COALESCE(SUM(price), 0)
+                          FROM bookings GROUP BY 1''', 1),
+    "job_summary": ('''SELECT service_jobs.service, COALESCE(users.vehicle_type, ''), service_jobs.status, COUNT(*),
+                              COALESCE(SUM(service_jobs.price), 0)
+                       FROM service_jobs JOIN users ON users.id = service_jobs.user_id GROUP BY 1, 2, 3''', 3),
+}
+
+
+# Recompute the summary tables from bookings and service_jobs
+def rebuild_summaries(conn):
+    for table, (query, keys) in SUMMARY_QUERIES.items():
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} {query}")
+
+
+# Where the maintained summaries disagree with a rebuild, as
+# [(table, key, stored values, rebuilt values), ...]; empty if consistent.
+# Rows left at zero by deletes count as missing.
+def check_summaries(conn):
+    mismatches = []
+    for table, (query, keys) in SUMMARY_QUERIES.items():
+        stored = {row[:keys]: row[keys:] for row in conn.execute(f"SELECT * FROM {table}") if any(row[keys:])}
+        rebuilt = {row[:keys]: row[keys:] for row in conn.execute(query)}
+        for key in sorted(stored.keys() | rebuilt.keys()):
+            old, new = stored.get(key), rebuilt.get(key)
+            if old is None or new is None or any(abs(a - b) > 0.005 for a, b in zip(old, new)):
+                mismatches.append((table, key, old, new))
+    return mismatches
+
+
+# Parse the legacy services column into (service, price, status) tuples.
+# Two formats exist in the wild: the JSON {service: status} document the
+# tracker expects, and the "Washing (₹100), Oil Change (₹300)" string the
+# registration form has been writing.
+def parse_services(services_text):
+    if not services_text:
+        return []
+
+    try:
+        services = json.loads(services_text)
+    except json.JSONDecodeError:
+        services = None
+
+    if isinstance(services, dict):
+        jobs = []
+        for entry, status in services.items():
+            service, price = parse_service_entry(entry)
+            jobs.append((service, price, status))
+        return jobs
+
+    jobs = []
+    for entry in services_text.split(","):
+        if entry.strip():
+            service, price = parse_service_entry(entry)
+            jobs.append((service, price, "Pending"))
+    return jobs
+
+
+def parse_service_entry(entry):
+    match = SERVICE_ENTRY_RE.match(entry)
+    if match:
+        return match.group(1), float(match.group(2))
+    return entry.strip(), None
+
+
+# Store a QR PNG once under the SHA-256 of its bytes; returns the hash
+def store_qr_code(conn, qr_code_data):
+    qr_hash = hashlib.sha256(qr_code_data).digest()
+    conn.execute("INSERT OR IGNORE INTO qr_images (hash, png) VALUES (?, ?)", (qr_hash, qr_code_data))
+    return qr_hash
+
+
+USERS_UPSERT = '''INSERT INTO users
+                  (first_name, last_name, mobile_no, address, pincode, vehicle_type, vehicle_brand, vehicle_number,
+                   services, total_price, qr_hash, vehicle_key)
+                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                  ON CONFLICT(vehicle_key) DO UPDATE SET
+                    first_name = excluded.first_name, last_name = excluded.last_name, mobile_no = excluded.mobile_no,
+                    address = excluded.address, pincode = excluded.pincode, vehicle_type = excluded.vehicle_type,
+                    vehicle_brand = excluded.vehicle_brand, vehicle_number = excluded.vehicle_number,
+                    services = excluded.services, total_price = excluded.total_price,
+                    qr_hash = COALESCE(excluded.qr_hash, qr_hash)
+                  RETURNING id'''
+
+# A service booked again on a later visit starts over as Pending at today's price
+JOBS_UPSERT = """INSERT INTO service_jobs (user_id, service, price, status, station, status_since)
+                 VALUES (?, ?, ?, 'Pending', ?, ?)
+                 ON CONFLICT(user_id, service) DO UPDATE SET
+                   price = excluded.price, status = 'Pending', station = excluded.station,
+                   status_since = CASE WHEN status = 'Pending' THEN status_since ELSE excluded.status_since END"""
+
+
+# Every booking is also kept in the history that daily_summary is built from
+BOOKING_INSERT = """INSERT INTO bookings (user_id, service, price, booked_on)
+                    VALUES (?, ?, ?, DATE('now', 'localtime'))"""
+
+def _users_row(record, services, qr_hash):
+    return (record["first_name"], record["last_name"], record["mobile_no"], record["address"],
+            record["pincode"], record["vehicle_type"], record["vehicle_brand"], record["vehicle_number"],
+            ", ".join(f"{service} (₹{price})" for service, price in services), record["total_price"], qr_hash,
+            normalize_vehicle_number(record["vehicle_number"]))
+
+
+# Register a visit: the vehicle's row is inserted, or updated in place if the
+# (normalized) plate is already known, and each selected service gets a
+# Pending service_jobs row. `services` is a list of (service, price) tuples.
+# Returns the vehicle's registration id, which stays the same across visits.
+# Without a new QR code the stored one is kept.
+@timed("db_insert")
+def insert_registration(conn, record, services, qr_code_data):
+    qr_hash = store_qr_code(conn, qr_code_data) if qr_code_data else None
+    cursor = conn.cursor()
+    user_id = cursor.execute(USERS_UPSERT, _users_row(record, services, qr_hash)).fetchone()[0]
+    jobs = [(user_id, service, price) for service, price in services]
+    booked_at = time.time()
+    cursor.executemany(JOBS_UPSERT, [job + (STATION, booked_at) for job in jobs])
+    cursor.executemany(BOOKING_INSERT, jobs)
+    return user_id
+
+
+# Batched insert_registration for bulk loads: `registrations` is a list of
+# (record, services, qr_code_data). Returns the registration id of each, in
+# order; a vehicle repeated in the batch gets the same id each time.
+@timed("db_insert")
+def insert_registrations(conn, registrations):
+    if not registrations:
+        return []
+    cursor = conn.cursor()
+    pngs = [qr_code_data for record, services, qr_code_data in registrations if qr_code_data]
+    hashes = {png: hashlib.sha256(png).digest() for png in pngs}
+    cursor.executemany("INSERT OR IGNORE INTO qr_images (hash, png) VALUES (?, ?)",
+                       [(qr_hash, png) for png, qr_hash in hashes.items()])
+    # executemany can't return rows, and upserted ids aren't contiguous
+    user_ids = [cursor.execute(USERS_UPSERT, _users_row(record, services, hashes.get(qr_code_data))).fetchone()[0]
+                for record, services, qr_code_data in registrations]
+    jobs = [(user_id, service, price)
+            for user_id, (record, services, qr_code_data) in zip(user_ids, registrations)
+            for service, price in services]
+    booked_at = time.time()
+    cursor.executemany(JOBS_UPSERT, [job + (STATION, booked_at) for job in jobs])
+    cursor.executemany(BOOKING_INSERT, jobs)
+    return user_ids
+
+
+# Registration of a vehicle number, in any spelling, or None
+@timed("db_select")
+def fetch_vehicle(conn, vehicle_number):
+    cursor = conn.cursor()
+    cursor.execute('''SELECT id, first_name, last_name, vehicle_type, vehicle_brand
+                      FROM users WHERE vehicle_key = ?''', (normalize_vehicle_number(vehicle_number),))
+    return cursor.fetchone()
+
+
+# Vehicle number of a registration id (compact QR tokens), or None. Ids of
+# registrations merged by migration 5 resolve to the row they merged into,
+# archived ones through their archive pointer.
+@timed("db_select")
+def fetch_vehicle_number(conn, user_id):
+    user_id = conn.execute("SELECT COALESCE((SELECT user_id FROM merged_registrations WHERE old_id = ?), ?)",
+                           (user_id, user_id)).fetchone()[0]
+    row = conn.execute('''SELECT vehicle_number FROM users WHERE id = ?
+                           UNION ALL
+                           SELECT vehicle_number FROM archived_registrations WHERE user_id = ?''',
+                       (user_id, user_id)).fetchone()
+    return row[0] if row else None
+
+
+@timed("db_update")
+def set_qr_code(conn, user_id, qr_code_data):
+    conn.execute("UPDATE users SET qr_hash = ? WHERE id = ?", (store_qr_code(conn, qr_code_data), user_id))
+
+
+# QR PNG of a registration, loaded only when a reprint or preview needs it
+@timed("db_select")
+def fetch_qr_code(conn, user_id):
+    row = conn.execute('''SELECT qr_images.png FROM users JOIN qr_images ON qr_images.hash = users.qr_hash
+                          WHERE users.id = ?''', (user_id,)).fetchone()
+    return row[0] if row else None
+
+
+# Vehicle number a scanned QR code refers to: compact tokens are resolved
+# through their registration id, JSON records carry it directly
+def resolve_scanned(conn, qr_data):
+    scanned = parse_scanned(qr_data)
+    if scanned is None:
+        return None
+    kind, value = scanned
+    if kind == "id":
+        return fetch_vehicle_number(conn, value)
+    return value
+
+
+# [(service, status), ...] for one registration, in the order they were selected
+@timed("db_select")
+def fetch_services(conn, user_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT service, status FROM service_jobs WHERE user_id = ? ORDER BY id", (user_id,))
+    return cursor.fetchall()
+
+
+# FTS5 query for what was typed in a search box: every word must match the
+# start of a name, the mobile number or a part of the plate. A single word of
+# letters followed by digits only occurs in plates, so it is matched against
+# the start of the normalized plate alone ("MH-12-a" finds MH12AB1234 however
+# it was written). Spaced input that runs together into one ("MH 12 a", but
+# also a name and mobile like "Raj 98765") matches either way. None if there
+# is nothing to search for.
+def search_query(text):
+    terms = re.findall(r"[^\W_]+", text or "")
+    if not terms:
+        return None
+    joined = "".join(terms)
+    words = " ".join(f'"{term}"*' for term in terms)
+    if PLATE_PREFIX_RE.match(joined):
+        if not re.search(r"\s", text.strip()):
+            return f'vehicle_key : "{joined}"*'
+        return f'(vehicle_key : "{joined}"*) OR ({words})'
+    return words
+
+
+# Registrations matching a search, newest first:
+# [(id, first_name, last_name, mobile_no, vehicle_number), ...]
+@timed("db_search")
+def search_vehicles(conn, text, limit=SEARCH_LIMIT):
+    query = search_query(text)
+    if query is None:
+        return []
+    return conn.execute('''SELECT users.id, users.first_name, users.last_name, users.mobile_no, users.vehicle_number
+                           FROM users JOIN (SELECT rowid FROM users_search WHERE users_search MATCH ?
+                                            ORDER BY rowid DESC LIMIT ?) AS found ON users.id = found.rowid
+                           ORDER BY users.id DESC''', (query, limit)).fetchall()
+
+
+# Vehicles still in the workshop (a job Pending or In Process), as
+# {vehicle_key: (user_id, vehicle_number, first_name, last_name, [(service, status), ...])}.
+# With `keys`, only those vehicles are read; the ones among them no longer
+# in the workshop are left out.
+@timed("db_board")
+def fetch_board(conn, keys=None):
+    columns = '''SELECT users.id, vehicle_key, vehicle_number, first_name, last_name, service, status
+                 FROM users JOIN service_jobs ON service_jobs.user_id = users.id'''
+    statuses = ", ".join("?" * len(OPEN_STATUSES))
+    if keys is None:
+        # The open jobs come off the status index
+        queries = [(f'''{columns} WHERE users.id IN (SELECT user_id FROM service_jobs WHERE status IN ({statuses}))
+                        ORDER BY users.id, service_jobs.id''', OPEN_STATUSES)]
+    else:
+        # A few vehicles by key, each checked against its own jobs
+        keys = list(keys)
+        chunks = [keys[start:start + BOARD_KEYS_CHUNK] for start in range(0, len(keys), BOARD_KEYS_CHUNK)]
+        queries = [(f'''{columns} WHERE vehicle_key IN ({", ".join("?" * len(chunk))})
+                        AND EXISTS (SELECT 1 FROM service_jobs AS open WHERE open.user_id = users.id
+                                    AND open.status IN ({statuses}))
+                        ORDER BY users.id, service_jobs.id''', chunk + OPEN_STATUSES) for chunk in chunks]
+    board = {}
+    for query, params in queries:
+        for user_id, key, vehicle_number, first_name, last_name, service, status in conn.execute(query, params):
+            board.setdefault(key, (user_id, vehicle_number, first_name, last_name, []))[4].append((service, status))
+    return board
+
+
+# The board's changes since change number `since` (vehicle_changes.seq):
+# (seq to pass next time, {vehicle_key: board entry, or None if it left the
+# board}). With since None, the whole board. Nothing is read past the
+# vehicle_changes index when no station wrote in between.
+def fetch_board_changes(conn, since=None):
+    if since is None:
+        seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM vehicle_changes").fetchone()[0]
+        return seq, fetch_board(conn)
+    changes = conn.execute("SELECT vehicle_number, seq FROM vehicle_changes WHERE seq > ?", (since,)).fetchall()
+    if not changes:
+        return since, {}
+    board = fetch_board(conn, [key for key, seq in changes])
+    return max(seq for key, seq in changes), {key: board.get(key) for key, seq in changes}
+
+
+# Single indexed row update against the vehicle's registration; the status
+# history trigger records the change with `station`. Returns the number of
+# rows changed (0 if the vehicle/service is unknown).
+@timed("db_update")
+def set_service_status(conn, vehicle_number, service, new_status, station=STATION):
+    cursor = conn.cursor()
+    cursor.execute('''UPDATE service_jobs SET status = ?, station = ?,
+                             status_since = CASE WHEN status IS ? THEN status_since ELSE ? END
+                      WHERE user_id = (SELECT id FROM users WHERE vehicle_key = ?)
+                        AND service = ?''', (new_status, station, new_status, time.time(),
+                                               normalize_vehicle_number(vehicle_number), service))
+    return cursor.rowcount
+
+
+# Status history of a vehicle, oldest first:
+# [(service, old_status, new_status, station, at, seconds), ...]
+@timed("db_select")
+def fetch_status_history(conn, vehicle_number):
+    return conn.execute('''SELECT service, old_status, new_status, station, at, seconds FROM status_events
+                           WHERE job_id IN (SELECT service_jobs.id FROM service_jobs JOIN users
+                                            ON users.id = service_jobs.user_id WHERE users.vehicle_key = ?)
+                           ORDER BY id''', (normalize_vehicle_number(vehicle_number),)).fetchall()
+
+
+# Fold status events from before `before` (unix time) into
+# status_event_rollup and delete them, batch_size events per transaction so
+# stations aren't kept waiting. Returns the number of events compacted.
+# Events are picked by their time, not their position: `at` comes from each
+# station's clock, so with clock skew the log isn't in time order. The whole
+# log is walked once, in id windows of batch_size.
+def compact_status_events(db, before, batch_size=5000):
+    compacted = 0
+    last_id = 0
+    while True:
+        with db.transaction() as conn:
+            window_end = conn.execute('''SELECT MAX(id) FROM (SELECT id FROM status_events WHERE id > ?
+                                                                ORDER BY id LIMIT ?)''', (last_id, batch_size)).fetchone()[0]
+            if window_end is None:
+                return compacted
+            conn.execute('''INSERT INTO status_event_rollup
+                            (day, service, old_status, new_status, events, timed, seconds_total, seconds_max)
+                            SELECT DATE(at, 'unixepoch', 'localtime'), service, COALESCE(old_status, ''), new_status,
+                                   COUNT(*), COUNT(seconds), COALESCE(SUM(seconds), 0), COALESCE(MAX(seconds), 0)
+                            FROM status_events WHERE id > ? AND id <= ? AND at < ? GROUP BY 1, 2, 3, 4
+                            ON CONFLICT(day, service, old_status, new_status) DO UPDATE SET
+                              events = events + excluded.events, timed = timed + excluded.timed,
+                              seconds_total = seconds_total + excluded.seconds_total,
+                              seconds_max = MAX(seconds_max, excluded.seconds_max)''', (last_id, window_end, before))
+            compacted += conn.execute("DELETE FROM status_events WHERE id > ? AND id <= ? AND at < ?",
+                                      (last_id, window_end, before)).rowcount
+        last_id = window_end
+
+
+# Migrate an existing database file in place:  python database.py [path] [--vacuum]
+# --vacuum rewrites the file afterwards so space freed by migrations (such as
+# the QR blobs moved out of users) is returned and pages are repacked.
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--vacuum"]
+    path = args[0] if args else DB_PATH
+    db = get_db(path)
+    before = db.connection().execute("PRAGMA user_version").fetchone()[0]
+    after = migrate(db)
+    if "--vacuum" in sys.argv:
+        db.connection().execute("VACUUM")
+    jobs = db.connection().execute("SELECT COUNT(*) FROM service_jobs").fetchone()[0]
+    db.close_all()
+    print(f"{path}: schema version {before} -> {after}, {jobs} service jobs")
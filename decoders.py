@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import time
+
+import cv2
+
+from metrics import timer
+
+# QR decoder engines behind one interface, so the scanner isn't tied to
+# pyzbar. Every engine has a `name` and locate(gray) returning
+# [(payload, (left, top, width, height)), ...] for a grayscale frame.
+#
+#   pyzbar         zbar via pyzbar (needs the zbar shared library)
+#   opencv         cv2.QRCodeDetector
+#   opencv-aruco   cv2.QRCodeDetectorAruco (OpenCV 4.8+), slower but more robust
+#
+# A CascadeDecoder tries engines in order and stops at the first that finds
+# anything, so the fast engine handles the easy frames and the robust one
+# only runs when it fails. Which order suits a camera depends on its
+# resolution and lighting: `calibrate` times each engine on frames from that
+# camera and saves the fastest one that reaches the target success rate,
+# followed by the others as fallbacks.
+#
+#   python decoders.py calibrate [--camera 0 | --video file | --images dir] [--frames 60] [--target 0.9]
+#   python decoders.py list
+
+DEFAULT_ORDER = ["pyzbar", "opencv"]
+CALIBRATION_PATH = "decoder_calibration.json"
+TARGET_SUCCESS = 0.9
+
+
+def box_from_points(points):
+    xs, ys = points[:, 0], points[:, 1]
+    return int(xs.min()), int(ys.min()), int(xs.max() - xs.min()), int(ys.max() - ys.min())
+
+
+class PyzbarDecoder:
+    name = "pyzbar"
+
+    def __init__(self):
+        # Imported here: pyzbar fails to import where libzbar isn't installed
+        from pyzbar.pyzbar import decode, ZBarSymbol
+        self._decode = decode
+        self._symbols = [ZBarSymbol.QRCODE]
+
+    def locate(self, gray):
+        # Only look for QR codes; zbar otherwise tries every barcode type
+        with timer("decode_pyzbar"):
+            found = self._decode(gray, symbols=self._symbols)
+        return [(obj.data.decode('utf-8'), tuple(obj.rect)) for obj in found]
+
+
+class OpenCVDecoder:
+    name = "opencv"
+    detector_class = "QRCodeDetector"
+
+    def __init__(self):
+        self.detector = getattr(cv2, self.detector_class)()
+
+    def locate(self, gray):
+        with timer(f"decode_{self.name}"):
+            ok, payloads, points, _ = self.detector.detectAndDecodeMulti(gray)
+        if not ok or points is None:
+            return []
+        return [(payload, box_from_points(corners)) for payload, corners in zip(payloads, points) if payload]
+
+
+class OpenCVArucoDecoder(OpenCVDecoder):
+    name = "opencv-aruco"
+    detector_class = "QRCodeDetectorAruco"
+
+
+DECODERS = {decoder.name: decoder for decoder in (PyzbarDecoder, OpenCVDecoder, OpenCVArucoDecoder)}
+
+
+# Engines in order until one finds a code
+class CascadeDecoder:
+    def __init__(self, engines):
+        self.engines = engines
+        self.name = "+".join(engine.name for engine in engines)
+        self.stats = {engine.name: {"attempts": 0, "hits": 0} for engine in engines}
+
+    def locate(self, gray):
+        for engine in self.engines:
+            stats = self.stats[engine.name]
+            stats["attempts"] += 1
+            codes = engine.locate(gray)
+            if codes:
+                stats["hits"] += 1
+                return codes
+        return []
+
+    def report(self):
+        return ", ".join(f"{name} {stats['hits']}/{stats['attempts']}" for name, stats in self.stats.items())
+
+
+_available = {}
+
+
+def create_engine(name):
+    if name not in DECODERS:
+        raise ValueError(f"Unknown decoder {name!r}; choose from {', '.join(DECODERS)}")
+    return DECODERS[name]()
+
+
+# Whether the engine can be created here (library present, OpenCV new enough)
+def is_available(name):
+    if name not in _available:
+        try:
+            create_engine(name)
+            _available[name] = True
+        except (ImportError, OSError, AttributeError, cv2.error):
+            _available[name] = False
+    return _available[name]
+
+
+def available_decoders():
+    return [name for name in DECODERS if is_available(name)]
+
+
+# A decoder from a name or comma separated cascade ("pyzbar,opencv"); engines
+# that can't load here are skipped
+def make_decoder(spec=None):
+    names = spec.split(",") if isinstance(spec, str) else list(spec or DEFAULT_ORDER)
+    names = [name.strip() for name in names if name.strip()]
+    engines = [create_engine(name) for name in names if is_available(name)]
+    if not engines:
+        raise RuntimeError(f"No QR decoder available (tried {', '.join(names)}); "
+                           f"install pyzbar with the zbar library, or OpenCV")
+    return engines[0] if len(engines) == 1 else CascadeDecoder(engines)
+
+
+# -- calibration -----------------------------------------------------------
+
+def load_calibration(path=CALIBRATION_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_calibration(source_key, order, results, path=CALIBRATION_PATH):
+    calibration = load_calibration(path)
+    calibration[source_key] = {"order": order, "results": results, "calibrated_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(calibration, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+# The calibrated decoder for a frame source, or the default cascade
+def decoder_for_source(source_key, path=CALIBRATION_PATH):
+    entry = load_calibration(path).get(source_key)
+    return make_decoder(entry["order"] if entry else DEFAULT_ORDER)
+
+
+# Time every available engine on `frames` (grayscale, as the scanner decodes
+# them). Success is a frame where the engine finds a code, or the expected
+# payload when `expected` (one per frame) is given. Returns the cascade order
+# (fastest engine meeting target_success first, then the others by success
+# rate) and the per-engine results. ValueError without frames or engines.
+def calibrate(frames, names=None, target_success=TARGET_SUCCESS, expected=None):
+    names = names or available_decoders()
+    if not frames:
+        raise ValueError("No calibration samples: the source gave no frames")
+    if not names:
+        raise ValueError(f"No QR decoder engines available to calibrate (tried {', '.join(DECODERS)})")
+    results = []
+    for name in names:
+        engine = create_engine(name)
+        latencies = []
+        successes = 0
+        for i, frame in enumerate(frames):
+            start = time.perf_counter()
+            codes = engine.locate(frame)
+            latencies.append(time.perf_counter() - start)
+            if codes and (expected is None or expected[i] in [payload for payload, box in codes]):
+                successes += 1
+        latencies.sort()
+        results.append({
+            "decoder": name,
+            "success_rate": successes / len(frames) if frames else 0.0,
+            "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000 if latencies else 0.0,
+        })
+
+    passing = sorted((r for r in results if r["success_rate"] >= target_success), key=lambda r: r["mean_ms"])
+    # Nothing reaches the target: lead with the most robust engine instead
+    primary = passing[0] if passing else max(results, key=lambda r: (r["success_rate"], -r["mean_ms"]))
+    fallbacks = sorted((r for r in results if r is not primary and r["success_rate"] > 0),
+                       key=lambda r: (-r["success_rate"], r["mean_ms"]))
+    return [primary["decoder"]] + [r["decoder"] for r in fallbacks], results
+
+
+def collect_frames(source, count, roi=None, decode_width=None):
+    from scanner import prepare_frame
+
+    frames = []
+    if not source.open():
+        raise SystemExit("Could not open frame source.")
+    try:
+        while len(frames) < count:
+            ok, frame = source.read()
+            if not ok:
+                break
+            frames.append(prepare_frame(frame, roi, decode_width))
+    finally:
+        source.release()
+    return frames
+
+
+def main():
+    from scanner import CameraSource, VideoFileSource, ImageDirectorySource
+
+    parser = argparse.ArgumentParser(description="QR decoder engines")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="show which engines load here")
+    calibrate_parser = commands.add_parser("calibrate", help="pick the engine order for a camera")
+    source_group = calibrate_parser.add_mutually_exclusive_group()
+    source_group.add_argument("--camera", type=int, default=0, help="camera index (default: %(default)s)")
+    source_group.add_argument("--video", help="recorded video from the camera")
+    source_group.add_argument("--images", help="directory of frames from the camera")
+    calibrate_parser.add_argument("--frames", type=int, default=60, help="frames to time (default: %(default)s)")
+    calibrate_parser.add_argument("--decode-width", type=int, default=640, help="as used by the scanner (default: %(default)s)")
+    calibrate_parser.add_argument("--target", type=float, default=TARGET_SUCCESS,
+                                  help="minimum success rate (default: %(default)s)")
+    calibrate_parser.add_argument("--key", help="save under this source key instead of the source's own")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for name in DECODERS:
+            print(f"{name:<14} {'available' if is_available(name) else 'not available'}")
+        return
+
+    if args.video:
+        source = VideoFileSource(args.video)
+    elif args.images:
+        source = ImageDirectorySource(args.images)
+    else:
+        source = CameraSource(args.camera)
+        print("Hold a QR code in front of the camera...")
+    frames = collect_frames(source, args.frames, decode_width=args.decode_width)
+    try:
+        order, results = calibrate(frames, target_success=args.target)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    print(f"{len(frames)} frames at decode width {args.decode_width}")
+    print(f"{'decoder':<14} {'success':>8} {'mean ms':>8} {'p95 ms':>8}")
+    for r in results:
+        print(f"{r['decoder']:<14} {r['success_rate']:>8.1%} {r['mean_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+    key = args.key or source.key
+    save_calibration(key, order, results)
+    print(f"{key}: {' -> '.join(order)} (saved to {CALIBRATION_PATH})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,193 +1,168 @@
-import tkinter as tk 
+import sys
+import time
+import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
-from PIL import Image, ImageTk
-import qrcode
 from io import BytesIO
-import json
-import os
-import sqlite3  # For database connection
-
-# Database setup
-def create_connection():
-    conn = sqlite3.connect('vehicle_registration.db')
-    return conn
-
-def create_table():
-    conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        first_name TEXT,
-                        last_name TEXT,
-                        mobile_no TEXT,
-                        address TEXT,
-                        pincode TEXT,
-                        vehicle_type TEXT,
-                        vehicle_brand TEXT,
-                        vehicle_number TEXT,
-                        services TEXT,
-                        total_price REAL,
-                        qr_code BLOB
-                    )''')
-    conn.commit()
-    conn.close()
-
-# Function to generate QR code
-def generate_qr_code(data):
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill='black', back_color='white')
-    return img
-
-# Function to handle form submission
-def submit_form():
-    first_name = first_name_entry.get()
-    last_name = last_name_entry.get()
-    mobile_no = mobile_no_entry.get()
-    address = address_entry.get()
-    pincode = pincode_entry.get()
-    vehicle_type = vehicle_type_combo.get()
-    vehicle_brand = vehicle_brand_entry.get()
-    vehicle_number = vehicle_number_entry.get()
-
-    # Collect selected services
-    selected_services = []
-    total_price = 0
-    for service, price, var in services:
-        if var.get() == 1:
-            selected_services.append(f"{service} (₹{price})")
-            total_price += price
-
-    if not (first_name and last_name and mobile_no and vehicle_type and vehicle_brand and vehicle_number):
-        messagebox.showerror("Error", "Please fill in all the required fields!")
-        return
-
-    if len(mobile_no) != 10 or not mobile_no.isdigit():
-        messagebox.showerror("Error", "Mobile number must be exactly 10 digits!")
-        return
-
-    # Combine all the data to store in the QR code
-    services_info = ", ".join(selected_services)
-    data = {
-        "First Name": first_name, 
-        "Last Name": last_name, 
-        "Mobile No": mobile_no, 
-        "Address": address, 
-        "Pincode": pincode, 
-        "Vehicle Type": vehicle_type, 
-        "Vehicle Brand": vehicle_brand, 
-        "Vehicle Number": vehicle_number, 
-        "Services": selected_services, 
-        "Total Price": total_price
-    }
-    qr_data = json.dumps(data)
-
-    # Generate and save QR code
-    img = generate_qr_code(qr_data)
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    qr_code_data = buffer.getvalue()
-
-    # Save data to the database
-    conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute('''INSERT INTO users 
-                      (first_name, last_name, mobile_no, address, pincode, vehicle_type, vehicle_brand, vehicle_number, services, total_price, qr_code)
-                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                   (first_name, last_name, mobile_no, address, pincode, vehicle_type, vehicle_brand, vehicle_number, services_info, total_price, qr_code_data))
-    conn.commit()
-    conn.close()
-
-    messagebox.showinfo("Success", "User data and QR code saved successfully!")
-
-    # Display QR code in the GUI
-    buffer.seek(0)
-    qr_img = Image.open(buffer)
-    qr_img.thumbnail((200, 200))
-    qr_photo = ImageTk.PhotoImage(qr_img)
-    barcode_label.config(image=qr_photo)
-    barcode_label.image = qr_photo
-
-# GUI setup
-root = tk.Tk()
-root.title("Vehicle Registration Form")
-root.configure(bg="#f0f0f5")
-
-tk.Label(root, text="Vehicle Registration Form", font=("Arial", 18, "bold"), bg="#f0f0f5").grid(row=0, column=0, columnspan=2, pady=20)
-
-# Form fields
-tk.Label(root, text="First Name", font=("Arial", 12), bg="#f0f0f5").grid(row=1, column=0, padx=10, pady=5, sticky='w')
-first_name_entry = tk.Entry(root, font=("Arial", 12), width=25)
-first_name_entry.grid(row=1, column=1, padx=10, pady=5)
-
-# Last Name
-tk.Label(root, text="Last Name", font=("Arial", 12), bg="#f0f0f5").grid(row=2, column=0, padx=10, pady=5, sticky='w')
-last_name_entry = tk.Entry(root, font=("Arial", 12), width=25)
-last_name_entry.grid(row=2, column=1, padx=10, pady=5)
-
-# Mobile Number
-tk.Label(root, text="Mobile No.", font=("Arial", 12), bg="#f0f0f5").grid(row=3, column=0, padx=10, pady=5, sticky='w')
-mobile_no_entry = tk.Entry(root, font=("Arial", 12), width=25)
-mobile_no_entry.grid(row=3, column=1, padx=10, pady=5)
-
-# Address
-tk.Label(root, text="Address", font=("Arial", 12), bg="#f0f0f5").grid(row=4, column=0, padx=10, pady=5, sticky='w')
-address_entry = tk.Entry(root, font=("Arial", 12), width=25)
-address_entry.grid(row=4, column=1, padx=10, pady=5)
-
-# Pincode
-tk.Label(root, text="Pincode", font=("Arial", 12), bg="#f0f0f5").grid(row=5, column=0, padx=10, pady=5, sticky='w')
-pincode_entry = tk.Entry(root, font=("Arial", 12), width=25)
-pincode_entry.grid(row=5, column=1, padx=10, pady=5)
-
-# Vehicle Type
-tk.Label(root, text="Vehicle Type", font=("Arial", 12), bg="#f0f0f5").grid(row=6, column=0, padx=10, pady=5, sticky='w')
-vehicle_type_combo = ttk.Combobox(root, values=["Car", "Bike", "Truck"], font=("Arial", 12))
-vehicle_type_combo.grid(row=6, column=1, padx=10, pady=5)
-
-# Vehicle Brand
-tk.Label(root, text="Vehicle Brand", font=("Arial", 12), bg="#f0f0f5").grid(row=7, column=0, padx=10, pady=5, sticky='w')
-vehicle_brand_entry = tk.Entry(root, font=("Arial", 12), width=25)
-vehicle_brand_entry.grid(row=7, column=1, padx=10, pady=5)
-
-# Vehicle Number Plate
-tk.Label(root, text="Vehicle Number Plate", font=("Arial", 12), bg="#f0f0f5").grid(row=8, column=0, padx=10, pady=5, sticky='w')
-vehicle_number_entry = tk.Entry(root, font=("Arial", 12), width=25)
-vehicle_number_entry.grid(row=8, column=1, padx=10, pady=5)
-
-# Services with prices
-tk.Label(root, text="Select Services", font=("Arial", 12), bg="#f0f0f5").grid(row=9, column=0, padx=10, pady=10, sticky='w')
-services_frame = tk.Frame(root, bg="#f0f0f5")
-services_frame.grid(row=9, column=1, padx=10, pady=5)
-
-# Services with prices
-services = [
-    ("Washing", 100, tk.IntVar()),
-    ("Tyre Changing", 200, tk.IntVar()),
-    ("Oil Change", 300, tk.IntVar()),
-    ("Engine Checkup", 400, tk.IntVar()),
-    ("Brake Adjustment", 150, tk.IntVar()),
-    ("Battery Replacement", 500, tk.IntVar())
-]
-for i, (service, price, var) in enumerate(services):
-    tk.Checkbutton(services_frame, text=f"{service} (₹{price})", variable=var, font=("Arial", 11), bg="#f0f0f5").grid(row=i, column=0, sticky='w')
-
-# Submit Button
-submit_button = tk.Button(root, text="Submit", command=submit_form, font=("Arial", 12), bg="#4CAF50", fg="white", width=15)
-submit_button.grid(row=10, column=0, columnspan=2, pady=20)
-
-# Barcode display (QR code)
-barcode_label = tk.Label(root, bg="#f0f0f5")
-barcode_label.grid(row=11, column=0, columnspan=2, padx=10, pady=10)
-
-# Initialize the database table
-create_table()
-
-root.mainloop()
+from actions import register_vehicle
+from database import get_db, create_table
+from registration import SERVICES, VEHICLE_TYPES, validate_registration, price_services
+import metrics
+from service_client import ServiceClient, ServiceError, server_url_from_args
+
+# Importing this module builds no GUI; the registration itself is
+# actions.register_vehicle, shared with cli.py.
+
+
+class RegistrationForm:
+    def __init__(self, root, client=None):
+        # With a client, registrations go through service.py instead of the database file
+        self.root = root
+        self.client = client
+        root.title("Vehicle Registration Form")
+        root.configure(bg="#f0f0f5")
+
+        tk.Label(root, text="Vehicle Registration Form", font=("Arial", 18, "bold"), bg="#f0f0f5").grid(row=0, column=0, columnspan=2, pady=20)
+
+        # Form fields
+        tk.Label(root, text="First Name", font=("Arial", 12), bg="#f0f0f5").grid(row=1, column=0, padx=10, pady=5, sticky='w')
+        self.first_name_entry = tk.Entry(root, font=("Arial", 12), width=25)
+        self.first_name_entry.grid(row=1, column=1, padx=10, pady=5)
+
+        # Last Name
+        tk.Label(root, text="Last Name", font=("Arial", 12), bg="#f0f0f5").grid(row=2, column=0, padx=10, pady=5, sticky='w')
+        self.last_name_entry = tk.Entry(root, font=("Arial", 12), width=25)
+        self.last_name_entry.grid(row=2, column=1, padx=10, pady=5)
+
+        # Mobile Number
+        tk.Label(root, text="Mobile No.", font=("Arial", 12), bg="#f0f0f5").grid(row=3, column=0, padx=10, pady=5, sticky='w')
+        self.mobile_no_entry = tk.Entry(root, font=("Arial", 12), width=25)
+        self.mobile_no_entry.grid(row=3, column=1, padx=10, pady=5)
+
+        # Address
+        tk.Label(root, text="Address", font=("Arial", 12), bg="#f0f0f5").grid(row=4, column=0, padx=10, pady=5, sticky='w')
+        self.address_entry = tk.Entry(root, font=("Arial", 12), width=25)
+        self.address_entry.grid(row=4, column=1, padx=10, pady=5)
+
+        # Pincode
+        tk.Label(root, text="Pincode", font=("Arial", 12), bg="#f0f0f5").grid(row=5, column=0, padx=10, pady=5, sticky='w')
+        self.pincode_entry = tk.Entry(root, font=("Arial", 12), width=25)
+        self.pincode_entry.grid(row=5, column=1, padx=10, pady=5)
+
+        # Vehicle Type
+        tk.Label(root, text="Vehicle Type", font=("Arial", 12), bg="#f0f0f5").grid(row=6, column=0, padx=10, pady=5, sticky='w')
+        self.vehicle_type_combo = ttk.Combobox(root, values=VEHICLE_TYPES, font=("Arial", 12))
+        self.vehicle_type_combo.grid(row=6, column=1, padx=10, pady=5)
+
+        # Vehicle Brand
+        tk.Label(root, text="Vehicle Brand", font=("Arial", 12), bg="#f0f0f5").grid(row=7, column=0, padx=10, pady=5, sticky='w')
+        self.vehicle_brand_entry = tk.Entry(root, font=("Arial", 12), width=25)
+        self.vehicle_brand_entry.grid(row=7, column=1, padx=10, pady=5)
+
+        # Vehicle Number Plate
+        tk.Label(root, text="Vehicle Number Plate", font=("Arial", 12), bg="#f0f0f5").grid(row=8, column=0, padx=10, pady=5, sticky='w')
+        self.vehicle_number_entry = tk.Entry(root, font=("Arial", 12), width=25)
+        self.vehicle_number_entry.grid(row=8, column=1, padx=10, pady=5)
+
+        # Services with prices
+        tk.Label(root, text="Select Services", font=("Arial", 12), bg="#f0f0f5").grid(row=9, column=0, padx=10, pady=10, sticky='w')
+        services_frame = tk.Frame(root, bg="#f0f0f5")
+        services_frame.grid(row=9, column=1, padx=10, pady=5)
+
+        # Services with prices
+        self.services = [(service, price, tk.IntVar()) for service, price in SERVICES]
+        for i, (service, price, var) in enumerate(self.services):
+            tk.Checkbutton(services_frame, text=f"{service} (₹{price})", variable=var, font=("Arial", 11), bg="#f0f0f5").grid(row=i, column=0, sticky='w')
+
+        # Compact QR option (registration id only, resolved by the tracker)
+        self.compact_qr_var = tk.IntVar()
+        tk.Checkbutton(root, text="Compact QR code (registration ID only)", variable=self.compact_qr_var, font=("Arial", 11), bg="#f0f0f5").grid(row=10, column=0, columnspan=2, padx=10, pady=5)
+
+        # Submit Button
+        submit_button = tk.Button(root, text="Submit", command=self.submit_form, font=("Arial", 12), bg="#4CAF50", fg="white", width=15)
+        submit_button.grid(row=11, column=0, columnspan=2, pady=20)
+
+        # Barcode display (QR code)
+        self.barcode_label = tk.Label(root, bg="#f0f0f5")
+        self.barcode_label.grid(row=12, column=0, columnspan=2, padx=10, pady=10)
+
+    # Function to handle form submission
+    def submit_form(self):
+        submit_started = time.perf_counter()
+        record = {
+            "first_name": self.first_name_entry.get(),
+            "last_name": self.last_name_entry.get(),
+            "mobile_no": self.mobile_no_entry.get(),
+            "address": self.address_entry.get(),
+            "pincode": self.pincode_entry.get(),
+            "vehicle_type": self.vehicle_type_combo.get(),
+            "vehicle_brand": self.vehicle_brand_entry.get(),
+            "vehicle_number": self.vehicle_number_entry.get()
+        }
+
+        # Collect selected services
+        service_names = [service for service, price, var in self.services if var.get() == 1]
+        compact = self.compact_qr_var.get() == 1
+
+        # Save data to the database, one service_jobs row per selected service
+        if self.client:
+            # Checked here as well so a typo doesn't cost a round trip
+            record["total_price"] = price_services(service_names)[2]
+            error = validate_registration(record)
+            if error:
+                messagebox.showerror("Error", error)
+                return
+            # The service validates, renders the QR code and stores everything
+            try:
+                registered = self.client.register(record, service_names, compact)
+                qr_code_data = self.client.qr_png(registered["id"])
+            except (ServiceError, OSError) as e:
+                messagebox.showerror("Error", f"Registration service: {e}")
+                return
+        else:
+            try:
+                user_id, qr_data, qr_code_data = register_vehicle(record, service_names, compact)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+
+        # Time from the click to the data being saved, before the dialog waits on the user
+        metrics.observe("ui_submit", time.perf_counter() - submit_started)
+        metrics.count("registrations")
+        messagebox.showinfo("Success", "User data and QR code saved successfully!")
+        self.show_qr(qr_code_data)
+
+    def show_qr(self, qr_code_data):
+        # PIL's Tk bridge is only loaded once there is a code to show
+        from PIL import Image, ImageTk
+
+        # Display QR code in the GUI, derived from the PNG bytes already encoded
+        with metrics.timer("ui_thumbnail"):
+            qr_img = Image.open(BytesIO(qr_code_data))
+            qr_img.thumbnail((200, 200))
+            qr_photo = ImageTk.PhotoImage(qr_img)
+            self.barcode_label.config(image=qr_photo)
+            self.barcode_label.image = qr_photo
+
+
+if __name__ == "__main__":
+    # With --server URL (or QR_SERVICE_URL) registrations go through service.py
+    # instead of opening the database file here
+    service_url = server_url_from_args(sys.argv)
+    client = ServiceClient(service_url) if service_url else None
+
+    # Initialize the database table (the service owns it in client mode)
+    if not client:
+        create_table()
+
+    # Stage timings export and profiling: --metrics-prom FILE, --metrics-jsonl FILE, --profile FILE
+    metrics.configure_from_args(sys.argv)
+
+    root = tk.Tk()
+    form = RegistrationForm(root, client)
+    root.mainloop()
+    if not client:
+        from qr_cache import get_qr_cache
+        print(get_db().report())
+        print(get_qr_cache().report())
+    print(metrics.report())
@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from collections import deque
+from itertools import chain
+from multiprocessing import Pool
+
+from database import DB_PATH, get_db, create_table
+
+# Printable QR labels from the database.
+#
+#   python label_export.py [--db FILE] sheets [--day 2026-10-18 | --all] [--format pdf|png] [--out labels.pdf]
+#                                             [--columns 3] [--rows 7] [--dpi 300] [--workers N]
+#   python label_export.py [--db FILE] sync [--dir QR_Codes] [--prune]
+#
+# sheets lays the stored QR codes out multi-up on A4 pages, each with the
+# vehicle number and owner underneath, for the vehicles booked on --day
+# (default today). Registrations are read one sheet at a time, sheets are
+# drawn on a process pool, and pages are written in order as they finish,
+# with at most a few sheets in flight, so memory stays flat however many
+# labels there are. PDF pages are 1-bit images written straight into the
+# file; PNG output is one file per sheet (labels-001.png, ...).
+#
+# sync keeps a directory of {VEHICLE}_qr_code.png files, like
+# qr_form_generation writes, in step with the database. A manifest records
+# the QR hash written for each file, so a run only fetches and writes codes
+# that are new or changed; --prune removes files of vehicles no longer in
+# the database. Every file is written to a temporary name and renamed, so a
+# reader or an interrupted run never sees half a PNG.
+
+A4_MM = (210, 297)
+MARGIN_MM = 8
+CAPTION_LINES = 2
+SHEETS_IN_FLIGHT_PER_WORKER = 2
+SYNC_BATCH = 1000
+MANIFEST = "manifest.json"
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# Pixel geometry of one sheet: page size, label cell size and margin
+def sheet_layout(columns, rows, dpi):
+    width, height = (round(mm / 25.4 * dpi) for mm in A4_MM)
+    margin = round(MARGIN_MM / 25.4 * dpi)
+    return {"dpi": dpi, "size": (width, height), "margin": margin, "columns": columns, "rows": rows,
+            "cell": ((width - 2 * margin) // columns, (height - 2 * margin) // rows)}
+
+
+def caption_font(size):
+    from PIL import ImageFont
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow before 10.1 only has the small bitmap font
+        return ImageFont.load_default()
+
+
+# Registrations to label, one sheet's worth at a time:
+# [(id, vehicle_number, first_name, last_name, png or None), ...]
+def label_pages(conn, per_sheet, day=None):
+    query = '''SELECT users.id, vehicle_number, first_name, last_name, qr_images.png FROM users
+               LEFT JOIN qr_images ON qr_images.hash = users.qr_hash
+               WHERE users.id > ?'''
+    if day:
+        query += " AND EXISTS (SELECT 1 FROM bookings WHERE user_id = users.id AND booked_on = ?)"
+    query += " ORDER BY users.id LIMIT ?"
+    last_id = 0
+    while True:
+        page = conn.execute(query, (last_id, day, per_sheet) if day else (last_id, per_sheet)).fetchall()
+        if not page:
+            return
+        yield page
+        last_id = page[-1][0]
+
+
+# Runs on the pool: one sheet as a 1-bit PIL image
+def draw_sheet(labels, layout):
+    from io import BytesIO
+    from PIL import Image, ImageDraw
+
+    sheet = Image.new("L", layout["size"], 255)
+    draw = ImageDraw.Draw(sheet)
+    cell_width, cell_height = layout["cell"]
+    font_size = max(10, cell_height // 14)
+    font = caption_font(font_size)
+    caption_height = CAPTION_LINES * (font_size + font_size // 3)
+    for slot, (user_id, vehicle_number, first_name, last_name, png) in enumerate(labels):
+        if png is None:
+            # Compact registration whose code was never stored: draw its token
+            from registration import qr_png, encode_token
+            png = qr_png(encode_token(user_id))
+        code = Image.open(BytesIO(png)).convert("L")
+        # Whole-pixel scaling keeps the modules sharp
+        room = min(cell_width, cell_height - caption_height)
+        scale = room // code.width
+        size = code.width * scale if scale else room
+        code = code.resize((size, size), Image.NEAREST)
+
+        left = layout["margin"] + (slot % layout["columns"]) * cell_width
+        top = layout["margin"] + (slot // layout["columns"]) * cell_height
+        sheet.paste(code, (left + (cell_width - size) // 2, top))
+        caption = [vehicle_number or "", f"{first_name or ''} {last_name or ''}".strip()]
+        for line, text in enumerate(caption):
+            text_width = draw.textlength(text, font=font)
+            draw.text((left + (cell_width - text_width) / 2, top + size + line * (font_size + font_size // 3)),
+                      text, fill=0, font=font)
+    return sheet.point(lambda value: 255 if value > 127 else 0).convert("1")
+
+
+def render_png_sheet(labels, layout):
+    from io import BytesIO
+
+    out = BytesIO()
+    draw_sheet(labels, layout).save(out, "PNG", dpi=(layout["dpi"], layout["dpi"]))
+    return out.getvalue()
+
+
+# (width, height, Flate-compressed 1-bit rows) for a PDF image object
+def render_pdf_sheet(labels, layout):
+    sheet = draw_sheet(labels, layout)
+    return sheet.width, sheet.height, zlib.compress(sheet.tobytes(), 6)
+
+
+# Minimal PDF writer: one full-page image per page, each written as soon as
+# it is drawn; only the object offsets stay in memory
+class PdfWriter:
+    def __init__(self, f, page_size_mm=A4_MM):
+        self.f = f
+        self.page_points = tuple(mm / 25.4 * 72 for mm in page_size_mm)
+        self.offsets = {}
+        self.pages = []
+        # Objects 1 and 2 (catalog and page tree) are written last
+        self.next_object = 3
+        self.f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _object(self, number, body, stream=None):
+        self.offsets[number] = self.f.tell()
+        self.f.write(f"{number} 0 obj\n".encode() + body)
+        if stream is not None:
+            self.f.write(b"\nstream\n" + stream + b"\nendstream")
+        self.f.write(b"\nendobj\n")
+
+    def add_page(self, width, height, image):
+        image_id, content_id, page_id = range(self.next_object, self.next_object + 3)
+        self.next_object += 3
+        self._object(image_id, f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                               f"/ColorSpace /DeviceGray /BitsPerComponent 1 /Filter /FlateDecode "
+                               f"/Length {len(image)} >>".encode(), image)
+        content = f"q {self.page_points[0]:.2f} 0 0 {self.page_points[1]:.2f} 0 0 cm /Im0 Do Q".encode()
+        self._object(content_id, f"<< /Length {len(content)} >>".encode(), content)
+        self._object(page_id, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.page_points[0]:.2f} "
+                              f"{self.page_points[1]:.2f}] /Resources << /XObject << /Im0 {image_id} 0 R >> >> "
+                              f"/Contents {content_id} 0 R >>".encode())
+        self.pages.append(page_id)
+
+    def close(self):
+        kids = " ".join(f"{page} 0 R" for page in self.pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode())
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref = self.f.tell()
+        self.f.write(f"xref\n0 {self.next_object}\n0000000000 65535 f \n".encode())
+        for number in range(1, self.next_object):
+            self.f.write(f"{self.offsets[number]:010d} 00000 n \n".encode())
+        self.f.write(f"trailer\n<< /Size {self.next_object} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+def export_sheets(db, out_path, fmt="pdf", day=None, columns=3, rows=7, dpi=300, workers=None, out=sys.stderr):
+    layout = sheet_layout(columns, rows, dpi)
+    render = render_pdf_sheet if fmt == "pdf" else render_png_sheet
+    stem, extension = os.path.splitext(out_path)
+    # Nothing to label: leave no empty sheet file behind
+    pages = label_pages(db.connection(), columns * rows, day)
+    first_page = next(pages, None)
+    if first_page is None:
+        return 0, 0
+    pdf_tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    pdf_file = open(pdf_tmp_path, "wb") if fmt == "pdf" else None
+    pdf = PdfWriter(pdf_file) if pdf_file else None
+    sheets = labels = 0
+    start = time.perf_counter()
+
+    def write_sheet(result):
+        nonlocal sheets
+        sheets += 1
+        if pdf:
+            pdf.add_page(*result)
+        else:
+            write_atomic(f"{stem}-{sheets:03d}{extension or '.png'}", result)
+
+    try:
+        with Pool(workers) as pool:
+            in_flight = deque()
+            limit = SHEETS_IN_FLIGHT_PER_WORKER * (workers or os.cpu_count() or 1)
+            for page in chain([first_page], pages):
+                labels += len(page)
+                in_flight.append(pool.apply_async(render, (page, layout)))
+                # Pages go out in order; reading stops while enough are queued
+                while len(in_flight) >= limit:
+                    write_sheet(in_flight.popleft().get())
+            while in_flight:
+                write_sheet(in_flight.popleft().get())
+        if pdf:
+            pdf.close()
+            pdf_file.close()
+            os.replace(pdf_tmp_path, out_path)
+    finally:
+        if pdf_file and not pdf_file.closed:
+            pdf_file.close()
+            os.remove(pdf_tmp_path)
+    print(f"{labels} labels on {sheets} sheets in {time.perf_counter() - start:.1f}s", file=out)
+    return labels, sheets
+
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)["files"]
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(directory, files):
+    write_atomic(os.path.join(directory, MANIFEST), json.dumps({"files": files}, sort_keys=True).encode())
+
+
+# Bring `directory` in line with the stored QR codes; returns
+# {"written": n, "unchanged": n, "removed": n, "missing": n}
+def sync_directory(db, directory, prune=False):
+    os.makedirs(directory, exist_ok=True)
+    conn = db.connection()
+    files = load_manifest(directory)
+    seen = set()
+    counts = {"written": 0, "unchanged": 0, "removed": 0, "missing": 0}
+    last_id = 0
+    while True:
+        batch = conn.execute('''SELECT id, vehicle_key, qr_hash FROM users WHERE id > ? ORDER BY id LIMIT ?''',
+                             (last_id, SYNC_BATCH)).fetchall()
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        for user_id, vehicle_key, qr_hash in batch:
+            if not vehicle_key or qr_hash is None:
+                counts["missing"] += 1
+                continue
+            name = f"{vehicle_key}_qr_code.png"
+            seen.add(name)
+            path = os.path.join(directory, name)
+            if files.get(name) == qr_hash.hex() and os.path.exists(path):
+                counts["unchanged"] += 1
+                continue
+            row = conn.execute("SELECT png FROM qr_images WHERE hash = ?", (qr_hash,)).fetchone()
+            if row is None:
+                counts["missing"] += 1
+                continue
+            write_atomic(path, row[0])
+            files[name] = qr_hash.hex()
+            counts["written"] += 1
+        # Progress survives an interrupted run
+        save_manifest(directory, files)
+
+    if prune:
+        for name in [name for name in files if name not in seen]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+            del files[name]
+            counts["removed"] += 1
+        save_manifest(directory, files)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="QR label sheets and QR code folders")
+    parser.add_argument("--db", default=DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    sheets = commands.add_parser("sheets", help="lay QR codes out on printable A4 sheets")
+    which = sheets.add_mutually_exclusive_group()
+    which.add_argument("--day", help="vehicles booked on this day, YYYY-MM-DD (default today)")
+    which.add_argument("--all", action="store_true", help="every vehicle in the database")
+    sheets.add_argument("--format", choices=["pdf", "png"], default="pdf")
+    sheets.add_argument("--out", help="default: labels-DAY.pdf, or labels-DAY-001.png, ... for png")
+    sheets.add_argument("--columns", type=int, default=3)
+    sheets.add_argument("--rows", type=int, default=7)
+    sheets.add_argument("--dpi", type=int, default=300)
+    sheets.add_argument("--workers", type=int, help="drawing processes (default: one per CPU)")
+    sync = commands.add_parser("sync", help="write new and changed QR codes to a folder")
+    sync.add_argument("--dir", default="QR_Codes")
+    sync.add_argument("--prune", action="store_true", help="remove files of vehicles no longer in the database")
+    args = parser.parse_args(argv)
+
+    create_table(args.db)
+    db = get_db(args.db)
+    if args.command == "sheets":
+        day = None if args.all else args.day or time.strftime("%Y-%m-%d")
+        out_path = args.out or f"labels-{day or 'all'}.{args.format}"
+        labels, sheet_count = export_sheets(db, out_path, args.format, day, args.columns, args.rows, args.dpi,
+                                            args.workers)
+        if not labels:
+            print("No vehicles to label.")
+            return 1
+        return 0
+
+    started = time.perf_counter()
+    counts = sync_directory(db, args.dir, args.prune)
+    print(f"{args.dir}: {counts['written']} written, {counts['unchanged']} unchanged, {counts['removed']} removed, "
+          f"{counts['missing']} without a stored QR code ({time.perf_counter() - started:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
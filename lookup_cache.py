@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+
+from database import fetch_vehicle, fetch_services
+from registration import normalize_vehicle_number
+
+# Read-through LRU of vehicle lookups (registration + service statuses) keyed
+# by normalized vehicle number, so a vehicle scanned again as it moves between bays skips
+# the database.
+#
+# Invalidation is change driven. SQLite bumps PRAGMA data_version on a
+# connection whenever *another* connection (any station, or this process's
+# status writer thread) commits to the file; reading it touches no table.
+# Only when it moved does the cache read the vehicle_changes rows (kept by
+# triggers) with a seq above the last one seen and drop just those vehicles,
+# so a cached read never shows a status older than the last commit. Writes
+# made on the same connection don't bump data_version; call invalidate()
+# after those.
+
+MAX_ITEMS = 512
+
+
+class VehicleCache:
+    def __init__(self, db, max_items=MAX_ITEMS):
+        self.db = db
+        self.max_items = max_items
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._seq = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "syncs": 0, "entries_dropped": 0, "hit_age_total": 0.0}
+
+    # Drop entries for vehicles changed since the last sync
+    def _sync(self, conn):
+        if self._seq is None:
+            self._seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM vehicle_changes").fetchone()[0]
+            return
+        changes = conn.execute("SELECT vehicle_number, seq FROM vehicle_changes WHERE seq > ?",
+                               (self._seq,)).fetchall()
+        self.stats["syncs"] += 1
+        for vehicle_number, seq in changes:
+            if self._entries.pop(vehicle_number, None) is not None:
+                self.stats["entries_dropped"] += 1
+            self._seq = max(self._seq, seq)
+
+    # (vehicle row, [(service, status), ...]); vehicle row is None if unknown
+    def get(self, vehicle_number):
+        conn = self.db.connection()
+        key = normalize_vehicle_number(vehicle_number)
+
+        with self._lock:
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._versions.get(id(conn)) != version:
+                self._sync(conn)
+                self._versions[id(conn)] = version
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["hit_age_total"] += time.monotonic() - entry[0]
+                return entry[1]
+            self.stats["misses"] += 1
+            seq = self._seq
+
+        result = fetch_vehicle(conn, vehicle_number)
+        services = fetch_services(conn, result[0]) if result else []
+        value = (result, services)
+
+        with self._lock:
+            # Unknown vehicles aren't cached (a registration may follow), nor
+            # results read while another thread synced newer changes
+            if result and self._seq == seq:
+                self._entries[key] = (time.monotonic(), value)
+                if len(self._entries) > self.max_items:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, vehicle_number=None):
+        with self._lock:
+            if vehicle_number is None:
+                self.stats["entries_dropped"] += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(normalize_vehicle_number(vehicle_number), None) is not None:
+                self.stats["entries_dropped"] += 1
+
+    def hit_ratio(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def report(self):
+        stats = self.stats
+        mean_age = stats["hit_age_total"] / stats["hits"] if stats["hits"] else 0.0
+        return (f"vehicle cache: {stats['hits']} hits, {stats['misses']} misses ({self.hit_ratio():.0%} hit ratio), "
+                f"{stats['syncs']} change syncs dropping {stats['entries_dropped']} entries, "
+                f"mean age of cached reads {mean_age:.2f}s")
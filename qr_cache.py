@@ -0,0 +1,142 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from registration import QR_BOX_SIZE, QR_BORDER, QR_ERROR_CORRECTION, qr_png
+
+# Rendered QR PNGs memoized by payload and render parameters, so a reprint or
+# a re-registration with the same details skips rendering and PNG encoding.
+# Lookups go memory LRU -> disk -> render; disk entries live under
+# CACHE_DIR/<2 hex>/<key>.png and the least recently used ones are evicted
+# once the directory grows past its size budget.
+
+CACHE_DIR = 'qr_cache'
+MEMORY_ITEMS = 256
+DISK_MAX_BYTES = 64 * 2 ** 20
+
+
+def cache_key(payload, box_size, border, error_correction):
+    key = f"{box_size}|{border}|{error_correction}|{payload}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class QRCache:
+    def __init__(self, disk_dir=CACHE_DIR, memory_items=MEMORY_ITEMS, disk_max_bytes=DISK_MAX_BYTES):
+        self.disk_dir = disk_dir
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def get_png(self, payload, box_size=QR_BOX_SIZE, border=QR_BORDER, error_correction=QR_ERROR_CORRECTION):
+        key = cache_key(payload, box_size, border, error_correction)
+
+        with self._lock:
+            png = self._memory.get(key)
+            if png is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return png
+
+        png = self._read_disk(key)
+        disk_hit = png is not None
+        if not disk_hit:
+            png = qr_png(payload, box_size, border, error_correction)
+            self._write_disk(key, png)
+
+        with self._lock:
+            self.stats["disk_hits" if disk_hit else "misses"] += 1
+            self._memory[key] = png
+            if len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+        return png
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], f"{key}.png")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                png = f.read()
+        except OSError:
+            return None
+        # Bump the mtime so eviction treats it as recently used
+        os.utime(path)
+        return png
+
+    def _write_disk(self, key, png):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a concurrent reader never sees half a PNG
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for path, size, mtime in self._disk_entries())
+            else:
+                self._disk_bytes += len(png)
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict()
+
+    def _disk_entries(self):
+        for root, dirs, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".png"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    # Drop least recently used files until the directory is back to 90% of budget
+    def _evict(self):
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for path, size, mtime in entries)
+        target = self.disk_max_bytes * 0.9
+        for path, size, mtime in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.stats["evictions"] += 1
+        self._disk_bytes = total
+
+    def hit_ratio(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return hits / lookups if lookups else 0.0
+
+    def report(self):
+        stats = self.stats
+        return (f"qr cache: {stats['memory_hits']} memory hits, {stats['disk_hits']} disk hits, "
+                f"{stats['misses']} misses ({self.hit_ratio():.0%} hit ratio), {stats['evictions']} evicted")
+
+
+_default_cache = None
+
+
+def get_qr_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = QRCache()
+    return _default_cache
+
+
+# PNG bytes for `payload` through the shared cache
+def cached_qr_png(payload, box_size=QR_BOX_SIZE, border=QR_BORDER, error_correction=QR_ERROR_CORRECTION):
+    return get_qr_cache().get_png(payload, box_size, border, error_correction)
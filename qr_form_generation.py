@@ -2,24 +2,10 @@ import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
 from PIL import Image, ImageTk
-import qrcode
 from io import BytesIO
 import json
 import os  # For handling paths
-
-# Function to generate QR code
-def generate_qr_code(data):
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-
-    img = qr.make_image(fill='black', back_color='white')
-    return img  # Return the generated QR image
+from qr_cache import cached_qr_png
 
 # Function to handle form submission
 def submit_form():
@@ -70,8 +56,8 @@ def submit_form():
 
     qr_data = json.dumps(data)
 
-    # Generate a QR code with the data
-    img = generate_qr_code(qr_data)
+    # Generate a QR code with the data (reprints come from the QR cache)
+    qr_code_data = cached_qr_png(qr_data)
 
     # Save the QR code as an image file
     folder_path = "D:/Major_Project/QR_Codes"  # Change this to your desired folder path
@@ -87,16 +73,13 @@ def submit_form():
     file_path = os.path.join(folder_path, filename)
 
     # Save the QR code to the specified folder
-    img.save(file_path)
+    with open(file_path, "wb") as f:
+        f.write(qr_code_data)
 
     messagebox.showinfo("Success", f"QR Code saved to {file_path}")
 
-    # Display QR code in the GUI
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    
-    qr_img = Image.open(buffer)
+    # Display QR code in the GUI, from the same PNG bytes
+    qr_img = Image.open(BytesIO(qr_code_data))
     qr_img.thumbnail((200, 200))
     qr_photo = ImageTk.PhotoImage(qr_img)
 
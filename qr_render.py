@@ -0,0 +1,72 @@
+import struct
+import zlib
+
+import numpy as np
+
+from metrics import timer
+from registration import QR_BOX_SIZE, QR_BORDER, QR_ERROR_CORRECTION
+
+# NumPy QR rasterizer. The module matrix is scaled up with np.repeat and
+# written straight to a 1-bit grayscale PNG, skipping PIL's box-by-box drawing.
+# Output is pixel-identical to qr.make_image(fill='black', back_color='white')
+# with the same box_size and border. render_svg emits the same code as vector
+# paths for label printers that take SVG.
+
+
+def build_qr(data, border=QR_BORDER, error_correction=QR_ERROR_CORRECTION, version=None):
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=version or 1,
+        error_correction=getattr(qrcode.constants, f"ERROR_CORRECT_{error_correction}"),
+        border=border,
+    )
+    qr.add_data(data)
+    qr.make(fit=version is None)
+    return qr
+
+
+# Boolean pixel array, True where the pixel is black
+def rasterize(qr, box_size=QR_BOX_SIZE):
+    modules = np.array(qr.get_matrix(), dtype=bool)
+    return np.repeat(np.repeat(modules, box_size, axis=0), box_size, axis=1)
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+# 1-bit grayscale PNG (bit set = white) of a boolean "is black" array
+def encode_png(dark, compression=6):
+    height, width = dark.shape
+    rows = np.packbits(~dark, axis=1)
+    # Every scanline starts with filter type 0 (None)
+    scanlines = np.hstack([np.zeros((height, 1), dtype=np.uint8), rows])
+    header = struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n"
+            + png_chunk(b"IHDR", header)
+            + png_chunk(b"IDAT", zlib.compress(scanlines.tobytes(), compression))
+            + png_chunk(b"IEND", b""))
+
+
+def render_png(data, box_size=QR_BOX_SIZE, border=QR_BORDER, error_correction=QR_ERROR_CORRECTION):
+    with timer("qr_generate"):
+        qr = build_qr(data, border, error_correction)
+    with timer("png_encode"):
+        return encode_png(rasterize(qr, box_size))
+
+
+# SVG with one path; each horizontal run of dark modules becomes one rectangle
+def render_svg(data, box_size=QR_BOX_SIZE, border=QR_BORDER, error_correction=QR_ERROR_CORRECTION):
+    modules = np.array(build_qr(data, border, error_correction).get_matrix(), dtype=bool)
+    size = modules.shape[0] * box_size
+    commands = []
+    for y, row in enumerate(modules):
+        # Start/end columns of each run of True values in the row
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], row.astype(np.int8), [0]))))
+        for start, end in zip(edges[::2], edges[1::2]):
+            commands.append(f"M{start * box_size},{y * box_size}h{(end - start) * box_size}v{box_size}h-{(end - start) * box_size}z")
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+            f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+            f'<rect width="{size}" height="{size}" fill="white"/>'
+            f'<path d="{"".join(commands)}" fill="black"/></svg>')
@@ -0,0 +1,174 @@
+import json
+import re
+import zlib
+from io import BytesIO
+
+from metrics import timed, timer
+
+# Services offered at the front desk, with prices in ₹
+SERVICES = [
+    ("Washing", 100),
+    ("Tyre Changing", 200),
+    ("Oil Change", 300),
+    ("Engine Checkup", 400),
+    ("Brake Adjustment", 150),
+    ("Battery Replacement", 500)
+]
+SERVICE_PRICES = dict(SERVICES)
+
+VEHICLE_TYPES = ["Car", "Bike", "Truck"]
+
+REQUIRED_FIELDS = ["first_name", "last_name", "mobile_no", "vehicle_type", "vehicle_brand", "vehicle_number"]
+
+
+# Render parameters used for every printed QR code
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+QR_ERROR_CORRECTION = "L"
+
+
+# Function to generate QR code
+@timed("qr_generate")
+def generate_qr_code(data, box_size=QR_BOX_SIZE, border=QR_BORDER, error_correction=QR_ERROR_CORRECTION):
+    # Imported here so scanning-only tools don't need qrcode installed
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=getattr(qrcode.constants, f"ERROR_CORRECT_{error_correction}"),
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    img = qr.make_image(fill='black', back_color='white')
+    return img
+
+
+# QR code for `data` as PNG bytes. Uses the NumPy rasterizer in qr_render
+# when NumPy is installed (same pixels, much faster) and PIL otherwise.
+def qr_png(data, box_size=QR_BOX_SIZE, border=QR_BORDER, error_correction=QR_ERROR_CORRECTION):
+    try:
+        from qr_render import render_png
+    except ImportError:
+        render_png = None
+    if render_png is not None:
+        return render_png(data, box_size, border, error_correction)
+
+    img = generate_qr_code(data, box_size, border, error_correction)
+    with timer("png_encode"):
+        buffer = BytesIO()
+        img.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+
+# Validate a registration record; returns an error message or None
+def validate_registration(record):
+    if not all(record.get(field) for field in REQUIRED_FIELDS):
+        return "Please fill in all the required fields!"
+
+    mobile_no = record["mobile_no"]
+    if len(mobile_no) != 10 or not mobile_no.isdigit():
+        return "Mobile number must be exactly 10 digits!"
+
+    return None
+
+
+# Key a vehicle is stored under: the plate without case, spaces or hyphens,
+# so "MH 12-ab 1234" and "MH12AB1234" are the same vehicle. None if empty.
+def normalize_vehicle_number(vehicle_number):
+    key = re.sub(r"[\s-]+", "", vehicle_number or "").upper()
+    return key or None
+
+
+# Turn selected service names into the "Washing (₹100)" labels shown on the
+# QR, (service, price) jobs for the database and the total price
+def price_services(service_names):
+    selected_services = []
+    selected_jobs = []
+    total_price = 0
+    for service in service_names:
+        price = SERVICE_PRICES[service]
+        selected_services.append(f"{service} (₹{price})")
+        selected_jobs.append((service, price))
+        total_price += price
+    return selected_services, selected_jobs, total_price
+
+
+# The JSON document stored in the QR code
+def qr_payload(record, selected_services, total_price):
+    data = {
+        "First Name": record["first_name"],
+        "Last Name": record["last_name"],
+        "Mobile No": record["mobile_no"],
+        "Address": record["address"],
+        "Pincode": record["pincode"],
+        "Vehicle Type": record["vehicle_type"],
+        "Vehicle Brand": record["vehicle_brand"],
+        "Vehicle Number": record["vehicle_number"],
+        "Services": selected_services,
+        "Total Price": total_price
+    }
+    return json.dumps(data)
+
+
+# Compact QR payloads: instead of the whole JSON record, encode only the
+# registration id as "VQ<version>:<id><check>" in base 36. Every character is
+# in the QR alphanumeric set, so the code stays at a low QR version; the
+# tracker resolves the id against the database.
+TOKEN_PREFIX = "VQ"
+TOKEN_VERSION = 1
+BASE36 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def to_base36(number):
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = BASE36[digit] + digits
+        if not number:
+            return digits
+
+
+# Two base-36 check characters over the version and id digits
+def token_check(version, digits):
+    crc = zlib.crc32(f"{version}:{digits}".encode()) % (36 * 36)
+    return BASE36[crc // 36] + BASE36[crc % 36]
+
+
+def encode_token(user_id, version=TOKEN_VERSION):
+    digits = to_base36(user_id)
+    return f"{TOKEN_PREFIX}{version}:{digits}{token_check(version, digits)}"
+
+
+# Registration id from a compact token, or None if it is not a valid token
+def decode_token(text):
+    text = text.strip().upper()
+    if not text.startswith(TOKEN_PREFIX) or ":" not in text:
+        return None
+    version, _, body = text[len(TOKEN_PREFIX):].partition(":")
+    if not version.isdigit() or len(body) < 3:
+        return None
+    digits, check = body[:-2], body[-2:]
+    if any(c not in BASE36 for c in digits) or token_check(int(version), digits) != check:
+        return None
+    return int(digits, 36)
+
+
+# Work out what a scanned QR code refers to. Returns ("id", registration id)
+# for compact tokens, ("vehicle", vehicle number) for the JSON records already
+# printed on vehicles, or None if the code is neither.
+def parse_scanned(qr_data):
+    user_id = decode_token(qr_data)
+    if user_id is not None:
+        return "id", user_id
+
+    try:
+        data = json.loads(qr_data)
+    except json.JSONDecodeError:
+        return None
+    vehicle_number = data.get("Vehicle Number") if isinstance(data, dict) else None
+    # Only text is a plate; a number or list would break normalize_vehicle_number
+    if isinstance(vehicle_number, str) and vehicle_number.strip():
+        return "vehicle", vehicle_number
+    return None
@@ -0,0 +1,222 @@
+import argparse
+import sys
+import time
+
+from database import DB_PATH, SERVICE_STATUSES, OPEN_STATUSES, get_db, create_table, rebuild_summaries, check_summaries, \
+    fetch_status_history, compact_status_events
+from archive import archived_status_history
+
+# Revenue and workload reports, read from the summary tables the database
+# keeps up to date (daily_summary, job_summary) rather than from the jobs.
+#
+#   python reports.py [--db FILE] daily [--days 14]
+#   python reports.py [--db FILE] services | types | backlog
+#   python reports.py [--db FILE] board [--watch 2]
+#   python reports.py [--db FILE] turnaround [--status "In Process"] [--days 30]
+#   python reports.py [--db FILE] history VEHICLE
+#   python reports.py [--db FILE] compact [--keep-days 90]   roll up old status events
+#   python reports.py [--db FILE] check        exit 1 if the summaries drifted
+#   python reports.py [--db FILE] rebuild      recompute them from scratch
+
+# Status events kept in full before compact rolls them up per day
+KEEP_DAYS = 90
+
+
+# [(day, visits, jobs booked, revenue), ...], latest day first
+def daily_revenue(conn, days=None):
+    query = "SELECT day, visits, jobs, revenue FROM daily_summary ORDER BY day DESC"
+    if days:
+        return conn.execute(query + " LIMIT ?", (days,)).fetchall()
+    return conn.execute(query).fetchall()
+
+
+# {group: {status: (jobs, revenue)}} over one job_summary column
+def totals_by(conn, column):
+    totals = {}
+    for group, status, jobs, revenue in conn.execute(
+            f"SELECT {column}, status, SUM(jobs), SUM(revenue) FROM job_summary GROUP BY 1, 2 ORDER BY 1"):
+        if jobs:
+            totals.setdefault(group, {})[status] = (jobs, revenue)
+    return totals
+
+
+def service_totals(conn):
+    return totals_by(conn, "service")
+
+
+def vehicle_type_totals(conn):
+    return totals_by(conn, "vehicle_type")
+
+
+# [(status, jobs, revenue), ...] in workflow order
+def status_backlog(conn):
+    totals = {status: (jobs, revenue) for status, jobs, revenue in conn.execute(
+        "SELECT status, SUM(jobs), SUM(revenue) FROM job_summary GROUP BY status")}
+    return [(status,) + totals.get(status, (0, 0.0)) for status in SERVICE_STATUSES]
+
+
+# Open jobs per service: {service: {status: jobs}} for Pending and In Process
+def jobs_in_progress(conn):
+    board = {}
+    placeholders = ", ".join("?" * len(OPEN_STATUSES))
+    for service, status, jobs in conn.execute(
+            f'''SELECT service, status, SUM(jobs) FROM job_summary WHERE status IN ({placeholders})
+                GROUP BY service, status ORDER BY service''', OPEN_STATUSES):
+        if jobs:
+            board.setdefault(service, {})[status] = jobs
+    return board
+
+
+# Time jobs spent in `status` before moving on, per service, for changes
+# made between `since` and `until` (unix times):
+# [(service, jobs, mean, p50, p90, max), ...] in seconds. Days already
+# compacted count whole and add to jobs, mean and max only; p50/p90 come
+# from the events still in the log (None if there are none).
+def turnaround(conn, status="In Process", since=0, until=None):
+    until = until or time.time()
+    totals = {}
+    for service, timed, seconds_total, seconds_max in conn.execute(
+            '''SELECT service, SUM(timed), SUM(seconds_total), MAX(seconds_max) FROM status_event_rollup
+               WHERE old_status = ? AND day BETWEEN DATE(?, 'unixepoch', 'localtime')
+                                                AND DATE(?, 'unixepoch', 'localtime')
+               GROUP BY service''', (status, since, until)):
+        if timed:
+            totals[service] = [timed, seconds_total, seconds_max, []]
+    # One range over the covering turnaround index
+    for service, seconds in conn.execute(
+            '''SELECT service, seconds FROM status_events
+               WHERE old_status = ? AND at >= ? AND at < ? AND seconds IS NOT NULL''', (status, since, until)):
+        entry = totals.setdefault(service, [0, 0.0, 0.0, []])
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        entry[3].append(seconds)
+
+    rows = []
+    for service, (jobs, seconds_total, seconds_max, recent) in sorted(totals.items()):
+        recent.sort()
+        p50 = recent[len(recent) // 2] if recent else None
+        p90 = recent[min(len(recent) - 1, int(len(recent) * 0.9))] if recent else None
+        rows.append((service, jobs, seconds_total / jobs, p50, p90, seconds_max))
+    return rows
+
+
+def format_minutes(seconds):
+    return f"{seconds / 60:>10.1f}" if seconds is not None else f"{'-':>10}"
+
+
+def format_totals(title, totals):
+    lines = [f"{title:<20} " + " ".join(f"{status:>12}" for status in SERVICE_STATUSES) + f" {'revenue':>12}"]
+    for group, by_status in totals.items():
+        counts = " ".join(f"{by_status.get(status, (0, 0.0))[0]:>12}" for status in SERVICE_STATUSES)
+        revenue = sum(revenue for jobs, revenue in by_status.values())
+        lines.append(f"{group or '-':<20} {counts} {revenue:>12.2f}")
+    return "\n".join(lines)
+
+
+def format_board(board):
+    lines = [f"{'service':<20} " + " ".join(f"{status:>12}" for status in OPEN_STATUSES)]
+    for service, by_status in board.items():
+        lines.append(f"{service:<20} " + " ".join(f"{by_status.get(status, 0):>12}" for status in OPEN_STATUSES))
+    if not board:
+        lines.append("no open jobs")
+    return "\n".join(lines)
+
+
+def show_board(db, watch):
+    conn = db.connection()
+    version = None
+    while True:
+        # Redrawn only when some station committed since the last look
+        current = conn.execute("PRAGMA data_version").fetchone()[0]
+        if current != version:
+            version = current
+            print(time.strftime("%H:%M:%S"), "jobs in progress")
+            print(format_board(jobs_in_progress(conn)))
+            print()
+        if not watch:
+            return
+        time.sleep(watch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Revenue and workload reports")
+    parser.add_argument("--db", default=DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    daily = commands.add_parser("daily", help="visits, jobs booked and revenue per day")
+    daily.add_argument("--days", type=int, default=14)
+    commands.add_parser("services", help="jobs and revenue per service")
+    commands.add_parser("types", help="jobs and revenue per vehicle type")
+    commands.add_parser("backlog", help="jobs and revenue per status")
+    board = commands.add_parser("board", help="open jobs per service")
+    board.add_argument("--watch", type=float, help="keep refreshing, checking every this many seconds")
+    turnaround_parser = commands.add_parser("turnaround", help="minutes jobs spent in a status, per service")
+    turnaround_parser.add_argument("--status", default="In Process", choices=SERVICE_STATUSES)
+    turnaround_parser.add_argument("--days", type=float, default=30)
+    history = commands.add_parser("history", help="status changes of one vehicle")
+    history.add_argument("vehicle")
+    compact = commands.add_parser("compact", help="roll status events older than --keep-days up per day")
+    compact.add_argument("--keep-days", type=float, default=KEEP_DAYS)
+    commands.add_parser("check", help="compare the summaries with a rebuild from scratch")
+    commands.add_parser("rebuild", help="recompute the summaries from scratch")
+    args = parser.parse_args(argv)
+
+    create_table(args.db)
+    db = get_db(args.db)
+    conn = db.connection()
+    if args.command == "daily":
+        print(f"{'day':<12} {'visits':>8} {'jobs':>8} {'revenue':>12}")
+        for day, visits, jobs, revenue in daily_revenue(conn, args.days):
+            print(f"{day:<12} {visits:>8} {jobs:>8} {revenue:>12.2f}")
+    elif args.command == "services":
+        print(format_totals("service", service_totals(conn)))
+    elif args.command == "types":
+        print(format_totals("vehicle type", vehicle_type_totals(conn)))
+    elif args.command == "backlog":
+        print(f"{'status':<12} {'jobs':>8} {'revenue':>12}")
+        for status, jobs, revenue in status_backlog(conn):
+            print(f"{status:<12} {jobs:>8} {revenue:>12.2f}")
+    elif args.command == "board":
+        try:
+            show_board(db, args.watch)
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "turnaround":
+        print(f"minutes in {args.status}, last {args.days:g} days")
+        print(f"{'service':<20} {'jobs':>8} {'mean':>10} {'p50':>10} {'p90':>10} {'max':>10}")
+        for service, jobs, mean, p50, p90, maximum in turnaround(conn, args.status, time.time() - args.days * 86400):
+            print(f"{service:<20} {jobs:>8} {format_minutes(mean)} {format_minutes(p50)} {format_minutes(p90)} "
+                  f"{format_minutes(maximum)}")
+    elif args.command == "history":
+        # Earlier visits moved out by archive.py come first, from their archive files
+        events = archived_status_history(db, args.vehicle) + fetch_status_history(conn, args.vehicle)
+        if not events:
+            print("No status history for this vehicle.")
+            return 1
+        for service, old_status, new_status, station, at, seconds in events:
+            after = f" after {seconds / 60:.1f} min" if seconds is not None else ""
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(at))}  {service}: "
+                  f"{old_status or 'booked'} -> {new_status}{after} ({station or '?'})")
+    elif args.command == "compact":
+        started = time.perf_counter()
+        compacted = compact_status_events(db, time.time() - args.keep_days * 86400)
+        print(f"compacted {compacted} status events older than {args.keep_days:g} days "
+              f"({time.perf_counter() - started:.2f}s)")
+    elif args.command in ("check", "rebuild"):
+        started = time.perf_counter()
+        mismatches = check_summaries(conn)
+        for table, key, stored, rebuilt in mismatches:
+            print(f"{table} {key}: stored {stored}, rebuilt {rebuilt}")
+        if args.command == "rebuild":
+            with db.transaction() as conn:
+                rebuild_summaries(conn)
+            print(f"rebuilt summaries, {len(mismatches)} row(s) differed "
+                  f"({time.perf_counter() - started:.2f}s)")
+        else:
+            print(f"{len(mismatches)} row(s) differ from a rebuild ({time.perf_counter() - started:.2f}s)")
+            return 1 if mismatches else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,478 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from decoders import make_decoder, decoder_for_source
+from metrics import count
+
+# Staged QR scanning pipeline used by the trackers.
+#
+#   capture thread --> LatestFrameQueue --> decode thread --> on_result()
+#        \--> throttled preview window
+#
+# Capture never waits on decoding: if the decoder is busy the queued frame is
+# replaced by the newer one, so a slow decode drops frames instead of building
+# a backlog. The decoder works on a grayscale, optionally cropped and
+# downscaled copy of the frame. Which decoder engine (or cascade of engines)
+# runs is calibrated per camera, see decoders.py.
+#
+# With stop_after_first=False the camera stays open for back-to-back scans,
+# and a code read again within `dedupe_window` seconds is suppressed.
+#
+# With multi=True every code in the frame is reported: a CodeTracker follows
+# each code's box across frames and on_result gets the list of codes in view
+# whenever it changes.
+
+
+# Single-slot queue where the newest frame replaces one not yet taken
+class LatestFrameQueue:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+            self._item = item
+            self._cond.notify()
+
+    # Next item, or None once the queue is closed (or on timeout)
+    def get(self, timeout=None):
+        with self._cond:
+            if self._item is None and not self._closed:
+                self._cond.wait(timeout)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+# Events per second over a sliding window
+class RateMeter:
+    def __init__(self, window=2.0):
+        self.window = window
+        self._times = deque()
+        self._lock = threading.Lock()
+
+    def tick(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            self._times.append(now)
+            while self._times and now - self._times[0] > self.window:
+                self._times.popleft()
+
+    def rate(self):
+        with self._lock:
+            if len(self._times) < 2:
+                return 0.0
+            span = self._times[-1] - self._times[0]
+            return (len(self._times) - 1) / span if span else 0.0
+
+
+# Suppresses a code seen again within `window` seconds, so a QR held in
+# front of the camera is reported once rather than on every frame
+class DedupeCache:
+    def __init__(self, window=10.0):
+        self.window = window
+        self._seen = {}
+        self.suppressed = 0
+
+    # True the first time a code is seen in the window, False for repeats
+    def check(self, code, now=None):
+        now = time.monotonic() if now is None else now
+        if len(self._seen) > 256:
+            self._seen = {c: t for c, t in self._seen.items() if now - t < self.window}
+        last = self._seen.get(code)
+        if last is not None and now - last < self.window:
+            self.suppressed += 1
+            return False
+        self._seen[code] = now
+        return True
+
+
+# Capture backend for the platform: DirectShow on Windows, V4L2 on Linux,
+# AVFoundation on macOS
+def default_capture_backend():
+    if sys.platform.startswith("win"):
+        return cv2.CAP_DSHOW
+    if sys.platform.startswith("linux"):
+        return cv2.CAP_V4L2
+    if sys.platform == "darwin":
+        return cv2.CAP_AVFOUNDATION
+    return cv2.CAP_ANY
+
+
+# Frame sources: anything with open() -> bool, read() -> (ok, frame) and
+# release(), so the same decode path runs on a webcam, a recorded video or a
+# directory of still images. Recorded sources simply end; a live camera
+# failing to deliver a frame is an error.
+class CameraSource:
+    live = True
+
+    def __init__(self, camera_index=0, api_preference=None, frame_size=(640, 480)):
+        # Identifies the camera in the decoder calibration file
+        self.key = f"camera:{camera_index}"
+        self.camera_index = camera_index
+        self.api_preference = default_capture_backend() if api_preference is None else api_preference
+        self.frame_size = frame_size
+        self.cap = None
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.camera_index, self.api_preference)
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.frame_size[0])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.frame_size[1])
+        return self.cap.isOpened()
+
+    def read(self):
+        return self.cap.read()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+
+class VideoFileSource(CameraSource):
+    live = False
+
+    def __init__(self, path):
+        super().__init__()
+        self.key = f"video:{os.path.abspath(path)}"
+        self.path = path
+
+    def open(self):
+        self.cap = cv2.VideoCapture(self.path)
+        return self.cap.isOpened()
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class ImageDirectorySource:
+    live = False
+
+    def __init__(self, path):
+        self.key = f"images:{os.path.abspath(path)}"
+        self.path = path
+        self.files = []
+        self.current = None
+
+    def open(self):
+        if not os.path.isdir(self.path):
+            return False
+        self.files = sorted(name for name in os.listdir(self.path) if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.files.reverse()
+        return True
+
+    def read(self):
+        if not self.files:
+            return False, None
+        self.current = self.files.pop()
+        frame = cv2.imread(os.path.join(self.path, self.current))
+        return frame is not None, frame
+
+    def release(self):
+        self.files = []
+
+
+# Grayscale, region-of-interest crop and downscale ahead of decoding.
+# `roi` is (x0, y0, x1, y1) as fractions of the frame.
+def prepare_frame(frame, roi=None, decode_width=None):
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if roi:
+        height, width = frame.shape[:2]
+        x0, y0, x1, y1 = roi
+        frame = frame[int(y0 * height):int(y1 * height), int(x0 * width):int(x1 * width)]
+    if decode_width and frame.shape[1] > decode_width:
+        scale = decode_width / frame.shape[1]
+        frame = cv2.resize(frame, (decode_width, int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+_default_decoder = None
+
+
+# Decoder used when none is passed: the default engine cascade
+def default_decoder():
+    global _default_decoder
+    if _default_decoder is None:
+        _default_decoder = make_decoder()
+    return _default_decoder
+
+
+# Every QR payload found in a frame
+def decode_frame(frame, roi=None, decode_width=None, decoder=None):
+    decoder = decoder or default_decoder()
+    return [payload for payload, box in decoder.locate(prepare_frame(frame, roi, decode_width))]
+
+
+# Every QR payload with its box (left, top, width, height) in frame pixels
+def locate_codes(frame, roi=None, decode_width=None, decoder=None):
+    decoder = decoder or default_decoder()
+    height, width = frame.shape[:2]
+    x0, y0, x1, y1 = roi or (0, 0, 1, 1)
+    left, top = int(x0 * width), int(y0 * height)
+    prepared = prepare_frame(frame, roi, decode_width)
+    scale = (int(x1 * width) - left) / prepared.shape[1]
+    return [(payload, (left + int(x * scale), top + int(y * scale), int(w * scale), int(h * scale)))
+            for payload, (x, y, w, h) in decoder.locate(prepared)]
+
+
+FULL_SCAN_EVERY = 10
+CHANGE_THRESHOLD = 10.0
+MAX_MISSES = 3
+SIGNATURE_SIZE = 16
+
+
+# Follows every code in view across frames. A tracked code is revalidated by
+# comparing a 16x16 thumbnail of its box with the one from its last decode;
+# only when that changed (the code moved or was covered) is the area around
+# the box decoded again. The whole frame is searched for new codes every
+# `full_scan_every` frames, or on every frame while nothing is tracked, so
+# decode work falls off while the codes in view hold still.
+class CodeTracker:
+    def __init__(self, full_scan_every=FULL_SCAN_EVERY, change_threshold=CHANGE_THRESHOLD,
+                 max_misses=MAX_MISSES, margin=0.3, decoder=None):
+        self.decoder = decoder
+        self.full_scan_every = full_scan_every
+        self.change_threshold = change_threshold
+        self.max_misses = max_misses
+        self.margin = margin
+        self.tracks = {}
+        # (code, box) pairs as of the last frame, for the preview thread
+        self.visible = []
+        self._frames_since_full = 0
+        self.stats = {"frames": 0, "full_decodes": 0, "region_decodes": 0, "revalidations": 0, "lost": 0}
+
+    def _signature(self, gray, rect):
+        x, y, w, h = rect
+        patch = gray[max(y, 0):y + h, max(x, 0):x + w]
+        if patch.size == 0:
+            return None
+        return cv2.resize(patch, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def _track(self, gray, code, rect, new):
+        if code not in self.tracks and code not in new:
+            new.append(code)
+        self.tracks[code] = {"rect": rect, "signature": self._signature(gray, rect), "misses": 0}
+
+    # Codes that appeared and codes that left view in this frame
+    def update(self, frame, roi=None, decode_width=None):
+        gray = prepare_frame(frame)
+        height, width = gray.shape
+        self.stats["frames"] += 1
+        new, lost = [], []
+
+        for code, track in list(self.tracks.items()):
+            signature = self._signature(gray, track["rect"])
+            if signature is not None and track["signature"] is not None \
+                    and np.abs(signature - track["signature"]).mean() < self.change_threshold:
+                self.stats["revalidations"] += 1
+                track["misses"] = 0
+                continue
+
+            # Changed: decode just the neighbourhood of the last box
+            x, y, w, h = track["rect"]
+            pad_x, pad_y = int(w * self.margin), int(h * self.margin)
+            x0, y0 = max(x - pad_x, 0), max(y - pad_y, 0)
+            x1, y1 = min(x + w + pad_x, width), min(y + h + pad_y, height)
+            self.stats["region_decodes"] += 1
+            found = [(data, (x0 + rx, y0 + ry, rw, rh))
+                     for data, (rx, ry, rw, rh) in locate_codes(gray[y0:y1, x0:x1], decoder=self.decoder)] if x1 > x0 and y1 > y0 else []
+            for data, rect in found:
+                self._track(gray, data, rect, new)
+            if all(data != code for data, rect in found):
+                track["misses"] += 1
+                if track["misses"] > self.max_misses:
+                    del self.tracks[code]
+                    lost.append(code)
+                    self.stats["lost"] += 1
+
+        self._frames_since_full += 1
+        if not self.tracks or self._frames_since_full >= self.full_scan_every:
+            self._frames_since_full = 0
+            self.stats["full_decodes"] += 1
+            for data, rect in locate_codes(gray, roi, decode_width, self.decoder):
+                self._track(gray, data, rect, new)
+
+        self.visible = [(code, track["rect"]) for code, track in self.tracks.items()]
+        return new, lost
+
+    def codes(self):
+        return list(self.tracks)
+
+    # Decodes run per frame, full-frame searches counting as one each
+    def decodes_per_frame(self):
+        stats = self.stats
+        return (stats["full_decodes"] + stats["region_decodes"]) / stats["frames"] if stats["frames"] else 0.0
+
+
+class ScanPipeline:
+    def __init__(self, on_result, camera_index=0, api_preference=None, frame_size=(640, 480),
+                 roi=None, decode_width=640, preview=True, preview_fps=15, stop_after_first=True,
+                 dedupe_window=10.0, source=None, multi=False, full_scan_every=FULL_SCAN_EVERY, decoder=None):
+        self.on_result = on_result
+        self.source = source or CameraSource(camera_index, api_preference, frame_size)
+        self.roi = roi
+        self.decode_width = decode_width
+        self.preview = preview
+        self.preview_fps = preview_fps
+        self.stop_after_first = stop_after_first
+        self.dedupe = DedupeCache(dedupe_window)
+        # A decoder, an engine spec like "pyzbar,opencv", or None for the
+        # order calibrated for this source
+        if decoder is None:
+            decoder = decoder_for_source(self.source.key)
+        elif isinstance(decoder, str):
+            decoder = make_decoder(decoder)
+        self.decoder = decoder
+        self.tracker = CodeTracker(full_scan_every, decoder=decoder) if multi else None
+
+        self.frames = LatestFrameQueue()
+        self.capture_rate = RateMeter()
+        self.decode_rate = RateMeter()
+        self.latencies = deque(maxlen=100)
+        self.error = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._stop.clear()
+        self.frames = LatestFrameQueue()
+        self._threads = [threading.Thread(target=self._capture_loop, daemon=True),
+                         threading.Thread(target=self._decode_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.frames.close()
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def wait(self):
+        for thread in self._threads:
+            thread.join()
+
+    def run(self):
+        self.start()
+        self.wait()
+
+    def _capture_loop(self):
+        # Check if the camera opened successfully
+        if not self.source.open():
+            self.error = "Could not open camera." if self.source.live else "Could not open frame source."
+            self.stop()
+            return
+
+        preview_interval = 1.0 / self.preview_fps if self.preview_fps else 0.0
+        last_preview = 0.0
+        try:
+            while not self._stop.is_set():
+                ret, frame = self.source.read()
+                if not ret:
+                    if self.source.live:
+                        self.error = "Could not read frame."
+                    break
+                captured_at = time.perf_counter()
+                self.capture_rate.tick(captured_at)
+                self.frames.put((frame, captured_at))
+
+                # Display the webcam feed, independently of decode speed
+                if self.preview and captured_at - last_preview >= preview_interval:
+                    last_preview = captured_at
+                    if self.tracker:
+                        frame = frame.copy()
+                        for code, (x, y, w, h) in self.tracker.visible:
+                            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 200, 0), 2)
+                            cv2.putText(frame, code[:24], (x, max(y - 6, 12)), cv2.FONT_HERSHEY_SIMPLEX,
+                                        0.5, (0, 200, 0), 1)
+                    cv2.imshow('QR Code Scanner', frame)
+                    # Stop scanning if 'q' is pressed
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+        finally:
+            self.source.release()
+            if self.preview:
+                cv2.destroyAllWindows()
+            self.stop()
+
+    def _decode_loop(self):
+        while not self._stop.is_set():
+            item = self.frames.get(timeout=0.5)
+            if item is None:
+                continue
+            frame, captured_at = item
+
+            if self.tracker:
+                if self._track_frame(frame, captured_at):
+                    return
+                continue
+
+            decoded = decode_frame(frame, self.roi, self.decode_width, self.decoder)
+            self.decode_rate.tick()
+
+            for qr_data in decoded:
+                if not self.dedupe.check(qr_data):
+                    continue
+                count("scans")
+                self.on_result(qr_data)
+                self.latencies.append(time.perf_counter() - captured_at)
+                if self.stop_after_first:
+                    self.stop()
+                    return
+
+    # Multi mode: report the codes in view when the set changes. True to stop.
+    def _track_frame(self, frame, captured_at):
+        new, lost = self.tracker.update(frame, self.roi, self.decode_width)
+        self.decode_rate.tick()
+        if not new and not lost:
+            return False
+        count("scans", len(new))
+        codes = self.tracker.codes()
+        if codes:
+            self.on_result(codes)
+        if new:
+            self.latencies.append(time.perf_counter() - captured_at)
+            if self.stop_after_first:
+                self.stop()
+                return True
+        return False
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        stats = {
+            "decoder": self.decoder.name,
+            "capture_fps": self.capture_rate.rate(),
+            "decode_fps": self.decode_rate.rate(),
+            "dropped_frames": self.frames.dropped,
+            "duplicates_suppressed": self.dedupe.suppressed,
+            "scan_to_result_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+        }
+        if self.tracker:
+            stats.update(self.tracker.stats)
+            stats["decodes_per_frame"] = self.tracker.decodes_per_frame()
+        return stats
+
+    def report(self):
+        stats = self.stats()
+        latency = stats["scan_to_result_ms"]
+        latency = f"{latency:.0f} ms" if latency is not None else "n/a"
+        engines = f" ({self.decoder.report()})" if hasattr(self.decoder, "report") else ""
+        return (f"scanner [{stats['decoder']}{engines}]: capture {stats['capture_fps']:.1f} fps, decode {stats['decode_fps']:.1f} fps, "
+                f"{stats['dropped_frames']} frames dropped, {stats['duplicates_suppressed']} repeat reads suppressed, "
+                f"scan-to-result {latency}"
+                + (f", {stats['decodes_per_frame']:.2f} decodes per frame "
+                   f"({stats['revalidations']} codes revalidated without decoding)" if self.tracker else ""))
@@ -0,0 +1,375 @@
+import argparse
+import asyncio
+import json
+import sqlite3
+import os
+import signal
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import unquote, parse_qs
+
+from archive import lookup_archived
+from bulk_import import prepare_row
+from database import DB_PATH, SERVICE_STATUSES, STATION, get_db, migrate, insert_registration, set_qr_code, \
+    set_service_status, resolve_scanned, fetch_qr_code, search_vehicles, fetch_board_changes
+from lookup_cache import VehicleCache
+from metrics import REGISTRY, timer, prometheus_text, configure, add_arguments
+from qr_cache import cached_qr_png
+from registration import qr_png, encode_token
+
+# Local HTTP service that owns the database for every station.
+#
+#   python service.py [--db vehicle_registration.db] [--host 127.0.0.1] [--port 8765]
+#
+# Endpoints (JSON in and out):
+#   POST /registrations                        register a vehicle (form fields,
+#                                              "services": [names], "compact": bool)
+#   GET  /registrations/<id>/qr                the registration's QR PNG
+#   GET  /vehicles/<vehicle number>            vehicle and service statuses ("archive" names the
+#                                              archive file of a vehicle moved out, else null)
+#   POST /resolve                              {"qr_data": ...} -> vehicle number
+#   GET  /search?q=<text>                      registrations matching names, mobile or plate
+#   GET  /board[?since=<seq>]                  vehicles in the workshop, or those changed since seq
+#   PUT  /vehicles/<vehicle number>/services/<service>   {"status": ..., "station": ...}
+#   POST /statuses                             [{"vehicle_number", "service", "status", "station"}, ...]
+#                                              -> {"updated": total, "matched": [jobs per update]}
+#   GET  /metrics                              request, batching and stage timing counters
+#   GET  /metrics/prometheus                   stage timings in Prometheus text format
+#
+# Reads run on a bounded thread pool, each worker with its own pooled
+# connection. QR codes are rendered in worker processes (as bulk_import does)
+# so a registration doesn't hold the GIL while lookups wait. All writes go through one writer thread that gathers whatever
+# arrived within BATCH_WINDOW into a single transaction, with a savepoint per
+# request so one bad request doesn't fail the rest.
+
+HOST = "127.0.0.1"
+PORT = 8765
+READ_WORKERS = 4
+RENDER_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+MAX_PENDING = 256
+BATCH_WINDOW = 0.002
+MAX_BODY = 1 << 20
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class RegistrationService:
+    def __init__(self, db_path=DB_PATH, read_workers=READ_WORKERS, render_workers=RENDER_WORKERS,
+                 max_pending=MAX_PENDING, batch_window=BATCH_WINDOW):
+        self.db = get_db(db_path)
+        migrate(self.db)
+        self.cache = VehicleCache(self.db)
+        self.readers = ThreadPoolExecutor(read_workers, thread_name_prefix="reader")
+        self.renderers = ProcessPoolExecutor(render_workers)
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix="writer")
+        self.max_pending = max_pending
+        self.batch_window = batch_window
+        self.stats = {"requests": 0, "errors": 0, "write_batches": 0, "writes": 0, "rejected_busy": 0}
+
+    async def start(self, host=HOST, port=PORT):
+        self.pending = asyncio.Semaphore(self.max_pending)
+        self.write_queue = asyncio.Queue()
+        self.batcher = asyncio.create_task(self.batch_writes())
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+        self.readers.shutdown()
+        self.renderers.shutdown()
+        self.writer.shutdown()
+
+    # -- executors ---------------------------------------------------------
+
+    async def read(self, func, *args):
+        return await self.run_bounded(self.readers, func, *args)
+
+    async def render(self, func, *args):
+        # Timed here: the render processes' own timings stay in those processes
+        with timer("qr_render_pool"):
+            return await self.run_bounded(self.renderers, func, *args)
+
+    async def run_bounded(self, executor, func, *args):
+        if self.pending.locked():
+            self.stats["rejected_busy"] += 1
+            raise HTTPError(503, "Too many requests in flight")
+        async with self.pending:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+    # Queue func(conn, *args) for the next write transaction and wait for it.
+    # Writes count against max_pending like reads, so the queue stays bounded;
+    # `wait` queues regardless (the second half of a write already accepted)
+    async def write(self, func, *args, wait=False):
+        if not wait and self.pending.locked():
+            self.stats["rejected_busy"] += 1
+            raise HTTPError(503, "Too many requests in flight")
+        async with self.pending:
+            future = asyncio.get_running_loop().create_future()
+            await self.write_queue.put((func, args, future))
+            return await future
+
+    async def batch_writes(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.write_queue.get()]
+            await asyncio.sleep(self.batch_window)
+            while not self.write_queue.empty():
+                batch.append(self.write_queue.get_nowait())
+            try:
+                results = await loop.run_in_executor(self.writer, self.apply_writes, batch)
+            except Exception as e:
+                # Fail this batch's requests, but keep serving later writes
+                if not isinstance(e, sqlite3.Error):
+                    traceback.print_exc()
+                results = [e] * len(batch)
+            for (func, args, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def apply_writes(self, batch):
+        results = []
+        with self.db.transaction() as conn:
+            for func, args, future in batch:
+                conn.execute("SAVEPOINT request")
+                try:
+                    results.append(func(conn, *args))
+                    conn.execute("RELEASE request")
+                except (sqlite3.Error, ValueError) as e:
+                    conn.execute("ROLLBACK TO request")
+                    conn.execute("RELEASE request")
+                    results.append(e)
+        self.stats["write_batches"] += 1
+        self.stats["writes"] += len(batch)
+        return results
+
+    # -- endpoints ---------------------------------------------------------
+
+    async def register(self, body):
+        if not isinstance(body, dict):
+            raise HTTPError(400, "Expected a registration object")
+        prepared = prepare_row(body)
+        if isinstance(prepared, str):
+            raise HTTPError(400, prepared)
+        record, jobs, qr_data = prepared
+        if not isinstance(body.get("compact", False), bool):
+            raise HTTPError(400, "compact must be true or false")
+
+        if body.get("compact"):
+            # The token needs the registration id: insert, render outside the
+            # write transaction, then attach the QR code in a second write
+            user_id = await self.write(insert_registration, record, jobs, None)
+            qr_data = encode_token(user_id)
+            png = await self.render(qr_png, qr_data)
+            await self.write(set_qr_code, user_id, png, wait=True)
+        else:
+            png = await self.render(cached_qr_png, qr_data)
+            user_id = await self.write(insert_registration, record, jobs, png)
+        return 201, {"id": user_id, "vehicle_number": record["vehicle_number"], "qr_data": qr_data}
+
+    async def lookup(self, vehicle_number):
+        result, services = await self.read(self.cache.get, vehicle_number)
+        archive = None
+        if not result:
+            # Vehicles moved out by archive.py are served, read-only, from their latest archive
+            archived = await self.read(lookup_archived, self.db, vehicle_number)
+            if not archived:
+                raise HTTPError(404, "No data found for this vehicle.")
+            archive, result, services = archived[-1]
+        user_id, first_name, last_name, vehicle_type, vehicle_brand = result
+        return 200, {
+            "id": user_id, "first_name": first_name, "last_name": last_name, "vehicle_type": vehicle_type,
+            "vehicle_brand": vehicle_brand, "vehicle_number": vehicle_number, "archive": archive,
+            "services": [{"service": service, "status": status} for service, status in services],
+        }
+
+    async def resolve(self, body):
+        vehicle_number = await self.read(lambda: resolve_scanned(self.db.connection(), str(body.get("qr_data", ""))))
+        if vehicle_number is None:
+            raise HTTPError(404, "Unrecognised QR code data.")
+        return 200, {"vehicle_number": vehicle_number}
+
+    async def search(self, text):
+        rows = await self.read(lambda: search_vehicles(self.db.connection(), text))
+        return 200, [{"id": user_id, "first_name": first_name, "last_name": last_name, "mobile_no": mobile_no,
+                      "vehicle_number": vehicle_number}
+                     for user_id, first_name, last_name, mobile_no, vehicle_number in rows]
+
+    async def board(self, since):
+        seq, vehicles = await self.read(lambda: fetch_board_changes(self.db.connection(), since))
+        return 200, {"seq": seq, "vehicles": {
+            key: {"id": vehicle[0], "vehicle_number": vehicle[1], "first_name": vehicle[2], "last_name": vehicle[3],
+                  "services": [{"service": service, "status": status} for service, status in vehicle[4]]}
+            if vehicle else None
+            for key, vehicle in vehicles.items()}}
+
+    async def set_statuses(self, updates):
+        for update in updates:
+            if not isinstance(update, dict) or not update.get("vehicle_number") or not update.get("service") \
+                    or not isinstance(update["vehicle_number"], str) or not isinstance(update["service"], str):
+                raise HTTPError(400, "Each update needs vehicle_number, service and status")
+            if not isinstance(update.get("station") or "", str):
+                raise HTTPError(400, "station must be text")
+            if update.get("status") not in SERVICE_STATUSES:
+                raise HTTPError(400, f"Status must be one of {', '.join(SERVICE_STATUSES)}")
+
+        def apply(conn):
+            return [set_service_status(conn, update["vehicle_number"], update["service"], update["status"],
+                                       update.get("station") or STATION)
+                    for update in updates]
+        updated = await self.write(apply)
+        return 200, {"updated": sum(updated), "matched": updated}
+
+    async def qr_image(self, user_id):
+        png = await self.read(lambda: fetch_qr_code(self.db.connection(), user_id))
+        if png is None:
+            raise HTTPError(404, "No QR code for this registration.")
+        return 200, png
+
+    def metrics(self):
+        stats = dict(self.stats)
+        stats["write_queue"] = self.write_queue.qsize()
+        stats["cache_hit_ratio"] = self.cache.hit_ratio()
+        stats["db"] = dict(self.db.stats)
+        stats["stages"] = {stage: {key: value for key, value in data.items() if key != "buckets"}
+                           for stage, data in REGISTRY.snapshot()["stages"].items() if data["count"]}
+        return 200, stats
+
+    async def route(self, method, path, body):
+        parts = [unquote(part) for part in path.split("?", 1)[0].strip("/").split("/")]
+        if method == "POST" and parts == ["registrations"]:
+            return await self.register(body)
+        if method == "GET" and len(parts) == 3 and parts[0] == "registrations" and parts[2] == "qr" \
+                and parts[1].isdigit():
+            return await self.qr_image(int(parts[1]))
+        if method == "GET" and len(parts) == 2 and parts[0] == "vehicles":
+            return await self.lookup(parts[1])
+        if method == "POST" and parts == ["resolve"]:
+            if not isinstance(body, dict):
+                raise HTTPError(400, "Expected {\"qr_data\": ...}")
+            return await self.resolve(body)
+        if method == "GET" and parts == ["search"]:
+            return await self.search(parse_qs(path.partition("?")[2]).get("q", [""])[0])
+        if method == "GET" and parts == ["board"]:
+            since = parse_qs(path.partition("?")[2]).get("since", [""])[0]
+            return await self.board(int(since) if since.isdigit() else None)
+        if method == "PUT" and len(parts) == 4 and parts[0] == "vehicles" and parts[2] == "services":
+            body = body if isinstance(body, dict) else {}
+            return await self.set_statuses([{"vehicle_number": parts[1], "service": parts[3],
+                                             "status": body.get("status"), "station": body.get("station")}])
+        if method == "POST" and parts == ["statuses"]:
+            if not isinstance(body, list):
+                raise HTTPError(400, "Expected a list of status updates")
+            return await self.set_statuses(body)
+        if method == "GET" and parts == ["metrics"]:
+            return self.metrics()
+        if method == "GET" and parts == ["metrics", "prometheus"]:
+            return 200, prometheus_text()
+        raise HTTPError(404, "Not found")
+
+    # -- HTTP/1.1 ----------------------------------------------------------
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                self.stats["requests"] += 1
+                try:
+                    if length > MAX_BODY:
+                        raise HTTPError(413, "Request body too large")
+                    raw = await reader.readexactly(length) if length else b""
+                    try:
+                        body = json.loads(raw) if raw else None
+                    except json.JSONDecodeError:
+                        raise HTTPError(400, "Body must be JSON")
+                    status, payload = await self.route(method, path, body)
+                except HTTPError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except (sqlite3.Error, ValueError) as e:
+                    status, payload = 500, {"error": str(e)}
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception:
+                    # A bug in one request must not drop the connection unanswered
+                    print(f"Error handling {method} {path}:", file=sys.stderr)
+                    traceback.print_exc()
+                    status, payload = 500, {"error": "Internal server error"}
+                if status >= 400:
+                    self.stats["errors"] += 1
+
+                if isinstance(payload, bytes):
+                    content_type, data = "image/png", payload
+                elif isinstance(payload, str):
+                    content_type, data = "text/plain; version=0.0.4", payload.encode()
+                else:
+                    content_type, data = "application/json", json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                             f"Content-Type: {content_type}\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(db_path, host, port):
+    service = RegistrationService(db_path)
+    server = await service.start(host, port)
+    print(f"Serving {db_path} on http://{host}:{server.sockets[0].getsockname()[1]}", flush=True)
+
+    # Stop cleanly on SIGTERM too, so the render worker processes exit with us
+    stopped = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    except (NotImplementedError, AttributeError):
+        pass  # Windows: Ctrl+C only
+    try:
+        await stopped.wait()
+    finally:
+        await service.close()
+        service.db.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registration / tracking service for all stations")
+    parser.add_argument("--db", default=DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--host", default=HOST, help="bind address (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=PORT, help="port (default: %(default)s)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args.metrics_prom, args.metrics_jsonl, args.profile)
+    try:
+        asyncio.run(serve(args.db, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
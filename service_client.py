@@ -0,0 +1,138 @@
+import http.client
+import json
+import os
+import threading
+from urllib.parse import quote, urlsplit
+
+from database import STATION
+from status_writer import StatusWriter
+
+# Thin client for service.py, so stations can share one database over the
+# network instead of each opening the file. Each thread keeps its own
+# keep-alive connection. The GUIs switch to it with --server URL or the
+# QR_SERVICE_URL environment variable.
+
+SERVICE_URL_ENV = "QR_SERVICE_URL"
+TIMEOUT = 10
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ServiceClient:
+    def __init__(self, base_url, timeout=TIMEOUT):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        # A keep-alive connection the server has since closed fails once; retry on a new one
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, data, headers)
+                response = conn.getresponse()
+                payload = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+        if response.getheader("Content-Type") == "application/json":
+            payload = json.loads(payload)
+        if response.status >= 400:
+            raise ServiceError(response.status, payload.get("error") if isinstance(payload, dict) else payload)
+        return payload
+
+    # Returns {"id", "vehicle_number", "qr_data"}
+    def register(self, record, service_names, compact=False):
+        return self.request("POST", "/registrations", dict(record, services=service_names, compact=compact))
+
+    def qr_png(self, user_id):
+        return self.request("GET", f"/registrations/{user_id}/qr")
+
+    def resolve(self, qr_data):
+        try:
+            return self.request("POST", "/resolve", {"qr_data": qr_data})["vehicle_number"]
+        except ServiceError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    # Same shape as VehicleCache.get: (vehicle row or None, [(service, status), ...])
+    def lookup(self, vehicle_number):
+        try:
+            vehicle = self.request("GET", f"/vehicles/{quote(vehicle_number, safe='')}")
+        except ServiceError as e:
+            if e.status == 404:
+                return None, [], None
+            raise
+        result = (vehicle["id"], vehicle["first_name"], vehicle["last_name"],
+                  vehicle["vehicle_type"], vehicle["vehicle_brand"])
+        return result, [(job["service"], job["status"]) for job in vehicle["services"]], vehicle.get("archive")
+
+    # Same shape as database.search_vehicles
+    def search(self, text):
+        return [(row["id"], row["first_name"], row["last_name"], row["mobile_no"], row["vehicle_number"])
+                for row in self.request("GET", f"/search?q={quote(text, safe='')}")]
+
+    # Same shape as database.fetch_board_changes
+    def board(self, since=None):
+        reply = self.request("GET", "/board" if since is None else f"/board?since={since}")
+        return reply["seq"], {key: (vehicle["id"], vehicle["vehicle_number"], vehicle["first_name"],
+                                    vehicle["last_name"], [(job["service"], job["status"]) for job in vehicle["services"]])
+                              if vehicle else None
+                              for key, vehicle in reply["vehicles"].items()}
+
+    def set_status(self, vehicle_number, service, status):
+        path = f"/vehicles/{quote(vehicle_number, safe='')}/services/{quote(service, safe='')}"
+        return self.request("PUT", path, {"status": status, "station": STATION})["updated"]
+
+    # updates: [(vehicle_number, service, status), ...] applied in one request;
+    # returns the number of jobs each one updated
+    def set_statuses(self, updates):
+        return self.request("POST", "/statuses", [
+            {"vehicle_number": vehicle_number, "service": service, "status": status, "station": STATION}
+            for vehicle_number, service, status in updates])["matched"]
+
+
+# StatusWriter that sends each coalesced batch to the service in one request
+class RemoteStatusWriter(StatusWriter):
+    errors = (ServiceError, OSError, http.client.HTTPException)
+
+    def __init__(self, client, **kwargs):
+        self.client = client
+        super().__init__(None, **kwargs)
+
+    def apply(self, batch):
+        matched = self.client.set_statuses([(vehicle_number, service, status)
+                                            for (vehicle_number, service), status in batch.items()])
+        return dict(zip(batch, matched))
+
+    def is_retryable(self, error):
+        # Busy service or unreachable network; a 4xx would fail again
+        return not isinstance(error, ServiceError) or error.status == 503
+
+
+# Service URL from --server URL on the command line, else QR_SERVICE_URL
+def server_url_from_args(argv):
+    if "--server" in argv:
+        index = argv.index("--server")
+        if index + 1 < len(argv):
+            return argv[index + 1]
+    return os.environ.get(SERVICE_URL_ENV) or None
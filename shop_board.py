@@ -0,0 +1,184 @@
+import sqlite3
+import time
+import tkinter as tk
+import traceback
+
+import metrics
+from service_client import ServiceError
+from registration import SERVICES
+
+# Shop-floor board: every vehicle still in the workshop, one row each, with
+# the status of each service. Opened from the tracker.
+#
+# The board polls for changes every BOARD_POLL_MS on a worker thread. A poll
+# asks for the vehicles changed since the last change number it saw
+# (vehicle_changes.seq), so a quiet tick is a single index probe and a busy
+# one reads only the vehicles some station touched. Rows are pooled: a
+# vehicle leaving the board hands its widgets to the next one arriving, and
+# a refresh only reconfigures the labels whose text changed, instead of
+# destroying and recreating the table. Poll and refresh times go to the
+# board_poll and board_refresh metrics and are shown in the footer.
+
+BOARD_POLL_MS = 1000
+
+STATUS_COLOURS = {"Pending": "#fff3c4", "In Process": "#ffd59e", "Completed": "#c8e6c9"}
+EMPTY_COLOUR = "#f5f5f5"
+SERVICE_NAMES = [name for name, price in SERVICES]
+
+
+# Widgets of one board row, shown for whichever vehicle has the row
+class BoardRow:
+    def __init__(self, parent, on_click):
+        self.vehicle_label = tk.Label(parent, anchor='w', font=("Helvetica", 11, "bold"), cursor="hand2")
+        self.owner_label = tk.Label(parent, anchor='w', font=("Helvetica", 11))
+        self.cells = [tk.Label(parent, width=11, font=("Helvetica", 10), relief="groove", bg=EMPTY_COLOUR)
+                      for name in SERVICE_NAMES]
+        self.widgets = [self.vehicle_label, self.owner_label] + self.cells
+        self.vehicle_label.bind("<Button-1>", lambda event: on_click(self.shown[1]) if self.shown else None)
+        self.position = None
+        self.shown = None
+        self.texts = [None] * len(self.widgets)
+
+    # Put `vehicle` in grid row `position`; returns True if anything was redrawn
+    def show(self, position, vehicle):
+        touched = False
+        if position != self.position:
+            for column, widget in enumerate(self.widgets):
+                widget.grid(row=position + 1, column=column, sticky="ew", padx=1, pady=1)
+            self.position = position
+            touched = True
+        if vehicle == self.shown:
+            return touched
+
+        user_id, vehicle_number, first_name, last_name, services = vehicle
+        statuses = dict(services)
+        texts = [vehicle_number, f"{first_name} {last_name}"] + [statuses.get(name, "") for name in SERVICE_NAMES]
+        for index, (widget, text) in enumerate(zip(self.widgets, texts)):
+            if text != self.texts[index]:
+                if index < 2:
+                    widget.config(text=text)
+                else:
+                    widget.config(text=text, bg=STATUS_COLOURS.get(text, EMPTY_COLOUR))
+                self.texts[index] = text
+        self.shown = vehicle
+        return True
+
+    def hide(self):
+        for widget in self.widgets:
+            widget.grid_remove()
+        self.position = None
+        self.shown = None
+
+
+class ShopBoard:
+    # fetch_changes(since) -> (seq, {key: vehicle or None}) runs on `submit`
+    # (a worker pool); call_in_ui hands results back to the Tk thread;
+    # on_select(vehicle_number) opens a vehicle in the tracker
+    def __init__(self, root, fetch_changes, submit, call_in_ui, on_select):
+        self.fetch_changes = fetch_changes
+        self.submit = submit
+        self.call_in_ui = call_in_ui
+        self.on_select = on_select
+        self.window = tk.Toplevel(root)
+        self.window.title("Shop Floor")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.closed = False
+
+        # Scrollable table: a frame inside a canvas
+        canvas = tk.Canvas(self.window, width=1000, height=600, highlightthickness=0)
+        scrollbar = tk.Scrollbar(self.window, orient="vertical", command=canvas.yview)
+        canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        canvas.pack(side='top', fill='both', expand=True)
+        self.table = tk.Frame(canvas)
+        canvas.create_window((0, 0), window=self.table, anchor='nw')
+        self.table.bind("<Configure>", lambda event: canvas.configure(scrollregion=canvas.bbox("all")))
+        self.window.bind("<MouseWheel>", lambda event: canvas.yview_scroll(-event.delta // 120, "units"))
+        self.window.bind("<Button-4>", lambda event: canvas.yview_scroll(-1, "units"))
+        self.window.bind("<Button-5>", lambda event: canvas.yview_scroll(1, "units"))
+        for column, title in enumerate(["Vehicle", "Owner"] + SERVICE_NAMES):
+            tk.Label(self.table, text=title, font=("Helvetica", 11, "bold"), anchor='w').grid(
+                row=0, column=column, sticky="ew", padx=1)
+
+        self.footer = tk.Label(self.window, text="Loading...", font=("Helvetica", 10), anchor='w')
+        self.footer.pack(side='bottom', fill='x')
+
+        self.seq = None
+        self.vehicles = {}
+        self.rows = {}
+        self.spare_rows = []
+        self.polling = False
+        self.tick()
+
+    def tick(self):
+        if self.closed:
+            return
+        # One poll at a time; a slow one just skips ticks
+        if not self.polling:
+            self.polling = True
+            self.submit(self.poll, self.seq)
+        self.window.after(BOARD_POLL_MS, self.tick)
+
+    def poll(self, since):
+        # Runs on the worker pool
+        start = time.perf_counter()
+        applied = False
+        try:
+            with metrics.timer("board_poll"):
+                seq, changes = self.fetch_changes(since)
+            # Quiet ticks don't touch the Tk thread beyond clearing the flag
+            if changes or since is None:
+                self.call_in_ui(self.apply, since, seq, changes, time.perf_counter() - start)
+                applied = True
+        except (sqlite3.Error, ServiceError, OSError) as e:
+            print("Board refresh failed:", e)
+        except Exception:
+            print("Board refresh failed:")
+            traceback.print_exc()
+        finally:
+            # Whatever went wrong, the next tick must be able to poll again
+            if not applied:
+                self.call_in_ui(self.poll_done)
+
+    def poll_done(self):
+        self.polling = False
+
+    @metrics.timed("board_refresh")
+    def apply(self, since, seq, changes, poll_seconds):
+        self.polling = False
+        if self.closed:
+            return
+        self.seq = seq
+        start = time.perf_counter()
+        if since is None:
+            self.vehicles = {}
+        for key, vehicle in changes.items():
+            if vehicle is None:
+                self.vehicles.pop(key, None)
+            else:
+                self.vehicles[key] = vehicle
+
+        for key in [key for key in self.rows if key not in self.vehicles]:
+            row = self.rows.pop(key)
+            row.hide()
+            self.spare_rows.append(row)
+        redrawn = 0
+        # Arrival order; rows whose vehicle and place are unchanged aren't touched
+        for position, key in enumerate(sorted(self.vehicles, key=lambda key: self.vehicles[key][0])):
+            row = self.rows.get(key)
+            if row is None:
+                row = self.spare_rows.pop() if self.spare_rows else BoardRow(self.table, self.on_select)
+                self.rows[key] = row
+            redrawn += row.show(position, self.vehicles[key])
+
+        self.footer.config(text=f"{len(self.vehicles)} vehicles in the workshop, {len(changes)} changed, "
+                                f"{redrawn} rows redrawn; poll {poll_seconds * 1000:.1f} ms, "
+                                f"refresh {(time.perf_counter() - start) * 1000:.1f} ms ({time.strftime('%H:%M:%S')})")
+
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
+
+    def close(self):
+        self.closed = True
+        self.window.destroy()
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+from database import is_lock_error, set_service_status
+
+# Write-behind queue for service status changes, so the Tk main loop never
+# waits on SQLite. A background thread drains everything queued so far into
+# one transaction. Repeated changes to the same (vehicle, service) before they
+# are written collapse into the latest one. If another station holds the write
+# lock, the batch is retried with exponential backoff.
+#
+# on_done(vehicle_number, service, status, error) is called for every change
+# once it is committed (error None) or given up on; pass it through something
+# like root.after so it runs on the UI thread. A change that matched no job
+# (an unknown service, or a vehicle moved to the archive) is reported with a
+# "no matching job" error and counted as failed.
+
+MAX_RETRIES = 6
+RETRY_BACKOFF = 0.1
+
+
+class StatusWriter:
+    # Errors reported through on_done instead of killing the writer thread
+    errors = (sqlite3.Error,)
+
+    def __init__(self, db, on_done=None, max_retries=MAX_RETRIES, retry_backoff=RETRY_BACKOFF):
+        self.db = db
+        self.on_done = on_done
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self.commit_latencies = deque(maxlen=100)
+        self.stats = {"queued": 0, "coalesced": 0, "committed": 0, "batches": 0, "retries": 0, "failed": 0}
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, vehicle_number, service, status):
+        with self._cond:
+            key = (vehicle_number, service)
+            if key in self._pending:
+                self.stats["coalesced"] += 1
+                self._pending.move_to_end(key)
+            self._pending[key] = status
+            self.stats["queued"] += 1
+            self._cond.notify()
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    # Flush what is queued and stop the writer thread
+    def stop(self, timeout=10):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, OrderedDict()
+            self._write(batch)
+
+    def _write(self, batch):
+        error = None
+        updated = {}
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                updated = self.apply(batch)
+                error = None
+                break
+            except self.errors as e:
+                error = e
+                if not self.is_retryable(e) or attempt == self.max_retries:
+                    break
+                self.stats["retries"] += 1
+                time.sleep(self.retry_backoff * (2 ** attempt))
+
+        if error is None:
+            self.commit_latencies.append(time.perf_counter() - start)
+            self.stats["batches"] += 1
+            unmatched = sum(1 for key in batch if not updated.get(key))
+            self.stats["committed"] += len(batch) - unmatched
+            self.stats["failed"] += unmatched
+        else:
+            self.stats["failed"] += len(batch)
+
+        if self.on_done:
+            for key, status in batch.items():
+                vehicle_number, service = key
+                if error is None and not updated.get(key):
+                    self.on_done(vehicle_number, service, status, LookupError("no matching job"))
+                else:
+                    self.on_done(vehicle_number, service, status, error)
+
+    # Commit one batch of {(vehicle_number, service): status}; returns
+    # {(vehicle_number, service): jobs updated}
+    def apply(self, batch):
+        with self.db.transaction() as conn:
+            return {key: set_service_status(conn, key[0], key[1], status) for key, status in batch.items()}
+
+    def is_retryable(self, error):
+        return is_lock_error(error)
+
+    def report(self):
+        latencies = sorted(self.commit_latencies)
+        latency = f"{latencies[len(latencies) // 2] * 1000:.1f} ms" if latencies else "n/a"
+        stats = self.stats
+        return (f"status writer: {stats['committed']} committed in {stats['batches']} batches, "
+                f"{stats['coalesced']} coalesced, {stats['retries']} retries, {stats['failed']} failed, "
+                f"queue depth {self.queue_depth()}, median commit {latency}")
@@ -0,0 +1,99 @@
+import sqlite3
+
+import pytest
+
+from database import get_db, migrate, MIGRATIONS, check_summaries, fetch_services, fetch_qr_code, \
+    resolve_scanned, search_vehicles
+from registration import encode_token
+
+# The migrations rewrite user data in place: service JSON/strings become
+# service_jobs rows, QR PNGs move to qr_images, duplicate plates are merged.
+# These run the whole series over a database in the original app's schema.
+#
+#   python -m pytest test_migrations.py
+
+BASELINE_USERS = '''CREATE TABLE users (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        first_name TEXT,
+                        last_name TEXT,
+                        mobile_no TEXT,
+                        address TEXT,
+                        pincode TEXT,
+                        vehicle_type TEXT,
+                        vehicle_brand TEXT,
+                        vehicle_number TEXT,
+                        services TEXT,
+                        total_price REAL,
+                        qr_code BLOB
+                    )'''
+
+# (first_name, vehicle_number, services, qr_code): the same plate written two
+# ways, in both services formats, and two rows sharing one PNG
+BASELINE_ROWS = [
+    ("Asha", "MH 12 AB 1234", '{"Washing (₹100)": "Completed", "Oil Change (₹300)": "In Process"}', b"png-a"),
+    ("Asha", "mh12ab1234", "Washing (₹100), Tyre Changing (₹200)", b"png-b"),
+    ("Ravi", "MH-14-CD-5678", "Washing (₹100)", b"png-a"),
+]
+
+
+@pytest.fixture
+def migrated(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_USERS)
+    conn.executemany('''INSERT INTO users (first_name, last_name, mobile_no, address, pincode, vehicle_type,
+                                           vehicle_brand, vehicle_number, services, total_price, qr_code)
+                        VALUES (?, 'K', '9876543210', 'Pune', '411001', 'Car', 'Honda', ?, ?, 0, ?)''',
+                     BASELINE_ROWS)
+    conn.commit()
+    conn.close()
+
+    db = get_db(path)
+    migrate(db)
+    yield db.connection()
+    db.close_all()
+
+
+def test_schema_version(migrated):
+    assert migrated.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+
+
+def test_duplicate_plates_merged_into_latest(migrated):
+    users = migrated.execute("SELECT id, vehicle_number, vehicle_key FROM users ORDER BY id").fetchall()
+    assert users == [(2, "mh12ab1234", "MH12AB1234"), (3, "MH-14-CD-5678", "MH14CD5678")]
+    assert migrated.execute("SELECT old_id, user_id FROM merged_registrations").fetchall() == [(1, 2)]
+    # The surviving row keeps its own jobs and gains the ones only the older row had
+    assert sorted(fetch_services(migrated, 2)) == [("Oil Change", "In Process"), ("Tyre Changing", "Pending"),
+                                                   ("Washing", "Pending")]
+    assert fetch_services(migrated, 3) == [("Washing", "Pending")]
+    assert migrated.execute("SELECT COUNT(*) FROM service_jobs WHERE user_id = 1").fetchone()[0] == 0
+
+
+def test_job_prices_from_legacy_services(migrated):
+    prices = dict(migrated.execute("SELECT service, price FROM service_jobs WHERE user_id = 2").fetchall())
+    assert prices == {"Washing": 100.0, "Tyre Changing": 200.0, "Oil Change": 300.0}
+
+
+def test_qr_codes_deduplicated(migrated):
+    assert migrated.execute("SELECT COUNT(*) FROM users WHERE qr_code IS NOT NULL").fetchone()[0] == 0
+    # png-a is shared by the merged-away row and row 3, stored once
+    assert sorted(png for (png,) in migrated.execute("SELECT png FROM qr_images")) == [b"png-a", b"png-b"]
+    assert fetch_qr_code(migrated, 2) == b"png-b"
+    assert fetch_qr_code(migrated, 3) == b"png-a"
+
+
+def test_summaries_consistent(migrated):
+    assert check_summaries(migrated) == []
+    jobs = migrated.execute("SELECT SUM(jobs), SUM(revenue) FROM job_summary").fetchone()
+    assert jobs == (4, 700.0)
+
+
+def test_search_finds_migrated_rows(migrated):
+    assert [row[0] for row in search_vehicles(migrated, "MH12AB")] == [2]
+    assert [row[0] for row in search_vehicles(migrated, "5678")] == [3]
+    assert [row[0] for row in search_vehicles(migrated, "Asha")] == [2]
+    assert [row[0] for row in search_vehicles(migrated, "Ravi 98765")] == [3]
+
+
+def test_compact_code_of_merged_row_resolves(migrated):
+    assert resolve_scanned(migrated, encode_token(1)) == "mh12ab1234"
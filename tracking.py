@@ -1,10 +1,17 @@
-import cv2
-from pyzbar.pyzbar import decode
-from PIL import Image
 import json
+import queue
+import sys
+import traceback
 import tkinter as tk
 from tkinter import ttk
-import threading
+from registration import decode_token
+import metrics
+
+# Seconds during which a repeat read of the same QR code is ignored
+DEDUPE_WINDOW = 10
+
+# How often the Tk thread picks up work handed over by other threads
+UI_POLL_MS = 50
 
 class QRTrackingApp:
     def __init__(self, root):
@@ -19,49 +26,74 @@ class QRTrackingApp:
         self.services_frame = tk.Frame(root)
         self.services_frame.pack(pady=10)
 
-        # Start QR code scanning
-        scan_button = tk.Button(root, text="Start Scanning", command=self.start_scan)
-        scan_button.pack(pady=10)
+        # Start/stop QR code scanning
+        self.pipeline = None
+        self.scan_button = tk.Button(root, text="Start Scanning", command=self.start_scan)
+        self.scan_button.pack(pady=10)
+
+        # Tk widgets are only touched from the Tk thread: the scan thread
+        # hands decoded QR data over through this queue
+        self.ui_calls = queue.Queue()
+        self.root.after(UI_POLL_MS, self.process_ui_calls)
+
+    def call_in_ui(self, func, *args):
+        self.ui_calls.put((func, args))
+
+    def process_ui_calls(self):
+        try:
+            while True:
+                func, args = self.ui_calls.get_nowait()
+                # One failing call must not stop the window from updating
+                try:
+                    func(*args)
+                except Exception:
+                    print(f"Error in {getattr(func, '__name__', func)}:", file=sys.stderr)
+                    traceback.print_exc()
+        except queue.Empty:
+            pass
+        finally:
+            self.root.after(UI_POLL_MS, self.process_ui_calls)
 
     def start_scan(self):
-        # Open a separate thread to avoid blocking the UI while scanning
-        scan_thread = threading.Thread(target=self.scan_qr_code)
-        scan_thread.start()
+        # One scan session at a time: the button stops a running session
+        if self.pipeline and self.pipeline.is_running():
+            self.pipeline.stop()
+            return
+        self.scan_qr_code()
+        self.scan_button.config(text="Stop Scanning")
+        self.root.after(500, self.watch_scan)
+
+    def watch_scan(self):
+        # The session also ends on 'q' in the preview window or a camera error
+        if self.pipeline.is_running():
+            self.root.after(500, self.watch_scan)
+            return
+        if self.pipeline.error:
+            print("Error:", self.pipeline.error)
+        print(self.pipeline.report())
+        self.scan_button.config(text="Start Scanning")
 
     def scan_qr_code(self):
-        # Access the webcam (usually device 0)
-        cap = cv2.VideoCapture(0)
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # Decode any QR codes found in the frame
-            decoded_objects = decode(frame)
-
-            for obj in decoded_objects:
-                qr_data = obj.data.decode('utf-8')
-                
-                # Display the QR data (assumed to be JSON)
-                self.display_info(qr_data)
-                
-                # Stop the loop after detecting a QR code
-                cap.release()
-                cv2.destroyAllWindows()
-                return
-
-            # Display the webcam feed
-            cv2.imshow('QR Code Scanner', frame)
-
-            # Break the loop if 'q' is pressed
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-
-        cap.release()
-        cv2.destroyAllWindows()
-
+        # OpenCV loads on the first scan, not at startup
+        from scanner import ScanPipeline
+
+        # Keep the camera open and scan vehicles back to back (the capture
+        # backend is picked for the platform); the same code seen again
+        # within DEDUPE_WINDOW seconds is ignored
+        self.pipeline = ScanPipeline(lambda qr_data: self.call_in_ui(self.display_info, qr_data),
+                                     camera_index=0, frame_size=(640, 480),
+                                     stop_after_first=False, dedupe_window=DEDUPE_WINDOW)
+        self.pipeline.start()
+
+    @metrics.timed("ui_refresh")
     def display_info(self, qr_data):
+        # Compact QR codes only carry a registration id; the details live in the database
+        user_id = decode_token(qr_data)
+        if user_id is not None:
+            self.user_info_label.config(text=f"Compact QR code: registration #{user_id}\n"
+                                             "Use the database tracker to look it up")
+            return
+
         try:
             # Parse the QR code data as JSON
             data = json.loads(qr_data)
@@ -110,6 +142,8 @@ class QRTrackingApp:
 
 
 if __name__ == "__main__":
+    metrics.configure_from_args(sys.argv)
     root = tk.Tk()
     app = QRTrackingApp(root)
     root.mainloop()
+    print(metrics.report())
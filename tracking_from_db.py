@@ -1,14 +1,35 @@
-import cv2
-from pyzbar.pyzbar import decode
-from PIL import Image
-import json
 import tkinter as tk
 from tkinter import ttk
-import threading
+import queue
 import sqlite3  # For database connection
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from database import get_db, create_table, resolve_scanned, search_vehicles, fetch_board_changes
+from lookup_cache import VehicleCache
+from archive import lookup_archived
+from status_writer import StatusWriter
+from service_client import ServiceClient, ServiceError, RemoteStatusWriter, server_url_from_args
+import metrics
+
+# Seconds during which a repeat read of the same QR code is ignored
+DEDUPE_WINDOW = 10
+
+# How often the Tk thread picks up work handed over by other threads
+UI_POLL_MS = 50
+
+# Concurrent lookups when several vehicles are in view
+LOOKUP_WORKERS = 4
+
+# Manual search: wait for a pause in typing, and for at least this many characters
+SEARCH_DELAY_MS = 150
+SEARCH_MIN_CHARS = 2
+
+# Lookup/update failures reported instead of crashing the scan thread
+LOOKUP_ERRORS = (sqlite3.Error, ServiceError, OSError)
 
 class QRTrackingApp:
-    def __init__(self, root):
+    def __init__(self, root, client=None):
         self.root = root
         self.root.title("Garage Service Tracking")
         
@@ -20,130 +41,320 @@ class QRTrackingApp:
         self.services_frame = tk.Frame(root)
         self.services_frame.pack(pady=10)
 
-        # Start QR code scanning
-        scan_button = tk.Button(root, text="Start Scanning", command=self.start_scan)
-        scan_button.pack(pady=10)
+        # Start/stop QR code scanning
+        self.pipeline = None
+        self.scan_button = tk.Button(root, text="Start Scanning", command=self.start_scan)
+        self.scan_button.pack(pady=10)
+
+        # Decode every code in the frame and show the vehicles side by side
+        self.multi_var = tk.IntVar()
+        tk.Checkbutton(root, text="Several vehicles per frame", variable=self.multi_var).pack()
+        self.lookup_pool = ThreadPoolExecutor(LOOKUP_WORKERS)
+
+        # Manual lookup when a sticker won't scan: type part of a name, the
+        # mobile number or the plate and pick the vehicle from the list
+        search_frame = tk.Frame(root)
+        search_frame.pack(pady=5)
+        tk.Label(search_frame, text="Search", font=("Helvetica", 12)).pack(side='left')
+        self.search_entry = tk.Entry(search_frame, font=("Helvetica", 12), width=30)
+        self.search_entry.pack(side='left', padx=5)
+        self.search_entry.bind("<KeyRelease>", self.schedule_search)
+        self.search_results = tk.Listbox(root, font=("Helvetica", 11), width=60, height=6)
+        self.search_results.pack(pady=5)
+        self.search_results.bind("<<ListboxSelect>>", self.search_result_selected)
+        self.search_rows = []
+        self.search_job = None
+        self.search_seq = 0
+
+        # Every vehicle in the workshop in a separate window, kept up to date
+        tk.Button(root, text="Shop Floor Board", command=self.open_board).pack(pady=5)
+        self.board = None
+
+        # Outcome of queued status updates
+        self.save_status_label = tk.Label(root, text="", font=("Helvetica", 10))
+        self.save_status_label.pack(pady=5)
+
+        # Tk widgets are only touched from the Tk thread: the scan thread and
+        # the status writer hand their results over through this queue
+        self.ui_calls = queue.Queue()
+        self.root.after(UI_POLL_MS, self.process_ui_calls)
+
+        # Status changes are written in the background, never in a button callback
+        on_done = lambda *result: self.call_in_ui(self.status_saved, *result)
+        self.client = client
+        if client:
+            # Thin client: service.py owns the database and its lookup cache
+            self.vehicle_cache = None
+            self.status_writer = RemoteStatusWriter(client, on_done=on_done)
+        else:
+            # Vehicles scanned again are served from memory until any station writes
+            self.vehicle_cache = VehicleCache(get_db())
+            self.status_writer = StatusWriter(get_db(), on_done=on_done)
+
+    def call_in_ui(self, func, *args):
+        self.ui_calls.put((func, args))
+
+    def process_ui_calls(self):
+        try:
+            while True:
+                func, args = self.ui_calls.get_nowait()
+                # One failing call must not stop the window from updating
+                try:
+                    func(*args)
+                except Exception:
+                    print(f"Error in {getattr(func, '__name__', func)}:", file=sys.stderr)
+                    traceback.print_exc()
+        except queue.Empty:
+            pass
+        finally:
+            self.root.after(UI_POLL_MS, self.process_ui_calls)
 
     def start_scan(self):
-        # Open a separate thread to avoid blocking the UI while scanning
-        scan_thread = threading.Thread(target=self.scan_qr_code)
-        scan_thread.start()
+        # One scan session at a time: the button stops a running session
+        if self.pipeline and self.pipeline.is_running():
+            self.pipeline.stop()
+            return
+        self.scan_qr_code()
+        self.scan_button.config(text="Stop Scanning")
+        self.root.after(500, self.watch_scan)
 
-    def scan_qr_code(self):
-        # Use DirectShow as the backend (Windows-specific) and set frame dimensions
-        cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-        # Check if the camera opened successfully
-        if not cap.isOpened():
-            print("Error: Could not open camera.")
+    def watch_scan(self):
+        # The session also ends on 'q' in the preview window or a camera error
+        if self.pipeline.is_running():
+            self.root.after(500, self.watch_scan)
             return
+        if self.pipeline.error:
+            print("Error:", self.pipeline.error)
+        print(self.pipeline.report())
+        self.scan_button.config(text="Start Scanning")
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("Error: Could not read frame.")
-                break
-
-            # Decode any QR codes found in the frame
-            decoded_objects = decode(frame)
-
-            for obj in decoded_objects:
-                qr_data = obj.data.decode('utf-8')
-                
-                # Parse vehicle number from the QR data
-                data = json.loads(qr_data)
-                vehicle_number = data.get("Vehicle Number", None)
-                
-                # Fetch and display information from the database
-                if vehicle_number:
-                    self.fetch_and_display_info(vehicle_number)
-                
-                # Stop the loop after detecting a QR code
-                cap.release()
-                cv2.destroyAllWindows()
-                return
-
-            # Display the webcam feed
-            cv2.imshow('QR Code Scanner', frame)
-
-            # Break the loop if 'q' is pressed
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-
-        cap.release()
-        cv2.destroyAllWindows()
+    def scan_qr_code(self):
+        # OpenCV and the decoders load on the first scan, not at startup
+        from scanner import ScanPipeline
 
-    def fetch_and_display_info(self, vehicle_number):
+        # Keep the camera open and scan vehicles back to back (the capture
+        # backend is picked for the platform); the same code seen again
+        # within DEDUPE_WINDOW seconds is ignored. In multi mode the tracker
+        # reports the codes in view instead, whenever that set changes.
+        multi = self.multi_var.get() == 1
+        self.pipeline = ScanPipeline(self.handle_codes if multi else self.handle_qr_data, camera_index=0,
+                                     frame_size=(640, 480), stop_after_first=False, dedupe_window=DEDUPE_WINDOW,
+                                     multi=multi)
+        self.pipeline.start()
+
+    def handle_qr_data(self, qr_data):
+        # The decode thread is started afresh for every scan session; keep the
+        # database off it so each session doesn't leave a connection behind
+        self.lookup_pool.submit(self.lookup_and_display, qr_data)
+
+    def lookup_and_display(self, qr_data):
+        # Parse vehicle number from the QR data
+        vehicle_number = self.resolve_vehicle_number(qr_data)
+
+        # Fetch and display information from the database
+        if vehicle_number:
+            self.fetch_and_display_info(vehicle_number)
+
+    def handle_codes(self, codes):
+        # Look up every vehicle in view at once, then show them side by side;
+        # the lookups run on the pool, this (decode) thread only waits
+        looked_up = [vehicle for vehicle in self.lookup_pool.map(self.lookup_vehicle, codes) if vehicle]
+        if looked_up:
+            self.call_in_ui(self.display_vehicles, looked_up)
+
+    # (vehicle_number, result, services, archive) for a scanned code, or None
+    def lookup_vehicle(self, qr_data):
+        vehicle_number = self.resolve_vehicle_number(qr_data)
+        if not vehicle_number:
+            return None
         try:
-            # Connect to the database and fetch user data based on vehicle number
-            conn = sqlite3.connect('vehicle_registration.db')
-            cursor = conn.cursor()
-            cursor.execute('''SELECT first_name, last_name, vehicle_type, vehicle_brand, services 
-                              FROM users WHERE vehicle_number = ?''', (vehicle_number,))
-            result = cursor.fetchone()
-            conn.close()
-            
-            if result:
-                first_name, last_name, vehicle_type, vehicle_brand, services_json = result
-                
-                # Display user and vehicle information
-                self.user_info_label.config(text=f"Name: {first_name} {last_name}\n"
-                                                 f"Vehicle: {vehicle_type} {vehicle_brand} ({vehicle_number})")
-
-                # Clear existing service information
-                for widget in self.services_frame.winfo_children():
-                    widget.destroy()
-
-                # Display services and statuses
-                services = json.loads(services_json)
-                for service, status in services.items():
-                    service_label = tk.Label(self.services_frame, text=f"{service}: {status}", font=("Helvetica", 12))
-                    service_label.pack(anchor='w')
-
-                    # Dropdown to select new status for the service
-                    service_status = ttk.Combobox(self.services_frame, values=["Pending", "In Process", "Completed"])
-                    service_status.set(status)  # Set current status
-                    service_status.pack(anchor='w')
-
-                    # Button to update the service status
-                    update_button = tk.Button(self.services_frame, text="Update Status", 
-                                              command=lambda s=service, cb=service_status: self.update_service_status(s, cb.get(), vehicle_number))
-                    update_button.pack(anchor='w')
+            result, services, archive = self.fetch_info(vehicle_number)
+        except LOOKUP_ERRORS as e:
+            print("Database error:", e)
+            return None
+        return vehicle_number, result, services, archive
 
+    def resolve_vehicle_number(self, qr_data):
+        # Compact QR codes carry a registration id, older ones the full JSON record
+        try:
+            if self.client:
+                vehicle_number = self.client.resolve(qr_data)
             else:
-                self.user_info_label.config(text="No data found for this vehicle.")
+                vehicle_number = resolve_scanned(get_db().connection(), qr_data)
+        except LOOKUP_ERRORS as e:
+            print("Database error:", e)
+            return None
+        if vehicle_number is None:
+            print("Error: Unrecognised QR code data.")
+        return vehicle_number
+
+    def schedule_search(self, event=None):
+        # Search once typing pauses rather than on every key
+        if self.search_job:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY_MS, self.start_search)
+
+    def start_search(self):
+        self.search_job = None
+        self.search_seq += 1
+        text = self.search_entry.get().strip()
+        if len(text) < SEARCH_MIN_CHARS:
+            self.show_search_results(self.search_seq, [])
+            return
+        self.lookup_pool.submit(self.run_search, self.search_seq, text)
 
-        except sqlite3.Error as e:
+    def run_search(self, seq, text):
+        # Runs on the lookup pool, like scanned lookups
+        try:
+            if self.client:
+                rows = self.client.search(text)
+            else:
+                rows = search_vehicles(get_db().connection(), text)
+        except LOOKUP_ERRORS as e:
             print("Database error:", e)
-        except json.JSONDecodeError:
-            print("Error decoding services JSON.")
+            return
+        self.call_in_ui(self.show_search_results, seq, rows)
 
-    def update_service_status(self, service, new_status, vehicle_number):
-        # Update the service status in the database
+    def show_search_results(self, seq, rows):
+        # Results for an earlier keystroke that arrive late are dropped
+        if seq != self.search_seq:
+            return
+        self.search_rows = rows
+        self.search_results.delete(0, tk.END)
+        for user_id, first_name, last_name, mobile_no, vehicle_number in rows:
+            self.search_results.insert(tk.END, f"{vehicle_number}   {first_name} {last_name}   {mobile_no}")
+
+    def search_result_selected(self, event=None):
+        selection = self.search_results.curselection()
+        if selection:
+            vehicle_number = self.search_rows[selection[0]][4]
+            self.lookup_pool.submit(self.fetch_and_display_info, vehicle_number)
+
+    def open_board(self):
+        if self.board and not self.board.closed:
+            self.board.lift()
+            return
+        from shop_board import ShopBoard
+        if self.client:
+            fetch_changes = self.client.board
+        else:
+            fetch_changes = lambda since: fetch_board_changes(get_db().connection(), since)
+        # Clicking a vehicle on the board opens it here for status changes
+        self.board = ShopBoard(self.root, fetch_changes, self.lookup_pool.submit, self.call_in_ui,
+                               lambda vehicle_number: self.lookup_pool.submit(self.fetch_and_display_info,
+                                                                              vehicle_number))
+
+    def fetch_and_display_info(self, vehicle_number):
+        # Runs on the lookup pool: query here, then display on the Tk thread
         try:
-            conn = sqlite3.connect('vehicle_registration.db')
-            cursor = conn.cursor()
+            # Fetch user data based on vehicle number
+            result, services, archive = self.fetch_info(vehicle_number)
+        except LOOKUP_ERRORS as e:
+            print("Database error:", e)
+            return
+        self.call_in_ui(self.display_info, vehicle_number, result, services, archive)
+
+    # (result, services, archive); archive names the archive file of a vehicle
+    # moved out by archive.py, None for a live one
+    def fetch_info(self, vehicle_number):
+        if self.client:
+            return self.client.lookup(vehicle_number)
+        result, services = self.vehicle_cache.get(vehicle_number)
+        if result is None:
+            # Old codes of vehicles moved out by archive.py show their archived jobs
+            archived = lookup_archived(get_db(), vehicle_number)
+            if archived:
+                return archived[-1]
+        return result, services, None
+
+    @metrics.timed("ui_refresh")
+    def display_info(self, vehicle_number, result, services, archive=None):
+        if result:
+            user_id, first_name, last_name, vehicle_type, vehicle_brand = result
+            
+            # Display user and vehicle information
+            self.user_info_label.config(text=f"Name: {first_name} {last_name}\n"
+                                             f"Vehicle: {vehicle_type} {vehicle_brand} ({vehicle_number})")
+
+            # Clear existing service information
+            for widget in self.services_frame.winfo_children():
+                widget.destroy()
 
-            # Fetch existing services, update the status for the specified service
-            cursor.execute("SELECT services FROM users WHERE vehicle_number = ?", (vehicle_number,))
-            services = json.loads(cursor.fetchone()[0])
-            services[service] = new_status
+            self.add_service_widgets(self.services_frame, vehicle_number, services, archive)
 
-            # Save the updated services back to the database
-            cursor.execute("UPDATE users SET services = ? WHERE vehicle_number = ?", (json.dumps(services), vehicle_number))
-            conn.commit()
-            conn.close()
+        else:
+            self.user_info_label.config(text="No data found for this vehicle.")
 
-            # Update UI
-            print(f"Updated {service} to {new_status} for vehicle {vehicle_number}")
+    @metrics.timed("ui_refresh")
+    def display_vehicles(self, vehicles):
+        found = [vehicle for vehicle in vehicles if vehicle[1]]
+        self.user_info_label.config(text=f"{len(found)} vehicle(s) in view" if found else "No data found for these vehicles.")
+        for widget in self.services_frame.winfo_children():
+            widget.destroy()
+
+        # One column per vehicle
+        for vehicle_number, result, services, archive in found:
+            user_id, first_name, last_name, vehicle_type, vehicle_brand = result
+            panel = tk.Frame(self.services_frame, relief="groove", borderwidth=2, padx=8, pady=4)
+            panel.pack(side='left', anchor='n', padx=5)
+            tk.Label(panel, text=f"{first_name} {last_name}\n{vehicle_type} {vehicle_brand} ({vehicle_number})",
+                     font=("Helvetica", 12, "bold")).pack(anchor='w')
+            self.add_service_widgets(panel, vehicle_number, services, archive)
+
+    def add_service_widgets(self, parent, vehicle_number, services, archive=None):
+        # Archived jobs are history: no status controls, their rows aren't in the live file
+        if archive:
+            tk.Label(parent, text=f"Archived ({archive}), read-only", font=("Helvetica", 11, "italic"),
+                     fg="gray40").pack(anchor='w')
+        # Display services and statuses
+        for service, status in services:
+            service_label = tk.Label(parent, text=f"{service}: {status}", font=("Helvetica", 12))
+            service_label.pack(anchor='w')
+            if archive:
+                continue
+
+            # Dropdown to select new status for the service
+            service_status = ttk.Combobox(parent, values=["Pending", "In Process", "Completed"])
+            service_status.set(status)  # Set current status
+            service_status.pack(anchor='w')
+
+            # Button to update the service status
+            update_button = tk.Button(parent, text="Update Status", 
+                                      command=lambda s=service, cb=service_status: self.update_service_status(s, cb.get(), vehicle_number))
+            update_button.pack(anchor='w')
+
+    def update_service_status(self, service, new_status, vehicle_number):
+        # Queue the change; the status writer commits it in the background
+        self.status_writer.submit(vehicle_number, service, new_status)
+        metrics.count("status_updates")
+        self.save_status_label.config(text=f"Saving... ({self.status_writer.queue_depth()} queued)")
 
-        except sqlite3.Error as e:
-            print("Error updating service status:", e)
+    def status_saved(self, vehicle_number, service, new_status, error):
+        if error is None:
+            message = f"Updated {service} to {new_status} for vehicle {vehicle_number}"
+        else:
+            message = f"Error updating service status: {error}"
+        print(message)
+        depth = self.status_writer.queue_depth()
+        self.save_status_label.config(text=message if not depth else f"{message} ({depth} queued)")
 
 # Run the Tkinter application
 if __name__ == "__main__":
+    # --server URL (or QR_SERVICE_URL) talks to service.py instead of the file
+    service_url = server_url_from_args(sys.argv)
+    client = ServiceClient(service_url) if service_url else None
+    # Stage timings export and profiling: --metrics-prom FILE, --metrics-jsonl FILE, --profile FILE
+    metrics.configure_from_args(sys.argv)
+    if not client:
+        # Bring older vehicle_registration.db files up to the current schema
+        create_table()
     root = tk.Tk()
-    app = QRTrackingApp(root)
+    app = QRTrackingApp(root, client)
     root.mainloop()
+    app.status_writer.stop()
+    app.lookup_pool.shutdown()
+    print(app.status_writer.report())
+    if not client:
+        print(app.vehicle_cache.report())
+        print(get_db().report())
+    print(metrics.report())